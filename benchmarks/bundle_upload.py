@@ -0,0 +1,65 @@
+"""Compares per-file and bundled uploads of a backlog against a local S3 stand-in.
+
+Each request to the stand-in sleeps for a fixed round trip time to imitate a high latency link.
+
+    python benchmarks/bundle_upload.py --images 200 --rtt 0.25
+"""
+
+import argparse
+import json
+import logging
+import tempfile
+from pathlib import Path
+
+from raspberrycam.config import Config
+from raspberrycam.image import S3ImageManager
+from raspberrycam.s3 import LocalS3Manager
+
+CONFIG = Config(site="CARGN", lon=-0.2031049, lat=51.8626453, catchment="SE", direction="E", interval=300)
+
+
+def run(images: int, image_size: int, rtt: float, bundle: bool) -> dict:
+    """Uploads a backlog of fake images and reports the requests and time taken"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        s3 = LocalS3Manager(tmp_path / "s3", latency=rtt)
+        s3im = S3ImageManager("bucket", s3, tmp_path / "app", CONFIG, bundle=bundle)
+        for i in range(images):
+            timestamp = f"{i // 3600:02d}{i // 60 % 60:02d}{i % 60:02d}"
+            with open(s3im.pending_directory / f"SE_CARGN_01_PCAM_E_20250606_{timestamp}", "wb") as out:
+                out.write(b"\xff" * image_size)
+
+        report = s3im.upload_pending()
+        return {
+            "mode": "bundle" if bundle else "per_file",
+            "files": report.files,
+            "requests": report.requests,
+            "seconds": round(report.seconds, 4),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--image-size", type=int, default=200 * 1024)
+    parser.add_argument("--rtt", type=float, default=0.25)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    per_file = run(args.images, args.image_size, args.rtt, bundle=False)
+    bundled = run(args.images, args.image_size, args.rtt, bundle=True)
+    print(
+        json.dumps(
+            {
+                "per_file": per_file,
+                "bundle": bundled,
+                "requests_saved": per_file["requests"] - bundled["requests"],
+                "seconds_saved": round(per_file["seconds"] - bundled["seconds"], 4),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Compares per-shot capture latency of spawning libcamera-still with a persistent Picamera2 session.
+
+Runs off-device: both backends are given fakes that sleep for the sensor start up and exposure
+settling (paid on every shot by libcamera-still) and for reading out a frame.
+
+    python benchmarks/capture_latency.py --shots 10 --startup 1.0 --frame 0.05
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable
+from unittest.mock import patch
+
+from raspberrycam.camera import CameraInterface, CaptureSession, LibCamera, Picamera2Camera
+
+JPEG = b"\xff\xd8" + b"\x00" * 200 * 1024
+
+
+def fake_session_factory(startup: float, frame: float) -> Callable[..., CaptureSession]:
+    """Builds fake Picamera2 sessions that pay the start up cost once"""
+
+    class FakeSession(CaptureSession):
+        def __init__(self, *args) -> None:
+            time.sleep(startup)
+            self.quality = 90
+
+        def capture_file(self, target: Path | BinaryIO) -> None:
+            time.sleep(frame)
+            if isinstance(target, (str, Path)):
+                Path(target).write_bytes(JPEG)
+            else:
+                target.write(JPEG)
+
+        def close(self) -> None:
+            pass
+
+    return FakeSession
+
+
+def fake_libcamera_still(startup: float, frame: float) -> Callable[[list], int]:
+    """Builds a fake libcamera-still process that pays the start up cost on every call"""
+
+    def call(cmd: list) -> int:
+        time.sleep(startup + frame)
+        Path(cmd[cmd.index("-o") + 1]).write_bytes(JPEG)
+        return 0
+
+    return call
+
+
+def time_captures(camera: CameraInterface, shots: int, directory: Path) -> list:
+    """Times a run of captures in milliseconds"""
+    latencies = []
+    for i in range(shots):
+        start = time.perf_counter()
+        camera.capture_image(directory / f"{i}.jpg", vflip=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarise(latencies: list) -> dict:
+    return {
+        "shots": len(latencies),
+        "first_ms": round(latencies[0], 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "median_ms": round(statistics.median(latencies), 2),
+    }
+
+
+def run(shots: int, startup: float, frame: float) -> dict:
+    """Runs the comparison and returns the results"""
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        with patch("raspberrycam.camera.subprocess.call", fake_libcamera_still(startup, frame)):
+            libcamera = time_captures(LibCamera(90, 1024, 768), shots, directory)
+
+        camera = Picamera2Camera(1024, 768, session_factory=fake_session_factory(startup, frame))
+        persistent = time_captures(camera, shots, directory)
+        camera.close()
+
+    return {
+        "libcamera_still": summarise(libcamera),
+        "picamera2_session": summarise(persistent),
+        "speedup": round(statistics.mean(libcamera) / statistics.mean(persistent), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shots", type=int, default=10)
+    parser.add_argument("--startup", type=float, default=1.0, help="Seconds to start the sensor and settle exposure")
+    parser.add_argument("--frame", type=float, default=0.05, help="Seconds to read out and encode a frame")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    print(json.dumps(run(args.shots, args.startup, args.frame), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Measures how long `python -m raspberrycam` spends importing modules before it can start.
+
+Imports the entry point in fresh interpreters with `-X importtime` and reports the median
+cumulative import time of each raspberrycam module and each top level package, and which
+of the heavy dependencies that should only load on first use were imported.
+
+    python benchmarks/startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+LAZY_MODULES = ["boto3", "botocore", "astral", "autosemver", "pkg_resources", "cv2", "picamzero", "picamera2", "dotenv"]
+"""Dependencies that shouldn't be imported just to start the app"""
+
+
+def import_times(module: str) -> tuple[float, dict, list]:
+    """Imports a module in a fresh interpreter
+    Returns:
+        The wall time in milliseconds, the cumulative import time of each module in
+        milliseconds, and the names of every module imported
+    """
+    env = dict(os.environ)
+    src = str(Path(__file__).parent.parent / "src")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+    code = f"import sys, {module}; print(','.join(sys.modules))"
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative) / 1000
+    return wall_ms, times, result.stdout.strip().split(",")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="raspberrycam.__main__")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest top level packages to report")
+    args = parser.parse_args()
+
+    wall = []
+    times = defaultdict(list)
+    for _ in range(args.runs):
+        wall_ms, run_times, modules = import_times(args.module)
+        wall.append(wall_ms)
+        for name, ms in run_times.items():
+            times[name].append(ms)
+
+    medians = {name: round(statistics.median(values), 2) for name, values in times.items()}
+    own = {name: ms for name, ms in medians.items() if name.split(".")[0] == "raspberrycam"}
+    packages = {name: ms for name, ms in medians.items() if "." not in name and name != "raspberrycam"}
+    slowest = dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)[: args.top])
+
+    print(
+        json.dumps(
+            {
+                "module": args.module,
+                "runs": args.runs,
+                "interpreter_wall_ms": round(statistics.median(wall), 2),
+                "import_ms": medians.get(args.module),
+                "raspberrycam_modules_ms": dict(sorted(own.items(), key=lambda item: item[1], reverse=True)),
+                "slowest_packages_ms": slowest,
+                "lazy_modules_imported": [name for name in LAZY_MODULES if name in modules],
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
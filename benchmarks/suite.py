@@ -0,0 +1,208 @@
+"""Times the parts of the main loop that run on every cycle and writes the results as JSON.
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --compare results.json
+
+Each benchmark is repeated and the fastest and median times are reported, along with the
+commit they were run against. With `--compare`, each result is compared with an earlier run
+and the script exits with status 1 if any got slower by more than `--tolerance`.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable
+
+from raspberrycam.config import Config
+from raspberrycam.image import S3ImageManager
+from raspberrycam.location import Location
+from raspberrycam.s3 import LocalS3Manager
+from raspberrycam.scheduler import FdriScheduler
+
+CONFIG = Config(site="CARGN", lon=-0.2031049, lat=51.8626453, catchment="SE", direction="E", interval=300)
+
+
+def timed(func: Callable[[], object], repeat: int, operations: int) -> dict:
+    """Runs a function several times and summarises how long it took
+    Args:
+        func: The work to time
+        repeat: Number of times to run it
+        operations: Number of operations each run does, for the per-operation time
+    Returns:
+        The fastest and median run in seconds and the fastest time per operation in microseconds
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return summarise(runs, operations)
+
+
+def summarise(runs: list, operations: int) -> dict:
+    """Summarises the times of repeated runs in seconds"""
+    return {
+        "operations": operations,
+        "best_s": round(min(runs), 6),
+        "median_s": round(statistics.median(runs), 6),
+        "best_us_per_op": round(min(runs) / operations * 1e6, 3),
+    }
+
+
+def make_spool(directory: Path, count: int, image_size: int = 0) -> None:
+    """Fills a directory with fake images one second apart"""
+    start = datetime(2025, 6, 6, 4, 0)
+    data = b"\xff" * image_size
+    for i in range(count):
+        timestamp = (start + timedelta(seconds=i)).strftime("%Y%m%d_%H%M%S")
+        with open(directory / f"SE_CARGN_01_PCAM_E_{timestamp}", "wb") as out:
+            out.write(data)
+
+
+def bench_get_state(repeat: int) -> dict:
+    """`FdriScheduler.get_state` every ten minutes for a year"""
+    scheduler = FdriScheduler(Location(CONFIG.lat, CONFIG.lon))
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    times = [start + timedelta(minutes=10 * i) for i in range(365 * 24 * 6)]
+
+    def run() -> None:
+        for t in times:
+            scheduler.get_state(t)
+
+    return timed(run, repeat, len(times))
+
+
+def bench_get_pending_images(repeat: int, spool_sizes: list) -> dict:
+    """`ImageManager.get_pending_images` on spools of different sizes"""
+    results = {}
+    for size in spool_sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            s3im = S3ImageManager("bucket", LocalS3Manager(Path(tmp) / "s3"), Path(tmp) / "app", CONFIG)
+            make_spool(s3im.pending_directory, size)
+            results[str(size)] = timed(s3im.get_pending_images, repeat, size)
+    return results
+
+
+def bench_naming(repeat: int, count: int) -> dict:
+    """`get_image_name` and `partition_path` throughput"""
+    with tempfile.TemporaryDirectory() as tmp:
+        s3im = S3ImageManager("bucket", LocalS3Manager(Path(tmp) / "s3"), Path(tmp) / "app", CONFIG)
+        names = [s3im.get_image_name() for _ in range(count)]
+
+        def get_names() -> None:
+            for _ in range(count):
+                s3im.get_image_name()
+
+        def partition() -> None:
+            for name in names:
+                s3im.partition_path(name)
+
+        return {
+            "get_image_name": timed(get_names, repeat, count),
+            "partition_path": timed(partition, repeat, count),
+        }
+
+
+def bench_upload_pending(repeat: int, count: int, image_size: int) -> dict:
+    """End to end `upload_pending` against the local S3 stand-in"""
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            s3im = S3ImageManager("bucket", LocalS3Manager(Path(tmp) / "s3"), Path(tmp) / "app", CONFIG)
+            make_spool(s3im.pending_directory, count, image_size)
+            start = time.perf_counter()
+            s3im.upload_pending()
+            runs.append(time.perf_counter() - start)
+    return summarise(runs, count)
+
+
+def git_commit() -> str | None:
+    """Gets the commit being benchmarked, None outside a git checkout"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """Flattens nested results into a map of benchmark name to result"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if "best_s" in value:
+            flat[name] = value
+        else:
+            flat.update(flatten(value, f"{name}."))
+    return flat
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Compares each benchmark with a baseline run
+    Returns:
+        The names of benchmarks that got slower by more than the tolerance
+    """
+    current, previous = flatten(results["benchmarks"]), flatten(baseline["benchmarks"])
+    regressions = []
+    for name, result in current.items():
+        if name not in previous:
+            continue
+        ratio = result["best_s"] / previous[name]["best_s"] if previous[name]["best_s"] else 1.0
+        result["baseline_ratio"] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--spool-sizes", type=int, nargs="+", default=[10, 10_000, 100_000])
+    parser.add_argument("--names", type=int, default=10_000)
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--image-size", type=int, default=200 * 1024)
+    parser.add_argument("--output", type=Path, help="File to write the results to as well as stdout")
+    parser.add_argument("--compare", type=Path, help="Results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Slowdown allowed before failing, 0.2 is 20%%")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "benchmarks": {
+            "scheduler_get_state": bench_get_state(args.repeat),
+            "get_pending_images": bench_get_pending_images(args.repeat, args.spool_sizes),
+            "naming": bench_naming(args.repeat, args.names),
+            "upload_pending": bench_upload_pending(args.repeat, args.uploads, args.image_size),
+        },
+    }
+
+    regressions = []
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        results["baseline_commit"] = baseline.get("commit")
+        regressions = compare(results, baseline, args.tolerance)
+        results["regressions"] = regressions
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,19 @@
-import autosemver
+from functools import lru_cache
 
-try:
-    __version__ = autosemver.packaging.get_current_version(project_name="dri-raspberrycam")
-except Exception:
-    __version__ = "0.0.0"
+
+@lru_cache(maxsize=None)
+def _get_version() -> str:
+    """Resolves the package version, which means inspecting git or the package metadata"""
+    # autosemver pulls in pkg_resources, so it is only imported when the version is asked for
+    import autosemver  # noqa: PLC0415
+
+    try:
+        return autosemver.packaging.get_current_version(project_name="dri-raspberrycam")
+    except Exception:
+        return "0.0.0"
+
+
+def __getattr__(name: str) -> str:
+    if name == "__version__":
+        return _get_version()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
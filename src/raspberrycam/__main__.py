@@ -3,25 +3,33 @@
 import argparse
 import logging
 import os
+from pathlib import Path
 
-from dotenv import load_dotenv
 from platformdirs import user_data_dir
 
-from raspberrycam.camera import PiCamera
+from raspberrycam.breaker import CircuitBreaker
+from raspberrycam.budget import BandwidthController, build_ladder
+from raspberrycam.camera import MountedCamera, create_camera
 from raspberrycam.config import load_config
 from raspberrycam.core import Raspberrycam
 from raspberrycam.image import S3ImageManager
 from raspberrycam.location import Location
 from raspberrycam.logger import setup_logging
+from raspberrycam.multipart import MultipartUploader
+from raspberrycam.raspberrypi import DebugPower, GovernorMode, PowerMode, PowerProfileManager, RaspberryPiPower
 from raspberrycam.s3 import S3Manager
 from raspberrycam.scheduler import FdriScheduler
-
-# Read environment variables for AWS connection
-load_dotenv()
+from raspberrycam.uploader import BackgroundUploader
+from raspberrycam.watcher import create_watcher
+from raspberrycam.window import UploadWindow, parse_hours
 
 
 def main(debug: bool = False, interval: int = 10800) -> None:
     """Example invocation of the RasberryCam class"""
+    from dotenv import load_dotenv  # noqa: PLC0415
+
+    # Read environment variables for AWS connection
+    load_dotenv()
 
     # This will throw an error and complain if keys aren't set,
     # Or if the config file can't be found.
@@ -32,7 +40,27 @@ def main(debug: bool = False, interval: int = 10800) -> None:
 
     location = Location(latitude=config.lat, longitude=config.lon)
     scheduler = FdriScheduler(location)
-    camera = PiCamera(1024, 768)
+    camera = None
+    cameras = None
+    if not config.cameras:
+        camera = create_camera(config.camera, config.image_width, config.image_height, quality=config.quality)
+    else:
+        # Each camera can override the site's camera settings
+        cameras = [
+            MountedCamera(
+                create_camera(
+                    mount.get("camera", config.camera),
+                    mount.get("image_width", config.image_width),
+                    mount.get("image_height", config.image_height),
+                    quality=mount.get("quality", config.quality),
+                    camera_num=mount.get("index", index),
+                ),
+                direction=mount.get("direction"),
+                vflip=mount.get("vflip", True),
+                hflip=mount.get("hflip", False),
+            )
+            for index, mount in enumerate(config.cameras)
+        ]
 
     # Option to set these in .env - they will load automatically
     AWS_ROLE_ARN = os.environ["AWS_ROLE_ARN"]
@@ -40,18 +68,115 @@ def main(debug: bool = False, interval: int = 10800) -> None:
     AWS_ACCESS_KEY_ID = os.environ["AWS_ACCESS_KEY_ID"]
     AWS_SECRET_ACCESS_KEY = os.environ["AWS_SECRET_ACCESS_KEY"]
 
+    multipart = None
+    if config.resumable_uploads:
+        multipart = MultipartUploader(
+            Path(user_data_dir("raspberrycam")) / "multipart", threshold=config.multipart_threshold
+        )
+
     s3_manager = S3Manager(
-        role_arn=AWS_ROLE_ARN, access_key_id=AWS_ACCESS_KEY_ID, secret_access_key=AWS_SECRET_ACCESS_KEY
+        role_arn=AWS_ROLE_ARN,
+        access_key_id=AWS_ACCESS_KEY_ID,
+        secret_access_key=AWS_SECRET_ACCESS_KEY,
+        max_pool_connections=max(10, config.upload_workers),
+        breaker=CircuitBreaker(
+            failure_threshold=config.s3_failure_threshold,
+            base_delay=config.s3_retry_delay,
+            max_delay=config.s3_max_retry_delay,
+        ),
+        multipart=multipart,
     )
     # The other config options form part of the filename
-    image_manager = S3ImageManager(AWS_BUCKET_NAME, s3_manager, user_data_dir("raspberrycam"), config)
+    image_manager = S3ImageManager(
+        AWS_BUCKET_NAME,
+        s3_manager,
+        user_data_dir("raspberrycam"),
+        config,
+        upload_workers=config.upload_workers,
+        use_journal=config.journal,
+        bundle=config.bundle,
+        bundle_max_files=config.bundle_max_files,
+        bundle_max_bytes=config.bundle_max_bytes,
+        newest_first=config.newest_first,
+        max_bytes_per_second=config.max_upload_rate,
+        held_back_max_files=config.held_back_max_files,
+    )
 
     log_level = logging.INFO
     if debug:
         log_level = logging.DEBUG
-    setup_logging(filename=image_manager.log_file, level=log_level)
+    setup_logging(
+        filename=image_manager.log_file,
+        level=log_level,
+        queued=config.queued_logging,
+        flush_interval=config.log_flush_interval,
+    )
+    scheduler.load_sun_table(Path(user_data_dir("raspberrycam")) / "sun_table.npz")
+
+    power_profile = PowerProfileManager(idle_mode=GovernorMode(config.idle_governor), debug=debug)
+
+    uploader = None
+    if config.background_upload:
+        uploader = BackgroundUploader(
+            image_manager,
+            max_queue_size=config.upload_queue_size,
+            debug=debug,
+            power_profile=power_profile,
+            watcher=create_watcher(image_manager.pending_directory) if config.watch_pending else None,
+        )
+
+    change_detector = None
+    if config.skip_duplicates:
+        from raspberrycam.changes import ChangeDetector  # noqa: PLC0415
+
+        change_detector = ChangeDetector(threshold=config.duplicate_threshold, max_skipped=config.max_skipped)
+
+    bandwidth = None
+    if config.daily_byte_budget:
+        # Default to the configured size, three quarters of it and half of it
+        resolutions = config.resolutions or [
+            (config.image_width * scale // 4, config.image_height * scale // 4) for scale in (4, 3, 2)
+        ]
+        qualities = range(config.quality, config.min_quality - 1, -10)
+        bandwidth = BandwidthController(
+            config.daily_byte_budget,
+            build_ladder(resolutions, qualities),
+            state_file=image_manager.base_directory / "budget.json",
+        )
+
+    upload_window = None
+    if config.night_drain or config.off_peak_hours:
+        upload_window = UploadWindow(
+            drain_when_off=config.night_drain,
+            off_peak=[parse_hours(hours) for hours in config.off_peak_hours or []],
+            drain_margin=config.drain_margin,
+            on_time_newest=config.on_time_newest or None,
+        )
+
+    metrics_file = None
+    if config.metrics:
+        metrics_file = image_manager.base_directory / ("metrics.json" if config.metrics == "json" else "metrics.prom")
+
     app = Raspberrycam(
-        scheduler=scheduler, camera=camera, image_manager=image_manager, capture_interval=interval, debug=debug
+        scheduler=scheduler,
+        camera=camera,
+        image_manager=image_manager,
+        capture_interval=interval,
+        debug=debug,
+        uploader=uploader,
+        power_mode=PowerMode(config.power_mode),
+        power=DebugPower() if debug else RaspberryPiPower(),
+        power_profile=power_profile,
+        wake_warmup=config.wake_warmup,
+        jump_check_interval=config.jump_check_interval,
+        in_memory=config.in_memory,
+        change_detector=change_detector,
+        discard_skipped=config.discard_skipped,
+        bandwidth=bandwidth,
+        metrics_file=metrics_file,
+        cameras=cameras,
+        parallel_capture=config.parallel_capture,
+        upload_window=upload_window,
     )
     app.run()
 
@@ -0,0 +1,170 @@
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+from enum import StrEnum
+
+from raspberrycam.clock import Clock
+from raspberrycam.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BREAKER_STATE = REGISTRY.gauge(
+    "raspberrycam_s3_circuit_state", "State of the S3 circuit, 0 closed, 1 half open, 2 open"
+)
+NEXT_RETRY = REGISTRY.gauge(
+    "raspberrycam_s3_next_retry_timestamp_seconds",
+    "Unix time of the next retry while the S3 circuit is open, 0 if closed",
+)
+BREAKER_OPENED = REGISTRY.counter("raspberrycam_s3_circuit_opened_total", "Times the S3 circuit opened")
+CALLS_SKIPPED = REGISTRY.counter("raspberrycam_s3_calls_skipped_total", "S3 and STS calls skipped by the open circuit")
+
+
+class BreakerState(StrEnum):
+    """States of a circuit breaker"""
+
+    CLOSED = "closed"
+    """Calls go through as normal"""
+    OPEN = "open"
+    """Calls are skipped until the next retry time"""
+    HALF_OPEN = "half_open"
+    """One trial call is let through to see whether the link is back"""
+
+
+STATE_VALUES = {BreakerState.CLOSED: 0, BreakerState.HALF_OPEN: 1, BreakerState.OPEN: 2}
+"""Value of each state in the metrics"""
+
+
+class CircuitBreaker:
+    """Tracks failing calls to a remote service and stops making them while it is down.
+
+    After `failure_threshold` failures in a row the circuit opens and calls are skipped without
+    touching the network. Once the retry delay has passed one trial call is let through: if it
+    succeeds the circuit closes, otherwise it opens again for twice as long, up to `max_delay`.
+    Delays are shortened by a random amount so that devices that lost the link together don't all
+    retry at the same moment.
+    """
+
+    failure_threshold: int
+    """Failures in a row that open the circuit"""
+
+    base_delay: float
+    """Seconds before the first retry"""
+
+    max_delay: float
+    """Longest time in seconds between retries"""
+
+    jitter: float
+    """Largest fraction that each delay is shortened by at random"""
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        base_delay: float = 30,
+        max_delay: float = 3600,
+        jitter: float = 0.5,
+        clock: Clock | None = None,
+    ) -> None:
+        """
+        Args:
+            failure_threshold: Failures in a row that open the circuit
+            base_delay: Seconds before the first retry
+            max_delay: Longest time in seconds between retries
+            jitter: Largest fraction that each delay is shortened by at random, from 0-1
+            clock: Source of time, defaults to the system clock
+        """
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.clock = clock or Clock()
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._opened = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> BreakerState:
+        """The current state"""
+        return self._state
+
+    @property
+    def blocked(self) -> bool:
+        """Whether calls would be skipped right now, without using up the trial call"""
+        with self._lock:
+            if self._state == BreakerState.OPEN:
+                return self.clock.monotonic() < self._retry_at
+            return self._state == BreakerState.HALF_OPEN
+
+    def retry_in(self) -> float | None:
+        """Gets how long until the next trial call is let through
+        Returns:
+            Seconds until the retry, 0 if it is due, None if the circuit isn't open
+        """
+        with self._lock:
+            if self._state != BreakerState.OPEN:
+                return None
+            return max(0.0, self._retry_at - self.clock.monotonic())
+
+    def next_retry(self) -> datetime | None:
+        """Gets when the next trial call is let through
+        Returns:
+            The wall-clock time of the retry, None if the circuit isn't open
+        """
+        retry_in = self.retry_in()
+        if retry_in is None:
+            return None
+        return self.clock.now() + timedelta(seconds=retry_in)
+
+    def allow(self) -> BreakerState | None:
+        """Checks whether a call can be made. When the circuit is open and the retry is due, this
+            lets the trial call through and holds back every other call until it finishes
+        Returns:
+            The state the call was let through in, HALF_OPEN only for the one caller holding the trial,
+                or None to skip the call. A call that is made must then be reported with `record_success`
+                or `record_failure`
+        """
+        with self._lock:
+            if self._state == BreakerState.CLOSED:
+                return BreakerState.CLOSED
+            if self._state == BreakerState.OPEN and self.clock.monotonic() >= self._retry_at:
+                self._set_state(BreakerState.HALF_OPEN)
+                logger.info("Retrying S3 after backing off")
+                return BreakerState.HALF_OPEN
+        CALLS_SKIPPED.inc()
+        return None
+
+    def record_success(self) -> None:
+        """Records a successful call, closing the circuit"""
+        with self._lock:
+            if self._state != BreakerState.CLOSED:
+                logger.info("S3 is reachable again")
+            self._failures = 0
+            self._opened = 0
+            self._set_state(BreakerState.CLOSED)
+            NEXT_RETRY.set(0)
+
+    def record_failure(self) -> None:
+        """Records a failed call, opening the circuit once there have been too many"""
+        with self._lock:
+            self._failures += 1
+            if self._state == BreakerState.OPEN:
+                # A call that started before the circuit opened
+                return
+            if self._state == BreakerState.CLOSED and self._failures < self.failure_threshold:
+                return
+
+            delay = min(self.max_delay, self.base_delay * 2**self._opened)
+            delay *= 1 - random.uniform(0, self.jitter)
+            self._opened += 1
+            self._retry_at = self.clock.monotonic() + delay
+            self._set_state(BreakerState.OPEN)
+            BREAKER_OPENED.inc()
+            NEXT_RETRY.set(self.clock.now().timestamp() + delay)
+            logger.warning(f"S3 unavailable after {self._failures} failures, next retry in {delay:.0f}s")
+
+    def _set_state(self, state: BreakerState) -> None:
+        """Changes state and updates the metric, called with the lock held"""
+        self._state = state
+        BREAKER_STATE.set(STATE_VALUES[state])
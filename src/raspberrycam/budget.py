@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CaptureSettings:
+    """Resolution and JPEG quality of a capture"""
+
+    width: int
+    """Image width in pixels"""
+    height: int
+    """Image height in pixels"""
+    quality: int
+    """JPEG quality from 1-100"""
+
+    @property
+    def cost(self) -> float:
+        """Relative size of a JPEG taken with these settings, used to compare settings with each other.
+        JPEG size grows with the pixel count and steeply with quality towards the top of the scale."""
+        return self.width * self.height * (self.quality / (101 - self.quality)) ** 0.5
+
+    def __str__(self) -> str:
+        return f"{self.width}x{self.height} q{self.quality}"
+
+
+def build_ladder(resolutions: Iterable[Tuple[int, int]], qualities: Iterable[int]) -> List[CaptureSettings]:
+    """Combines resolutions and qualities into a list of settings, most expensive first
+    Args:
+        resolutions: Image sizes as (width, height)
+        qualities: JPEG qualities from 1-100
+    Returns:
+        Every combination ordered from largest to smallest expected image
+    """
+    ladder = {CaptureSettings(width, height, quality) for width, height in resolutions for quality in qualities}
+    return sorted(ladder, key=lambda settings: settings.cost, reverse=True)
+
+
+class BandwidthController:
+    """Chooses the resolution and quality of each capture so a day's images fit in a byte budget.
+
+    The size of the next image is predicted from a moving average of recent images' bytes per unit
+    of cost, which follows changes in how much detail is in the scene. Each capture gets an even
+    share of what is left of the day's budget, and the best settings predicted to fit are used.
+    The day's spend is kept in `state_file`, so a restart partway through the day doesn't hand
+    out the whole budget again.
+    """
+
+    daily_budget: int
+    """Bytes that can be uploaded each day"""
+
+    ladder: List[CaptureSettings]
+    """Available settings, most expensive first"""
+
+    smoothing: float
+    """Weight of the newest image in the moving average of image sizes, from 0-1"""
+
+    headroom: float
+    """Fraction of each capture's share of the budget kept back for images larger than predicted"""
+
+    state_file: Path | None
+    """File the day's spend and the size estimate are kept in between runs, None keeps them in memory"""
+
+    def __init__(
+        self,
+        daily_budget: int,
+        ladder: List[CaptureSettings],
+        smoothing: float = 0.3,
+        headroom: float = 0.1,
+        state_file: Path | None = None,
+    ) -> None:
+        """
+        Args:
+            daily_budget: Bytes that can be uploaded each day
+            ladder: Available settings, most expensive first
+            smoothing: Weight of the newest image in the moving average of image sizes
+            headroom: Fraction of each capture's share of the budget kept back for larger images than predicted
+            state_file: File the day's spend is kept in between runs, None keeps it in memory
+        """
+        if not ladder:
+            raise ValueError("At least one capture setting is needed")
+        self.daily_budget = daily_budget
+        self.ladder = ladder
+        self.smoothing = smoothing
+        self.headroom = headroom
+        self.state_file = Path(state_file) if state_file else None
+        self._bytes_per_cost: float | None = None
+        self._day: date | None = None
+        self._spent = 0
+        self._load_state()
+
+    def spent(self, day: date) -> int:
+        """Gets the bytes used on a day
+        Args:
+            day: The day to check
+        Returns:
+            Bytes recorded on that day
+        """
+        return self._spent if day == self._day else 0
+
+    def remaining(self, day: date) -> int:
+        """Gets the bytes left in a day's budget
+        Args:
+            day: The day to check
+        Returns:
+            Bytes that can still be used, never negative
+        """
+        return max(0, self.daily_budget - self.spent(day))
+
+    def estimate(self, settings: CaptureSettings) -> float | None:
+        """Predicts the size of an image
+        Args:
+            settings: The capture settings
+        Returns:
+            Expected size in bytes, None before any image has been recorded
+        """
+        if self._bytes_per_cost is None:
+            return None
+        return self._bytes_per_cost * settings.cost
+
+    def next_settings(self, day: date, captures_remaining: int) -> CaptureSettings:
+        """Chooses the settings for the next capture
+        Args:
+            day: The day the capture is taken on
+            captures_remaining: Number of captures left in the day, including this one
+        Returns:
+            The most expensive settings expected to fit this capture's share of the budget,
+            or the cheapest settings if none do
+        """
+        allowance = (1 - self.headroom) * self.remaining(day) / max(1, captures_remaining)
+        if self._bytes_per_cost is None:
+            # Nothing to go on yet, so start in the middle and learn from the result
+            return self.ladder[len(self.ladder) // 2]
+        for settings in self.ladder:
+            if self.estimate(settings) <= allowance:
+                return settings
+        return self.ladder[-1]
+
+    def record(self, day: date, settings: CaptureSettings, size: int, uploaded: bool = True) -> None:
+        """Records the size of a captured image
+        Args:
+            day: The day the image was captured
+            settings: The settings used for the capture
+            size: Size of the image in bytes
+            uploaded: Whether the image counts towards the budget, images that are held back don't
+        """
+        if day != self._day:
+            self._day = day
+            self._spent = 0
+        if uploaded:
+            self._spent += size
+
+        bytes_per_cost = size / settings.cost
+        if self._bytes_per_cost is None:
+            self._bytes_per_cost = bytes_per_cost
+        else:
+            self._bytes_per_cost += self.smoothing * (bytes_per_cost - self._bytes_per_cost)
+        self._save_state()
+        logger.info(
+            f"Captured {size / 1024:.2f}KB at {settings}, "
+            f"{self.remaining(day) / 1024:.2f}KB of today's budget remaining"
+        )
+
+    def _load_state(self) -> None:
+        """Picks up the day's spend and the size estimate from the state file, if there is one"""
+        if not self.state_file or not self.state_file.exists():
+            return
+        try:
+            state = json.loads(self.state_file.read_text())
+            self._day = date.fromisoformat(state["day"])
+            self._spent = int(state["spent"])
+            self._bytes_per_cost = state.get("bytes_per_cost")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable budget state {self.state_file}: {e}")
+
+    def _save_state(self) -> None:
+        """Writes the state file, replacing the old one atomically so a crash never leaves half of it"""
+        if not self.state_file or self._day is None:
+            return
+        state = {"day": self._day.isoformat(), "spent": self._spent, "bytes_per_cost": self._bytes_per_cost}
+        tmp_path = self.state_file.with_name(f".{self.state_file.name}.tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            # The budget still works for this run, it just starts over if the app restarts today
+            logger.error(f"Failed to save budget state to {self.state_file}: {e}")
@@ -0,0 +1,85 @@
+import io
+import json
+import logging
+import os
+import tarfile
+from pathlib import Path
+from typing import List, TypedDict
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.json"
+"""Name of the index member written at the end of every bundle"""
+
+
+class BundleMember(TypedDict):
+    """Index entry for an image stored in a bundle"""
+
+    name: str
+    offset: int
+    size: int
+
+
+def plan_bundles(images: List[Path], max_files: int, max_bytes: int) -> List[List[Path]]:
+    """Splits images into groups that fit within the bundle limits.
+    A single image larger than `max_bytes` gets a bundle of its own.
+    Args:
+        images: The image files to bundle
+        max_files: Maximum number of images in a bundle
+        max_bytes: Maximum combined size of the images in a bundle
+    Returns:
+        A list of image groups
+    """
+    bundles: List[List[Path]] = []
+    current: List[Path] = []
+    current_bytes = 0
+    for image in images:
+        size = os.path.getsize(image)
+        if current and (len(current) >= max_files or current_bytes + size > max_bytes):
+            bundles.append(current)
+            current, current_bytes = [], 0
+        current.append(image)
+        current_bytes += size
+    if current:
+        bundles.append(current)
+    return bundles
+
+
+def write_bundle(images: List[Path], destination: Path) -> List[BundleMember]:
+    """Writes images to an uncompressed tar file followed by an index of where each one starts.
+    The index lets a reader pull a single image out with a ranged GET.
+    Args:
+        images: The image files to bundle
+        destination: Path of the tar file to write
+    Returns:
+        The index of bundle members
+    """
+    index: List[BundleMember] = []
+    # JPEGs don't compress any further, so a plain tar keeps the offsets useful
+    with tarfile.open(destination, "w") as tar:
+        for image in images:
+            tarinfo = tar.gettarinfo(image, arcname=Path(image).name)
+            with open(image, "rb") as f:
+                tar.addfile(tarinfo, f)
+            # The data ends at the current offset, padded to a whole number of blocks
+            padded_size = -(-tarinfo.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            index.append({"name": tarinfo.name, "offset": tar.offset - padded_size, "size": tarinfo.size})
+
+        data = json.dumps(index).encode()
+        tarinfo = tarfile.TarInfo(INDEX_NAME)
+        tarinfo.size = len(data)
+        tar.addfile(tarinfo, io.BytesIO(data))
+
+    logger.debug(f"Wrote bundle of {len(images)} images to {destination}")
+    return index
+
+
+def read_index(bundle: Path) -> List[BundleMember]:
+    """Reads the index of a bundle
+    Args:
+        bundle: Path of the tar file
+    Returns:
+        The index of bundle members
+    """
+    with tarfile.open(bundle, "r") as tar:
+        return json.load(tar.extractfile(INDEX_NAME))
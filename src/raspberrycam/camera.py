@@ -1,13 +1,21 @@
+import io
 import logging
 import os
 import subprocess
+import tempfile
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
+from typing import Any, BinaryIO, Callable
 
-from picamzero import Camera
+from raspberrycam.metrics import REGISTRY
 
 logger = logging.getLogger(__name__)
 
+CAPTURE_SECONDS = REGISTRY.histogram("raspberrycam_capture_seconds", "Time taken to capture an image")
+CAPTURE_FAILURES = REGISTRY.counter("raspberrycam_capture_failures_total", "Failed image captures")
+
 
 class CameraInterface(ABC):
     """Abstract implementation of a camera."""
@@ -18,6 +26,9 @@ class CameraInterface(ABC):
     image_height: int
     """Image capture height in pixels"""
 
+    encodes_in_memory: bool = False
+    """Whether `capture_bytes` encodes straight to memory, rather than through a temporary file"""
+
     def __init__(self, image_width: int, image_height: int) -> None:
         """
         Args:
@@ -27,6 +38,16 @@ class CameraInterface(ABC):
         self.image_width = image_width
         self.image_height = image_height
 
+    def configure(self, image_width: int, image_height: int, quality: int | None = None) -> None:
+        """Changes the settings used for the next capture
+        Args:
+            image_width: Width of image in pixels
+            image_height: Height of image in pixels
+            quality: JPEG quality from 1-100, ignored by cameras that don't support it
+        """
+        self.image_width = image_width
+        self.image_height = image_height
+
     @abstractmethod
     def capture_image(self, filepath: Path, vflip: bool = True, hflip: bool = True) -> None:
         """Abstract method defined for capturing an image with the camera
@@ -37,10 +58,28 @@ class CameraInterface(ABC):
             hflip: Whether to flip the image horizontally (mirror), defaults to False
         """
 
+    def capture_bytes(self, vflip: bool = False, hflip: bool = False) -> bytes:
+        """Captures an image and returns it encoded in memory. Cameras that can't encode
+            to memory write to a temporary file and read it back.
+        Args:
+            vflip: Whether to flip the image vertically, defaults to False
+            hflip: Whether to flip the image horizontally, defaults to False
+        Returns:
+            The encoded image, empty if the capture failed
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = Path(tmp) / "capture.jpg"
+            self.capture_image(filepath, vflip=vflip, hflip=hflip)
+            if not filepath.exists():
+                return b""
+            return filepath.read_bytes()
+
 
 class DebugCamera(CameraInterface):
     "Debug camera class used for end to end testing"
 
+    encodes_in_memory = True
+
     def capture_image(self, filepath: Path, vflip: bool = False, hflip: bool = False) -> None:
         """Captures a fake image and writes dummy text to a file.
         Args:
@@ -50,39 +89,53 @@ class DebugCamera(CameraInterface):
         """
 
         try:
-            flip_description = []
-            if vflip:
-                flip_description.append("vertically flipped")
-            if hflip:
-                flip_description.append("horizontally flipped")
-
-            flip_text = f"({', '.join(flip_description)})" if flip_description else ""
-            logger.info(f"Capturing image{flip_text}")
-
-            with open(filepath, "w") as f:
-                content = "Pretend I'm an image"
-                if vflip and hflip:
-                    content = "Pretend I'm an upside-down and mirrored image"
-                elif vflip:
-                    content = "Pretend I'm an upside-down image"
-                elif hflip:
-                    content = "Pretend I'm a mirrored image"
-
-                f.write(content)
+            with open(filepath, "wb") as f:
+                f.write(self.capture_bytes(vflip=vflip, hflip=hflip))
 
             logger.info(f"Wrote fake image to {filepath}")
         except Exception as e:
+            CAPTURE_FAILURES.inc()
             logger.exception("Failed to write image", exc_info=e)
 
+    def capture_bytes(self, vflip: bool = False, hflip: bool = False) -> bytes:
+        """Captures a fake image in memory.
+        Args:
+            vflip: Whether to flip the image vertically, defaults to False
+            hflip: Whether to flip the image horizontally, defaults to False
+        Returns:
+            Dummy text describing the image
+        """
+        flip_description = []
+        if vflip:
+            flip_description.append("vertically flipped")
+        if hflip:
+            flip_description.append("horizontally flipped")
+
+        flip_text = f"({', '.join(flip_description)})" if flip_description else ""
+        logger.info(f"Capturing image{flip_text}")
+
+        content = "Pretend I'm an image"
+        if vflip and hflip:
+            content = "Pretend I'm an upside-down and mirrored image"
+        elif vflip:
+            content = "Pretend I'm an upside-down image"
+        elif hflip:
+            content = "Pretend I'm a mirrored image"
+        return content.encode()
+
 
 class PiCamera(CameraInterface):
     """Implementation for a Rasberry Pi camera module"""
 
-    _camera: Camera
+    _camera: Any
+    """The picamzero camera"""
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
+        # picamzero is only available on a Raspberry Pi
+        from picamzero import Camera  # noqa: PLC0415
+
         self._camera = Camera()
         self._camera.still_size = (self.image_width, self.image_height)
 
@@ -98,33 +151,224 @@ class PiCamera(CameraInterface):
             original_vflip = self._camera.vflip
             original_hflip = self._camera.hflip
 
-            # Apply flip settings
+            # Apply size and flip settings
+            self._camera.still_size = (self.image_width, self.image_height)
             self._camera.vflip = vflip
             self._camera.hflip = hflip
 
             # Take photo
-            self._camera.take_photo(filepath)
+            with CAPTURE_SECONDS.time():
+                self._camera.take_photo(filepath)
 
             # Restore original orientation settings
             self._camera.vflip = original_vflip
             self._camera.hflip = original_hflip
 
         except Exception as e:
+            CAPTURE_FAILURES.inc()
+            logger.exception("Failed to write image", exc_info=e)
+
+
+class CaptureSession(ABC):
+    """An open camera pipeline that can take repeated shots"""
+
+    quality: int
+    """JPEG quality from 1-100"""
+
+    @abstractmethod
+    def capture_file(self, target: Path | BinaryIO) -> None:
+        """Captures a JPEG
+        Args:
+            target: A file path or a writable binary buffer
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Stops the pipeline and releases the camera"""
+
+
+class Picamera2Session(CaptureSession):
+    """A Picamera2 pipeline configured for still capture, kept running between shots"""
+
+    def __init__(
+        self, image_width: int, image_height: int, quality: int, vflip: bool, hflip: bool, camera_num: int = 0
+    ) -> None:
+        """
+        Args:
+            image_width: Width of image in pixels
+            image_height: Height of image in pixels
+            quality: JPEG quality from 1-100
+            vflip: Whether to flip the image vertically
+            hflip: Whether to flip the image horizontally
+            camera_num: Index of the camera, for devices with more than one
+        """
+        # picamera2 and libcamera are only available on a Raspberry Pi
+        from libcamera import Transform  # noqa: PLC0415
+        from picamera2 import Picamera2  # noqa: PLC0415
+
+        self._camera = Picamera2(camera_num)
+        config = self._camera.create_still_configuration(
+            main={"size": (image_width, image_height)}, transform=Transform(vflip=vflip, hflip=hflip)
+        )
+        self._camera.configure(config)
+        self._camera.start()
+        self.quality = quality
+
+    @property
+    def quality(self) -> int:
+        """JPEG quality from 1-100"""
+        return self._camera.options["quality"]
+
+    @quality.setter
+    def quality(self, value: int) -> None:
+        self._camera.options["quality"] = value
+
+    def capture_file(self, target: Path | BinaryIO) -> None:
+        """Captures a JPEG
+        Args:
+            target: A file path or a writable binary buffer
+        """
+        if isinstance(target, (str, Path)):
+            self._camera.capture_file(str(target))
+        else:
+            self._camera.capture_file(target, format="jpeg")
+
+    def close(self) -> None:
+        """Stops the pipeline and releases the camera"""
+        self._camera.stop()
+        self._camera.close()
+
+
+SessionFactory = Callable[[int, int, int, bool, bool], CaptureSession]
+"""Creates a capture session from the width, height, quality, vflip and hflip"""
+
+
+class Picamera2Camera(CameraInterface):
+    """Camera that keeps its capture pipeline open between shots, so sensor start up and
+    exposure settling are paid once rather than for every image"""
+
+    quality: int
+    """Image quality from 1-100"""
+
+    encodes_in_memory = True
+
+    def __init__(self, *args, quality: int = 90, session_factory: SessionFactory = Picamera2Session, **kwargs) -> None:
+        """
+        Args:
+            quality: The camera quality from 1-100
+            session_factory: Creates the capture session, replaced with a fake for testing
+        """
+        super().__init__(*args, **kwargs)
+        self.quality = quality
+        self._session_factory = session_factory
+        self._session: CaptureSession | None = None
+        self._session_settings: tuple | None = None
+
+    def configure(self, image_width: int, image_height: int, quality: int | None = None) -> None:
+        """Changes the settings used for the next capture
+        Args:
+            image_width: Width of image in pixels
+            image_height: Height of image in pixels
+            quality: JPEG quality from 1-100
+        """
+        super().configure(image_width, image_height)
+        if quality is not None:
+            self.quality = quality
+
+    def _get_session(self, vflip: bool, hflip: bool) -> CaptureSession:
+        """Gets the open session, reconfiguring it only if the size or orientation has changed
+        Args:
+            vflip: Whether to flip the image vertically
+            hflip: Whether to flip the image horizontally
+        Returns:
+            A capture session
+        """
+        settings = (self.image_width, self.image_height, vflip, hflip)
+        if self._session is None or settings != self._session_settings:
+            self.close()
+            logger.info(f"Starting capture session {self.image_width}x{self.image_height}")
+            self._session = self._session_factory(self.image_width, self.image_height, self.quality, vflip, hflip)
+            self._session_settings = settings
+        self._session.quality = self.quality
+        return self._session
+
+    def capture_image(self, filepath: Path, vflip: bool = False, hflip: bool = False) -> None:
+        """Captures an image and writes it to file
+        Args:
+            filepath: The output destination
+            vflip: Whether to flip the image vertically, defaults to False
+            hflip: Whether to flip the image horizontally, defaults to False
+        """
+        try:
+            session = self._get_session(vflip, hflip)
+            with CAPTURE_SECONDS.time():
+                session.capture_file(filepath)
+        except Exception as e:
+            CAPTURE_FAILURES.inc()
             logger.exception("Failed to write image", exc_info=e)
+            self.close()
+
+    def capture_bytes(self, vflip: bool = False, hflip: bool = False) -> bytes:
+        """Captures an image and returns it encoded in memory
+        Args:
+            vflip: Whether to flip the image vertically, defaults to False
+            hflip: Whether to flip the image horizontally, defaults to False
+        Returns:
+            The encoded image, empty if the capture failed
+        """
+        buffer = io.BytesIO()
+        try:
+            session = self._get_session(vflip, hflip)
+            with CAPTURE_SECONDS.time():
+                session.capture_file(buffer)
+        except Exception as e:
+            CAPTURE_FAILURES.inc()
+            logger.exception("Failed to capture image", exc_info=e)
+            self.close()
+            return b""
+        return buffer.getvalue()
+
+    def close(self) -> None:
+        """Closes the capture session if one is open"""
+        if self._session is not None:
+            try:
+                self._session.close()
+            except Exception as e:
+                logger.exception("Failed to close capture session", exc_info=e)
+            self._session = None
+            self._session_settings = None
 
 
 class LibCamera(CameraInterface):
     quality: int
     """Image quality from 1-100"""
 
-    def __init__(self, quality: int, *args, **kwargs) -> None:
+    camera_num: int
+    """Index of the camera, for devices with more than one"""
+
+    encodes_in_memory = True
+
+    def __init__(self, quality: int, *args, camera_num: int = 0, **kwargs) -> None:
         """
         Args:
             quality: The camera quality from 1-100
+            camera_num: Index of the camera, for devices with more than one
         """
         super().__init__(*args, **kwargs)
 
         self.quality = quality
+        self.camera_num = camera_num
+
+    def configure(self, image_width: int, image_height: int, quality: int | None = None) -> None:
+        """Changes the settings used for the next capture
+        Args:
+            image_width: Width of image in pixels
+            image_height: Height of image in pixels
+            quality: JPEG quality from 1-100
+        """
+        super().configure(image_width, image_height)
+        if quality is not None:
+            self.quality = quality
 
     def capture_image(self, filepath: Path, vflip: bool = False, hflip: bool = False) -> None:
         """Captures an image and writes it to file
@@ -135,43 +379,83 @@ class LibCamera(CameraInterface):
         """
 
         try:
-            flip_description = []
-            if vflip:
-                flip_description.append("vertically flipped")
-            if hflip:
-                flip_description.append("horizontally flipped")
-
-            flip_text = f"({', '.join(flip_description)})" if flip_description else ""
-            logger.info(f"Capturing image{flip_text}")
-
-            cmd = [
-                "libcamera-still",
-                "--width",
-                str(self.image_width),
-                "--height",
-                str(self.image_height),
-                "--quality",
-                str(self.quality),
-                "-o",
-                filepath,
-            ]
-
-            # Add flip parameters if requested
-            if vflip:
-                cmd.append("--vflip")
-            if hflip:
-                cmd.append("--hflip")
-
-            subprocess.call(cmd)
+            with CAPTURE_SECONDS.time():
+                subprocess.call(self._command(filepath, vflip, hflip))
 
             if os.path.exists(filepath):
                 file_size = os.path.getsize(filepath) / 1024  # KB
                 logger.info(f"Image captured: {filepath} ({file_size:.2f}KB)")
             else:
+                CAPTURE_FAILURES.inc()
                 logger.error("Image capture failed: file not created")
         except Exception as e:
+            CAPTURE_FAILURES.inc()
             logger.error(f"Error capturing image: {e}")
 
+    def capture_bytes(self, vflip: bool = False, hflip: bool = False) -> bytes:
+        """Captures an image and returns it encoded in memory, read from libcamera-still's output
+        Args:
+            vflip: Whether to flip the image vertically, defaults to False
+            hflip: Whether to flip the image horizontally, defaults to False
+        Returns:
+            The encoded image, empty if the capture failed
+        """
+        try:
+            with CAPTURE_SECONDS.time():
+                # "-o -" writes the JPEG to stdout, its log goes to stderr
+                result = subprocess.run(self._command("-", vflip, hflip), capture_output=True, check=False)
+        except Exception as e:
+            CAPTURE_FAILURES.inc()
+            logger.error(f"Error capturing image: {e}")
+            return b""
+
+        if result.returncode != 0 or not result.stdout:
+            CAPTURE_FAILURES.inc()
+            logger.error(f"Image capture failed: {result.stderr.decode(errors='replace').strip()}")
+            return b""
+        logger.info(f"Image captured ({len(result.stdout) / 1024:.2f}KB)")
+        return result.stdout
+
+    def _command(self, output: Path | str, vflip: bool, hflip: bool) -> list:
+        """Builds the libcamera-still command for a capture
+        Args:
+            output: File to write the image to, "-" for stdout
+            vflip: Whether to flip the image vertically
+            hflip: Whether to flip the image horizontally
+        Returns:
+            The command and its arguments
+        """
+        flip_description = []
+        if vflip:
+            flip_description.append("vertically flipped")
+        if hflip:
+            flip_description.append("horizontally flipped")
+
+        flip_text = f"({', '.join(flip_description)})" if flip_description else ""
+        logger.info(f"Capturing image{flip_text}")
+
+        cmd = [
+            "libcamera-still",
+            "--width",
+            str(self.image_width),
+            "--height",
+            str(self.image_height),
+            "--quality",
+            str(self.quality),
+            "-o",
+            output,
+        ]
+
+        if self.camera_num:
+            cmd.extend(["--camera", str(self.camera_num)])
+
+        # Add flip parameters if requested
+        if vflip:
+            cmd.append("--vflip")
+        if hflip:
+            cmd.append("--hflip")
+        return cmd
+
     def power_on(self) -> None:
         """Turns on the physical camera"""
 
@@ -191,3 +475,45 @@ class LibCamera(CameraInterface):
                 subprocess.run(["sudo", "rmmod", "bcm2835-isp"], check=False)
         except Exception as e:
             logger.error(f"Failed to turn off camera: {e}")
+
+
+def create_camera(
+    backend: str, image_width: int, image_height: int, quality: int = 90, camera_num: int = 0
+) -> CameraInterface:
+    """Creates a camera from the name of its backend
+    Args:
+        backend: One of "picamzero", "picamera2", "libcamera" or "debug"
+        image_width: Width of image in pixels
+        image_height: Height of image in pixels
+        quality: JPEG quality from 1-100, where the backend supports it
+        camera_num: Index of the camera, for devices with more than one
+    Returns:
+        A camera
+    """
+    if backend == "picamzero":
+        if camera_num:
+            raise ValueError("picamzero only supports the first camera, use picamera2 or libcamera")
+        return PiCamera(image_width, image_height)
+    if backend == "picamera2":
+        return Picamera2Camera(
+            image_width, image_height, quality=quality, session_factory=partial(Picamera2Session, camera_num=camera_num)
+        )
+    if backend == "libcamera":
+        return LibCamera(quality, image_width, image_height, camera_num=camera_num)
+    if backend == "debug":
+        return DebugCamera(image_width, image_height)
+    raise ValueError(f"Unknown camera backend: {backend}")
+
+
+@dataclass
+class MountedCamera:
+    """A camera and how it is mounted at the site"""
+
+    camera: CameraInterface
+    """The camera"""
+    direction: str | None = None
+    """Direction the camera faces, used in image names. None uses the site's direction"""
+    vflip: bool = True
+    """Whether to flip images vertically, the cameras are usually mounted upside down"""
+    hflip: bool = False
+    """Whether to flip images horizontally"""
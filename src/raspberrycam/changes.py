@@ -0,0 +1,135 @@
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def decode_grayscale(image: bytes | Path) -> np.ndarray | None:
+    """Decodes a JPEG to a grayscale array at an eighth of its size, which libjpeg can do
+        without decoding the full resolution image
+    Args:
+        image: The encoded image or the path to it
+    Returns:
+        A 2D array, or None if the image couldn't be decoded
+    """
+    # OpenCV is heavy to import and only needed when change detection is turned on
+    import cv2  # noqa: PLC0415
+
+    if isinstance(image, (str, Path)):
+        return cv2.imread(str(image), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    return cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+
+
+def downsample(gray: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Shrinks an image by averaging blocks of pixels
+    Args:
+        gray: A 2D grayscale image at least `width` by `height` pixels
+        width: Output width
+        height: Output height
+    Returns:
+        A `height` by `width` array of block means
+    """
+    block_height, block_width = gray.shape[0] // height, gray.shape[1] // width
+    cropped = gray[: block_height * height, : block_width * width].astype(np.float32)
+    return cropped.reshape(height, block_height, width, block_width).mean(axis=(1, 3))
+
+
+def difference_hash(gray: np.ndarray, size: int = 8) -> np.ndarray:
+    """Computes a difference hash, which records whether each pixel of a tiny version of the
+        image is brighter than its right hand neighbour. Small changes to the scene, noise and
+        overall brightness leave it mostly unchanged.
+    Args:
+        gray: A 2D grayscale image
+        size: The hash is `size` squared bits
+    Returns:
+        A flat boolean array
+    """
+    small = downsample(gray, size + 1, size)
+    return (small[:, 1:] > small[:, :-1]).ravel()
+
+
+@dataclass
+class ChangeStats:
+    """Counters of the frames seen by a ChangeDetector"""
+
+    kept: int = 0
+    """Frames that were different enough to upload"""
+    skipped: int = 0
+    """Near-duplicate frames that were held back"""
+    bytes_saved: int = 0
+    """Size of the held back frames"""
+
+
+class ChangeDetector:
+    """Compares each frame with the last one uploaded and picks out near-duplicates"""
+
+    threshold: int
+    """Frames whose hash differs from the last uploaded one in this many bits or fewer are near-duplicates"""
+
+    max_skipped: int
+    """A frame is kept after this many near-duplicates in a row, whatever its difference"""
+
+    stats: ChangeStats
+    """Counters of kept and skipped frames"""
+
+    def __init__(self, threshold: int = 4, max_skipped: int = 5) -> None:
+        """
+        Args:
+            threshold: Largest hash difference, in bits out of 64, treated as a near-duplicate
+            max_skipped: Number of near-duplicates in a row before a frame is kept anyway
+        """
+        self.threshold = threshold
+        self.max_skipped = max_skipped
+        self.stats = ChangeStats()
+        self._last_hash: np.ndarray | None = None
+        self._skipped_in_row = 0
+
+    def difference(self, gray: np.ndarray) -> int | None:
+        """Gets the difference between a frame and the last uploaded one
+        Args:
+            gray: A 2D grayscale image
+        Returns:
+            The number of hash bits that differ, None if there is no frame to compare with
+        """
+        if self._last_hash is None:
+            return None
+        return int(np.count_nonzero(difference_hash(gray) != self._last_hash))
+
+    def should_upload(self, image: bytes | Path | np.ndarray, name: str = "", size: int = 0) -> bool:
+        """Decides whether a frame should be uploaded and, if so, remembers it for comparison
+        Args:
+            image: The encoded image, its path, or a decoded grayscale array
+            name: Name of the image, for logging
+            size: Size of the encoded image in bytes, for counting the bandwidth saved
+        Returns:
+            True to upload the frame, False if it is a near-duplicate
+        """
+        try:
+            gray = image if isinstance(image, np.ndarray) else decode_grayscale(image)
+        except Exception as e:
+            logger.exception(f"Failed to decode {name} for change detection", exc_info=e)
+            gray = None
+        if gray is None or gray.shape[0] < 8 or gray.shape[1] < 9:
+            logger.debug(f"Couldn't decode {name} for change detection, uploading it")
+            self.stats.kept += 1
+            return True
+
+        difference = self.difference(gray)
+        if difference is not None and difference <= self.threshold and self._skipped_in_row < self.max_skipped:
+            self._skipped_in_row += 1
+            self.stats.skipped += 1
+            self.stats.bytes_saved += size
+            logger.info(
+                f"Skipping near-duplicate frame {name} (difference {difference} <= {self.threshold}), "
+                f"{self.stats.skipped} skipped so far saving {self.stats.bytes_saved / 1024:.2f}KB"
+            )
+            return False
+
+        self._last_hash = difference_hash(gray)
+        self._skipped_in_row = 0
+        self.stats.kept += 1
+        logger.debug(f"Keeping frame {name} (difference {difference})")
+        return True
@@ -0,0 +1,29 @@
+import time
+from datetime import datetime
+
+from dateutil.tz import tzlocal
+
+
+class Clock:
+    """Source of wall-clock and monotonic time used by the main loop, and the way it sleeps"""
+
+    def now(self) -> datetime:
+        """Gets the current wall-clock time
+        Returns:
+            A timezone aware datetime in the local timezone
+        """
+        return datetime.now(tzlocal())
+
+    def monotonic(self) -> float:
+        """Gets a time in seconds that only ever moves forward, unaffected by clock changes
+        Returns:
+            Seconds from an arbitrary starting point
+        """
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        """Sleeps for a number of seconds
+        Args:
+            seconds: How long to sleep
+        """
+        time.sleep(seconds)
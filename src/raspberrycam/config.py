@@ -1,6 +1,6 @@
 import logging
 from dataclasses import dataclass
-from typing import Optional
+from typing import List, Optional
 
 import yaml
 
@@ -13,6 +13,61 @@ class Config:
     catchment: str
     direction: str
     interval: int
+    camera: str = "picamzero"
+    image_width: int = 1024
+    image_height: int = 768
+    quality: int = 90
+    daily_byte_budget: int = 0
+    min_quality: int = 50
+    resolutions: Optional[List[List[int]]] = None
+    cameras: Optional[List[dict]] = None
+    parallel_capture: bool = False
+    in_memory: bool = False
+    skip_duplicates: bool = False
+    duplicate_threshold: int = 4
+    max_skipped: int = 5
+    discard_skipped: bool = False
+    held_back_max_files: int = 1000
+    upload_workers: int = 1
+    background_upload: bool = False
+    upload_queue_size: int = 100
+    watch_pending: bool = False
+    journal: bool = False
+    bundle: bool = False
+    bundle_max_files: int = 100
+    bundle_max_bytes: int = 8 * 1024 * 1024
+    newest_first: bool = False
+    s3_failure_threshold: int = 3
+    s3_retry_delay: int = 30
+    s3_max_retry_delay: int = 3600
+    max_upload_rate: int = 0
+    resumable_uploads: bool = False
+    multipart_threshold: int = 5 * 1024 * 1024
+    night_drain: bool = False
+    off_peak_hours: Optional[List[str]] = None
+    on_time_newest: int = 0
+    drain_margin: int = 600
+    metrics: Optional[str] = None
+    queued_logging: bool = False
+    log_flush_interval: float = 2.0
+    idle_governor: str = "ondemand"
+    power_mode: str = "always_on"
+    wake_warmup: int = 120
+    jump_check_interval: int = 300
+
+    def __post_init__(self) -> None:
+        """Checks settings that only make sense together"""
+        if self.cameras:
+            # Directions are part of the image names, so two cameras sharing one would overwrite each other
+            directions = [mount.get("direction", self.direction) for mount in self.cameras]
+            duplicates = sorted({direction for direction in directions if directions.count(direction) > 1})
+            if duplicates:
+                raise ConfigurationError(f"Each camera needs its own direction, {', '.join(duplicates)} is used twice")
+        if self.background_upload and (self.night_drain or self.off_peak_hours or self.on_time_newest):
+            # The background uploader sends everything as it arrives and sweeps the rest, so it has no upload window
+            raise ConfigurationError(
+                "night_drain, off_peak_hours and on_time_newest can't be used with background_upload"
+            )
 
 
 class ConfigurationError(Exception):
@@ -31,6 +86,10 @@ def load_config(config_file: Optional[str] = "config.yaml") -> dict:
     try:
         return Config(**config)
 
+    except ConfigurationError as err:
+        logging.error(f"{config_file} is not a valid configuration: {err}")
+        raise
+
     except TypeError as err:
         logging.error(f"{config_file} did not contain all the information it needs")
         logging.error(err)
@@ -1,16 +1,30 @@
+import copy
 import logging
-import time
-from datetime import datetime
-
-from dateutil.tz import tzlocal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, List
 
 from raspberrycam import raspberrypi
-from raspberrycam.camera import CameraInterface
-from raspberrycam.image import S3ImageManager
+from raspberrycam.budget import BandwidthController, CaptureSettings
+from raspberrycam.camera import CameraInterface, MountedCamera
+from raspberrycam.clock import Clock
+from raspberrycam.image import S3ImageManager, UploadReport
+from raspberrycam.metrics import REGISTRY
 from raspberrycam.scheduler import FdriScheduler, ScheduleState
+from raspberrycam.uploader import BackgroundUploader
+from raspberrycam.window import UploadWindow
+
+if TYPE_CHECKING:
+    # Needs numpy and OpenCV, which are only loaded when change detection is turned on
+    from raspberrycam.changes import ChangeDetector
 
 logger = logging.getLogger(__name__)
 
+CAPTURES = REGISTRY.counter("raspberrycam_captures_total", "Images captured")
+BACKLOG = REGISTRY.gauge("raspberrycam_backlog_images", "Images waiting to be uploaded after the last capture")
+
 
 class Raspberrycam:
     """Core class for managing a RasberryPi camera deployment"""
@@ -19,7 +33,13 @@ class Raspberrycam:
     """The scheduler used to control the RasberryPi state"""
 
     camera: CameraInterface
-    """A physical/virtual camera to take images"""
+    """A physical/virtual camera to take images, the first of `cameras`"""
+
+    cameras: List[MountedCamera]
+    """Every camera driven by this process, with the direction each one faces"""
+
+    parallel_capture: bool
+    """Whether the cameras capture at the same time rather than one after another"""
 
     capture_interval: int
     """Frequency of image captures in seconds"""
@@ -27,6 +47,57 @@ class Raspberrycam:
     image_manager: S3ImageManager
     """Image manager used to manipulate image files"""
 
+    uploader: BackgroundUploader | None
+    """Optional background uploader, when set captures are queued instead of uploaded inline"""
+
+    sleep_interval: int | None
+    """Longest single sleep in seconds, None sleeps straight through to the next event"""
+
+    clock: Clock
+    """Source of wall-clock and monotonic time"""
+
+    clock_jump_tolerance: float
+    """Seconds that the wall clock can drift from the monotonic clock during a sleep before
+        it is treated as a jump"""
+
+    jump_check_interval: float
+    """Longest stretch in seconds slept before the wall clock is checked for a jump, so a clock set
+        by NTP or the RTC partway through the night is noticed without waiting for the next event"""
+
+    in_memory: bool
+    """Whether images are uploaded straight from memory, only written to the SD card if that fails"""
+
+    change_detector: "ChangeDetector | None"
+    """Optional check that holds back frames nearly identical to the last one uploaded"""
+
+    discard_skipped: bool
+    """Whether held back near-duplicates are deleted rather than kept on the SD card"""
+
+    bandwidth: BandwidthController | None
+    """Optional controller that picks the resolution and quality of each capture to fit a daily byte budget"""
+
+    metrics_file: Path | None
+    """File that metrics are written to after each capture, None to not write them"""
+
+    upload_window: UploadWindow | None
+    """Optional policy that drains the backlog while OFF and in off-peak hours, None uploads everything after
+        each capture"""
+
+    power_mode: raspberrypi.PowerMode
+    """Whether to stay on or power off between daylight windows"""
+
+    power: raspberrypi.PowerInterface
+    """Power controls used to set the wake alarm and shut down"""
+
+    power_profile: raspberrypi.PowerProfileManager
+    """Sets the CPU governor, raised while uploading"""
+
+    wake_warmup: int
+    """Seconds before the next ON time that the device is woken from deep sleep"""
+
+    min_shutdown: int
+    """Shortest time in seconds worth powering off for, shorter gaps are slept through"""
+
     _intervals_since_last_upload: int
     """Tracks how many images have been captured since the last upload,
         Allows the app to bulk upload images"""
@@ -34,73 +105,386 @@ class Raspberrycam:
     def __init__(
         self,
         scheduler: FdriScheduler,
-        camera: CameraInterface,
+        camera: CameraInterface | None,
         image_manager: S3ImageManager,
         capture_interval: int = 300,
-        sleep_interval: int = 300,
+        sleep_interval: int | None = None,
         debug: bool = False,
+        uploader: BackgroundUploader | None = None,
+        clock: Clock | None = None,
+        clock_jump_tolerance: float = 5,
+        jump_check_interval: float = 300,
+        power_mode: raspberrypi.PowerMode = raspberrypi.PowerMode.ALWAYS_ON,
+        power: raspberrypi.PowerInterface | None = None,
+        power_profile: raspberrypi.PowerProfileManager | None = None,
+        wake_warmup: int = 120,
+        min_shutdown: int = 1800,
+        in_memory: bool = False,
+        change_detector: "ChangeDetector | None" = None,
+        discard_skipped: bool = False,
+        bandwidth: BandwidthController | None = None,
+        metrics_file: Path | None = None,
+        cameras: List[MountedCamera] | None = None,
+        parallel_capture: bool = False,
+        upload_window: UploadWindow | None = None,
     ) -> None:
         """
         Args:
             scheduler: The scheduler used to control the RasberryPi state
-            camera: The camera interface used
+            camera: The camera interface used, mounted upside down and facing the site's direction.
+                Ignored if `cameras` is given
             image_manager: The image management object
+            capture_interval: Seconds between captures
+            sleep_interval: Longest single sleep in seconds, defaults to sleeping until the next event
             debug: Flag to activate debug mode
+            uploader: Background uploader that captured images are handed to
+            clock: Source of time, defaults to the system clock
+            clock_jump_tolerance: Seconds of difference between wall and monotonic time treated as a jump
+            jump_check_interval: Longest stretch in seconds slept before checking for a jump, 0 only
+                checks on waking
+            power_mode: Whether to stay on or power off between daylight windows
+            power: Power controls, defaults to the Raspberry Pi's own
+            power_profile: Sets the CPU governor, defaults to the Raspberry Pi's own
+            wake_warmup: Seconds before the next ON time to wake from deep sleep
+            min_shutdown: Shortest time in seconds worth powering off for
+            in_memory: Upload images straight from memory rather than through the pending directory
+            change_detector: Holds back frames nearly identical to the last one uploaded
+            discard_skipped: Delete held back near-duplicates rather than keeping them on the SD card
+            bandwidth: Picks the resolution and quality of each capture to fit a daily byte budget
+            metrics_file: File to write metrics to after each capture, `.json` for a JSON snapshot or
+                anything else for the Prometheus text format
+            cameras: Several cameras to drive, each with its own direction and orientation
+            parallel_capture: Capture with every camera at once rather than one after another
+            upload_window: Drains the backlog while OFF and in off-peak hours, and can limit uploads
+                after each capture to the newest images
         """
         self.scheduler = scheduler
-        self.camera = camera
+        self.cameras = cameras or [MountedCamera(camera)]
+        self.camera = self.cameras[0].camera
+        self.parallel_capture = parallel_capture
+        self.upload_window = upload_window
         self.capture_interval = capture_interval
         self.sleep_interval = sleep_interval
         self.image_manager = image_manager
         self._intervals_since_last_upload = 0
         self.debug = debug
+        self.uploader = uploader
+        self.clock = clock or Clock()
+        self.clock_jump_tolerance = clock_jump_tolerance
+        self.jump_check_interval = jump_check_interval
+        self.power_mode = power_mode
+        self.power = power or raspberrypi.RaspberryPiPower()
+        self.power_profile = power_profile or raspberrypi.PowerProfileManager(debug=debug)
+        self.wake_warmup = wake_warmup
+        self.min_shutdown = min_shutdown
+        self.in_memory = in_memory
+        if in_memory:
+            for mounted in self.cameras:
+                if not mounted.camera.encodes_in_memory:
+                    logger.warning(
+                        f"{type(mounted.camera).__name__} can't encode to memory, so in_memory captures still go "
+                        "through a temporary file on the SD card. Use the picamera2 or libcamera camera instead"
+                    )
+        self.change_detector = change_detector
+        self.discard_skipped = discard_skipped
+        self.bandwidth = bandwidth
+        self.metrics_file = metrics_file
+        self._change_detectors: dict = {}
+        self._bandwidth_lock = threading.Lock()
+        self._stop_event = threading.Event()
 
     def run(self) -> None:
-        """Runs main loop of code until exited"""
+        """Runs main loop of code until stopped.
 
-        raspberrypi.set_governer(raspberrypi.GovernorMode.ONDEMAND, debug=self.debug)
-        while True:
-            now = datetime.now(tzlocal())
+        Rather than polling, the loop works out the next event - a capture tick while ON,
+        sunset, or the next sunrise - and sleeps until it arrives, only waking early to check
+        the wall clock hasn't jumped.
+        """
+
+        self.power_profile.set_mode(self.power_profile.idle_mode)
+        if self.uploader:
+            self.uploader.start()
+
+        self._stop_event.clear()
+        next_capture = None
+        while not self._stop_event.is_set():
+            now = self.clock.now()
             state = self.scheduler.get_state(now)
 
             if state == ScheduleState.OFF:
-                sleep_for = self.sleep_interval
+                next_capture = None
+                wake_time = self.scheduler.get_next_on_time(now)
+                if self.power_mode == raspberrypi.PowerMode.DEEP_SLEEP and self.deep_sleep(wake_time):
+                    return
+                if self.upload_window and self.upload_window.drain_when_off and not self.uploader:
+                    self.drain_backlog(self.upload_window.drain_deadline(wake_time))
                 # Instead of exiting, wait until the next ON time
-                logger.info("Camera is in OFF state (nighttime), waiting...")
-                next_on_time = self.scheduler.get_next_on_time(now)
-                logger.info(f"Next ON time: {next_on_time}")
-
-                # Sleep until close to the next ON time
-                sleep_duration = (next_on_time - now).total_seconds()
-                if sleep_duration > 0:
-                    # Sleep for most of the duration, but wake up occasionally to check
-                    # In case of time changes, system restarts, etc.
-                    logger.debug(f"waiting for {sleep_duration}")
-                    while sleep_duration > sleep_for:  # 5 minutes
-                        logger.debug(f"sleeping for {sleep_for} seconds")
-                        time.sleep(sleep_for)
-                        sleep_duration -= sleep_for
-                        # Re-check the time in case something changed
-                        now = datetime.now(tzlocal())
-                        if self.scheduler.get_state(now) == ScheduleState.ON:
-                            break
-                        next_on_time = self.scheduler.get_next_on_time(now)
-                        sleep_duration = (next_on_time - now).total_seconds()
-                        logger.debug(f"now waiting for {sleep_duration}")
-
-                    # Sleep the remaining time
-                    if sleep_duration > 0:
-                        time.sleep(sleep_duration)
-                        logger.debug(f"sleeping for {sleep_duration}")
-                continue  # Go back to the start of the loop to check state again
-
-            # Camera is ON - take pictures
-            logger.info("Camera is in ON state, capturing image...")
-            # Flip the image vertically since the camera is mounted upside down
-            self.camera.capture_image(self.image_manager.get_pending_image_path(), vflip=True, hflip=False)
-
-            if len(self.image_manager.get_pending_images()) > 0:
-                raspberrypi.set_governer(raspberrypi.GovernorMode.PERFORMANCE, debug=self.debug)
+                logger.info(f"Camera is in OFF state (nighttime), waiting until next ON time: {wake_time}")
+            else:
+                if next_capture is None or now >= next_capture:
+                    # Keep to the cadence of the ticks rather than drifting by the time spent capturing
+                    next_capture = now.astimezone(timezone.utc) + timedelta(seconds=self.capture_interval)
+                    # Uploads that would run into the next capture are left until after it
+                    self.capture(deadline=next_capture)
+                    now = self.clock.now()
+
+                # Wake up for sunset if it falls before the next capture
+                sunset = self.scheduler.get_next_transition(now)["time"]
+                wake_time = min(next_capture, sunset)
+
+            jump = self._sleep_until(wake_time)
+            if jump and next_capture is not None:
+                next_capture += timedelta(seconds=jump)
+
+    def deep_sleep(self, next_on_time: datetime) -> bool:
+        """Powers the device off until shortly before the next ON time. Pending images are
+            uploaded and logs flushed first, and an RTC alarm is set to wake the device.
+        Args:
+            next_on_time: The next time the camera is ON
+        Returns:
+            True if the device was shut down, False if the gap was too short to be worth it or
+                the wake alarm or power off failed
+        """
+        wake_time = next_on_time - timedelta(seconds=self.wake_warmup)
+        if (wake_time - self.clock.now()).total_seconds() < self.min_shutdown:
+            logger.info(f"Next ON time {next_on_time} is too soon to power off for")
+            return False
+
+        logger.info(f"Entering deep sleep until {wake_time}")
+        if self.uploader:
+            self.uploader.stop()
+        if self.image_manager.pending_count() > 0:
+            with self.power_profile.boost():
                 self.image_manager.upload_pending(debug=self.debug)
 
-            time.sleep(self.capture_interval)
+        for handler in logging.getLogger().handlers:
+            handler.flush()
+
+        try:
+            # Without an alarm the device would stay off until someone visits the site
+            self.power.schedule_wakeup(wake_time)
+            self.power.shutdown()
+        except Exception as e:
+            # Exiting now would only get the process restarted, so carry on until the next ON time
+            logger.error(f"Failed to power off, staying up instead: {e}")
+            if self.uploader:
+                self.uploader.start()
+            return False
+        self._stop_event.set()
+        return True
+
+    def stop(self) -> None:
+        """Stops the main loop after its current sleep, and the background uploader"""
+        self._stop_event.set()
+        if self.uploader:
+            self.uploader.stop()
+
+    def capture(self, deadline: datetime | None = None) -> None:
+        """Captures an image with every camera and uploads them, or hands them to the background uploader
+        Args:
+            deadline: Time after which no more uploads are started, the rest are left pending
+        """
+        logger.info("Camera is in ON state, capturing image...")
+        if self.parallel_capture and len(self.cameras) > 1:
+            with ThreadPoolExecutor(max_workers=len(self.cameras)) as executor:
+                image_paths = list(executor.map(self._capture_camera, range(len(self.cameras))))
+        else:
+            image_paths = [self._capture_camera(index) for index in range(len(self.cameras))]
+
+        CAPTURES.inc(len(self.cameras))
+
+        if self.uploader:
+            for image_path in image_paths:
+                # A watching uploader has already seen the image arrive
+                if image_path is not None and image_path.exists() and not self.uploader.watching:
+                    self.uploader.enqueue(image_path)
+            age = self.uploader.oldest_pending_age()
+            BACKLOG.set(self.uploader.queue_depth)
+            logger.info(
+                f"Upload queue depth: {self.uploader.queue_depth}, "
+                f"oldest pending image: {f'{age:.0f}s' if age is not None else 'none'}"
+            )
+        elif self.image_manager.pending_count() > 0:
+            limit = self.upload_window.on_time_limit(self.clock.now()) if self.upload_window else None
+            with self.power_profile.boost():
+                report = self.image_manager.upload_pending(
+                    debug=self.debug, limit=limit, newest_first=True if limit else None, deadline=deadline
+                )
+            # Older images left for the upload window or after the deadline are part of the backlog too
+            BACKLOG.set(self.image_manager.pending_count() if limit or report.deferred else report.failed)
+        else:
+            BACKLOG.set(0)
+
+        self.write_metrics()
+
+    def drain_backlog(self, deadline: datetime) -> UploadReport:
+        """Uploads the backlog of pending images in batches until it is empty or the deadline passes
+        Args:
+            deadline: Time to stop uploading by
+        Returns:
+            A report of the uploads made
+        """
+        report = UploadReport()
+        if self.image_manager.pending_count() == 0:
+            return report
+
+        logger.info(f"Draining {self.image_manager.pending_count()} pending images until {deadline}")
+        with self.power_profile.boost():
+            while not self._stop_event.is_set() and self.clock.now() < deadline:
+                batch = self.image_manager.get_pending_images(self.upload_window.drain_batch)
+                if not batch:
+                    break
+                self.image_manager.s3_manager.assume_role()
+                batch_report = self.image_manager.upload_images(batch, debug=self.debug, deadline=deadline)
+                report.add(batch_report)
+                # A batch of images deleted behind the journal's back is only skipped, the rest can still go up
+                if batch_report.files == 0 and (batch_report.failed or batch_report.deferred):
+                    logger.warning("Nothing in the last batch was uploaded, leaving the backlog until later")
+                    break
+
+        backlog = self.image_manager.pending_count()
+        BACKLOG.set(backlog)
+        logger.info(f"Drained {report.files} images, {backlog} still pending")
+        self.write_metrics()
+        return report
+
+    def write_metrics(self) -> None:
+        """Writes the metrics file, if there is one"""
+        if not self.metrics_file:
+            return
+        try:
+            REGISTRY.write(self.metrics_file)
+        except OSError as e:
+            logger.error(f"Failed to write metrics to {self.metrics_file}: {e}")
+
+    def _capture_camera(self, index: int) -> Path | None:
+        """Captures an image with one of the cameras
+        Args:
+            index: Position of the camera in `cameras`
+        Returns:
+            The path of the image if it is waiting in the pending directory, otherwise None
+        """
+        mounted = self.cameras[index]
+        settings = self._apply_bandwidth_budget(mounted.camera)
+        change_detector = self._change_detector(index)
+        if self.in_memory:
+            return self._capture_in_memory(settings, mounted, change_detector)
+
+        # Capture to the staging directory so uploaders never see a half-written image
+        image_path = self.image_manager.get_staging_image_path(mounted.direction)
+        mounted.camera.capture_image(image_path, vflip=mounted.vflip, hflip=mounted.hflip)
+        if image_path.exists():
+            size = image_path.stat().st_size
+            keep = not change_detector or change_detector.should_upload(image_path, image_path.name, size)
+            self._record_size(settings, size, keep)
+            if not keep:
+                self.image_manager.hold_back(image_path, discard=self.discard_skipped)
+                return None
+        return self.image_manager.commit(image_path)
+
+    def _change_detector(self, index: int) -> "ChangeDetector | None":
+        """Gets the change detector of a camera. Each camera compares its frames with its own
+            last upload, so the other cameras get copies of `change_detector`
+        Args:
+            index: Position of the camera in `cameras`
+        Returns:
+            The change detector, None if change detection is off
+        """
+        if not self.change_detector or index == 0:
+            return self.change_detector
+        if index not in self._change_detectors:
+            self._change_detectors[index] = copy.deepcopy(self.change_detector)
+        return self._change_detectors[index]
+
+    def _apply_bandwidth_budget(self, camera: CameraInterface) -> CaptureSettings | None:
+        """Sets a camera up for the next capture from what is left of the day's bandwidth budget
+        Args:
+            camera: The camera about to capture
+        Returns:
+            The settings used, None if there is no budget
+        """
+        if not self.bandwidth:
+            return None
+        now = self.clock.now()
+        sunset = self.scheduler.get_next_transition(now)["time"]
+        # The budget is shared by every camera
+        captures_remaining = (int((sunset - now).total_seconds() // self.capture_interval) + 1) * len(self.cameras)
+        with self._bandwidth_lock:
+            settings = self.bandwidth.next_settings(now.date(), captures_remaining)
+        camera.configure(settings.width, settings.height, settings.quality)
+        return settings
+
+    def _record_size(self, settings: CaptureSettings | None, size: int, uploaded: bool) -> None:
+        """Tells the bandwidth controller how large a capture was
+        Args:
+            settings: The settings used for the capture, None if there is no budget
+            size: Size of the image in bytes
+            uploaded: Whether the image will be uploaded
+        """
+        if self.bandwidth and settings:
+            with self._bandwidth_lock:
+                self.bandwidth.record(self.clock.now().date(), settings, size, uploaded=uploaded)
+
+    def _capture_in_memory(
+        self,
+        settings: CaptureSettings | None,
+        mounted: MountedCamera,
+        change_detector: "ChangeDetector | None" = None,
+    ) -> Path | None:
+        """Captures an image into memory and uploads it straight away
+        Args:
+            settings: The settings chosen by the bandwidth controller, if there is one
+            mounted: The camera to capture with
+            change_detector: The camera's change detector, if change detection is on
+        Returns:
+            None if the image was uploaded or the capture failed, otherwise the pending
+            path the image was written to after its upload failed
+        """
+        data = mounted.camera.capture_bytes(vflip=mounted.vflip, hflip=mounted.hflip)
+        if not data:
+            logger.error("Image capture failed: no data returned")
+            return None
+
+        name = self.image_manager.get_image_name(mounted.direction)
+        keep = not change_detector or change_detector.should_upload(data, name, len(data))
+        self._record_size(settings, len(data), keep)
+        if not keep:
+            if not self.discard_skipped:
+                self.image_manager.hold_back_data(data, name)
+            return None
+
+        self.image_manager.s3_manager.assume_role()
+        return self.image_manager.upload_buffer(data, name, debug=self.debug)
+
+    def _sleep_until(self, wake_time: datetime) -> float:
+        """Sleeps until a wall-clock time, measuring the sleep with the monotonic clock
+            so that a change to the system time can be spotted. Long sleeps are broken into
+            stretches of `jump_check_interval` so a jump is spotted soon after it happens
+        Args:
+            wake_time: The time to wake up
+        Returns:
+            The number of seconds the wall clock jumped by while asleep, 0 if it didn't
+        """
+        now = self.clock.now()
+        sleep_duration = (wake_time - now).total_seconds()
+        if sleep_duration <= 0:
+            return 0
+        if self.sleep_interval:
+            sleep_duration = min(sleep_duration, self.sleep_interval)
+
+        logger.debug(f"sleeping for {sleep_duration} seconds")
+        start = self.clock.monotonic()
+        remaining = sleep_duration
+        while remaining > 0 and not self._stop_event.is_set():
+            stretch = min(remaining, self.jump_check_interval or remaining)
+            self.clock.sleep(stretch)
+            remaining -= stretch
+            elapsed = self.clock.monotonic() - start
+
+            # Compared in UTC, as times sharing a timezone are subtracted as wall times, which would
+            # make the clocks changing for daylight saving look like a jump
+            jump = (self.clock.now().astimezone(timezone.utc) - now.astimezone(timezone.utc)).total_seconds() - elapsed
+            if abs(jump) > self.clock_jump_tolerance:
+                logger.warning(f"Wall clock jumped by {jump:.0f}s while sleeping, re-evaluating schedule")
+                return jump
+        return 0
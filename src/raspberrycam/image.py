@@ -1,14 +1,95 @@
+import hashlib
 import logging
 import os
-from datetime import datetime
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import partial
 from pathlib import Path
-from typing import List
+from typing import Callable, List
 
+from raspberrycam.bundle import plan_bundles, read_index, write_bundle
+from raspberrycam.clock import Clock
 from raspberrycam.config import Config
+from raspberrycam.journal import ImageState, UploadJournal
+from raspberrycam.ratelimit import RateLimiter
 from raspberrycam.s3 import S3Manager
 
 logger = logging.getLogger(__name__)
 
+IMAGE_TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+"""Format of the timestamp at the end of every image name"""
+
+STALE_STAGING_AGE = 3600
+"""Seconds after which a capture left in the staging directory is taken to be cut short. Much longer
+than any capture takes, so those another process, such as a simulation or a CLI run, is writing are left alone"""
+
+
+def parse_image_timestamp(image: Path | str) -> datetime | None:
+    """Reads the capture time embedded in an image name by `ImageManager.get_image_name`
+    Args:
+        image: The image path or name
+    Returns:
+        The capture time, or None if the name doesn't end in a timestamp
+    """
+    parts = Path(image).name.split(".")[0].rsplit("_", 2)
+    if len(parts) < 3:
+        return None
+    try:
+        return datetime.strptime(f"{parts[1]}_{parts[2]}", IMAGE_TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def capture_timestamp(image: Path | str) -> float | None:
+    """Gets the capture time embedded in an image name as a unix timestamp
+    Args:
+        image: The image path or name
+    Returns:
+        The timestamp, or None if the name doesn't end in one
+    """
+    captured = parse_image_timestamp(image)
+    return captured.timestamp() if captured else None
+
+
+def capture_order_key(image: Path | str) -> str:
+    """Gets a key that sorts images by the capture time embedded in their names, without parsing it.
+        The timestamp format sorts the same as the times it represents, so comparing the strings is enough.
+    Args:
+        image: The image path or name
+    Returns:
+        The timestamp, or an empty string, which sorts first, if the name doesn't end in one
+    """
+    stem = Path(image).name.split(".")[0]
+    timestamp = stem[-15:]
+    if len(timestamp) == 15 and timestamp[8] == "_" and timestamp[:8].isdigit() and timestamp[9:].isdigit():
+        return timestamp
+    return ""
+
+
+def parse_image_direction(image: Path | str) -> str | None:
+    """Reads the camera direction embedded in an image name by `ImageManager.get_image_name`
+    Args:
+        image: The image path or name
+    Returns:
+        The direction, or None if the name doesn't follow the naming convention
+    """
+    parts = Path(image).name.split(".")[0].rsplit("_", 3)
+    if len(parts) < 4 or parse_image_timestamp(image) is None:
+        return None
+    return parts[1]
+
+
+def _fsync(path: Path) -> None:
+    """Flushes a file or directory to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 
 class ImageManager:
     """Class for managing images"""
@@ -17,32 +98,89 @@ class ImageManager:
     """Base directory of program"""
     pending_directory: Path
     """Directory of images to be uploaded"""
+    staging_directory: Path
+    """Directory captures are written to before they are committed to the pending directory"""
     log_directory: Path
     """Directory for logs"""
+    held_back_directory: Path
+    """Directory for near-duplicate images that were not uploaded"""
+    journal: UploadJournal | None
+    """Optional journal of pending images, used instead of listing the pending directory"""
+    clock: Clock
+    """Source of the time used to name images"""
+    newest_first: bool
+    """Whether pending images are returned newest first, so the latest frame is uploaded before the backlog"""
+    durable: bool
+    """Whether captures are flushed to disk before they are committed to the pending directory"""
+    held_back_max_files: int
+    """Most images kept in the held back directory, the oldest are deleted beyond it. 0 keeps them all"""
 
-    def __init__(self, base_directory: Path, config: Config) -> None:
+    def __init__(
+        self,
+        base_directory: Path,
+        config: Config,
+        use_journal: bool = False,
+        clock: Clock | None = None,
+        newest_first: bool = False,
+        durable: bool = True,
+        held_back_max_files: int = 1000,
+    ) -> None:
         """
         Args:
             base_directory: Base directory of the program
+            config: Installation specific configuration
+            use_journal: Track pending images in a journal rather than listing the pending directory
+            clock: Source of the time used to name images, defaults to the system clock
+            newest_first: Return pending images newest first by default
+            durable: Flush captures to disk before committing them, only worth turning off in simulations
+            held_back_max_files: Most images kept in the held back directory, 0 keeps them all
         """
         if not isinstance(base_directory, Path):
             base_directory = Path(base_directory)
         self.base_directory = base_directory
         self.pending_directory = base_directory / "pending_uploads"
+        self.staging_directory = base_directory / "staging"
         self.log_directory = base_directory / "logs"
+        self.held_back_directory = base_directory / "held_back"
         self.log_file = self.log_directory / "log.log"
 
         # Installation-specific file naming conventions set in config.yaml
         self.config = config
+        self.clock = clock or Clock()
+        self.newest_first = newest_first
+        self.durable = durable
+        self.held_back_max_files = held_back_max_files
 
         self._initialize_directories()
+        self._clear_staging()
+
+        self.journal = None
+        if use_journal:
+            self.journal = UploadJournal(base_directory / "journal.sqlite3")
+            self.journal.rebuild(self.pending_directory, capture_time=capture_timestamp)
 
     def _initialize_directories(self) -> None:
         """Creates app directories if they don't exist already"""
-        for path in [self.base_directory, self.pending_directory, self.log_directory]:
+        for path in [self.base_directory, self.pending_directory, self.staging_directory, self.log_directory]:
             if not path.exists():
                 os.makedirs(path)
 
+    def _clear_staging(self) -> None:
+        """Deletes captures left in the staging directory, which were cut short by a crash or power cut.
+        Only stale ones are deleted, as another process sharing the directory may be writing the rest"""
+        # File times are real time, whatever clock the app is running on
+        now = time.time()
+        for name in os.listdir(self.staging_directory):
+            path = self.staging_directory / name
+            try:
+                if now - path.stat().st_mtime < STALE_STAGING_AGE:
+                    continue
+                logger.warning(f"Deleting incomplete capture {name}")
+                path.unlink()
+            except FileNotFoundError:
+                # Committed or cleared by the other process in the meantime
+                continue
+
     def get_pending_image_path(self, *args, **kwargs) -> Path:
         """Gets a new image filepath with a timestamp
         Returns:
@@ -50,23 +188,159 @@ class ImageManager:
         """
         return self.pending_directory / self.get_image_name(*args, **kwargs)
 
-    def get_pending_images(self) -> List[Path]:
+    def get_staging_image_path(self, *args, **kwargs) -> Path:
+        """Gets a new image filepath with a timestamp to capture to. Nothing reads the staging
+            directory, so the image can be written there at leisure and then handed to `commit`
+        Returns:
+            A path in the staging folder
+        """
+        return self.staging_directory / self.get_image_name(*args, **kwargs)
+
+    def commit(self, image: Path) -> Path | None:
+        """Moves a finished capture into the pending directory. The file is flushed to disk and then
+            renamed, so uploaders only ever see complete images, even after a power cut
+        Args:
+            image: Path of the capture in the staging directory
+        Returns:
+            The path of the image in the pending directory, None if the capture wasn't written
+        """
+        if not os.path.exists(image):
+            return None
+        if self.durable:
+            _fsync(image)
+
+        pending = self.pending_directory / Path(image).name
+        os.replace(image, pending)
+        if self.durable:
+            # Make the rename itself durable
+            _fsync(self.pending_directory)
+        self.record_capture(pending)
+        return pending
+
+    def get_pending_images(self, limit: int | None = None, newest_first: bool | None = None) -> List[Path]:
         """Get a list of pending paths
+        Args:
+            limit: Maximum number of paths to return, defaults to all of them
+            newest_first: Order the images by the capture time in their names, newest first.
+                Defaults to `newest_first`
         Returns:
             A list of Path objects
         """
-        return [self.pending_directory / x for x in os.listdir(self.pending_directory.absolute())]
+        if newest_first is None:
+            newest_first = self.newest_first
+        if self.journal:
+            return self.journal.next_pending(limit, newest_first=newest_first)
+        names = os.listdir(self.pending_directory.absolute())
+        if newest_first:
+            names.sort(key=lambda name: (capture_order_key(name), name), reverse=True)
+        return [self.pending_directory / x for x in names][:limit]
+
+    def pending_count(self) -> int:
+        """Gets the number of images waiting to be uploaded
+        Returns:
+            The number of pending images
+        """
+        if self.journal:
+            return self.journal.pending_count()
+        return len(os.listdir(self.pending_directory.absolute()))
 
-    def get_image_name(self) -> str:
+    def record_capture(self, image: Path) -> None:
+        """Records a newly captured image as pending
+        Args:
+            image: Path of the captured image
+        """
+        if self.journal and os.path.exists(image):
+            self.journal.record_capture(image, captured_at=capture_timestamp(image))
+
+    def hold_back(self, image: Path, discard: bool = False) -> None:
+        """Takes an image out of the pending uploads
+        Args:
+            image: Path of the pending image
+            discard: Delete the image rather than moving it to the held back directory
+        """
+        if discard:
+            os.remove(image)
+        else:
+            os.makedirs(self.held_back_directory, exist_ok=True)
+            os.replace(image, self.held_back_directory / Path(image).name)
+            self._prune_held_back()
+        if self.journal:
+            self.journal.forget(image)
+
+    def hold_back_data(self, data: bytes, name: str) -> None:
+        """Keeps an image captured in memory in the held back directory
+        Args:
+            data: The encoded image
+            name: Name of the image
+        """
+        os.makedirs(self.held_back_directory, exist_ok=True)
+        with open(self.held_back_directory / name, "wb") as out:
+            out.write(data)
+        self._prune_held_back()
+
+    def _prune_held_back(self) -> None:
+        """Deletes the oldest held back images beyond `held_back_max_files`, so they can't fill the SD card"""
+        if not self.held_back_max_files:
+            return
+        names = os.listdir(self.held_back_directory)
+        excess = len(names) - self.held_back_max_files
+        if excess <= 0:
+            return
+        for name in sorted(names, key=lambda name: (capture_order_key(name), name))[:excess]:
+            (self.held_back_directory / name).unlink(missing_ok=True)
+        logger.info(f"Deleted {excess} of the oldest held back images, keeping {self.held_back_max_files}")
+
+    def get_image_name(self, direction: str | None = None) -> str:
         """Gets a filename using the SE_CARGN_01_PCAM_E format with timestamp
+        Args:
+            direction: Direction the camera faces, defaults to the site's direction
         Returns:
             A filename string in format: SE_CARGN_01_PCAM_E_YYYYMMDD_HHMMSS
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = self.clock.now().strftime(IMAGE_TIMESTAMP_FORMAT)
         config = self.config
         # TODO should 01 be part of the camera ID?
         # https://github.com/NERC-CEH/FDRI_RaspberryPi_Scripts/issues/12
-        return f"{config.catchment}_{config.site}_01_PCAM_{config.direction}_{timestamp}"
+        return f"{config.catchment}_{config.site}_01_PCAM_{direction or config.direction}_{timestamp}"
+
+
+@dataclass
+class UploadReport:
+    """Summary of a batch of uploads"""
+
+    files: int = 0
+    """Number of files uploaded"""
+    failed: int = 0
+    """Number of files that could not be uploaded"""
+    deferred: int = 0
+    """Number of files left pending because the deadline passed before their upload started"""
+    bytes: int = 0
+    """Total size of the uploaded files"""
+    requests: int = 0
+    """Number of upload requests made"""
+    seconds: float = 0.0
+    """Wall-clock time taken by the batch"""
+
+    def add(self, other: "UploadReport") -> None:
+        """Adds the counts from another report to this one
+        Args:
+            other: The report to add
+        """
+        self.files += other.files
+        self.failed += other.failed
+        self.deferred += other.deferred
+        self.bytes += other.bytes
+        self.requests += other.requests
+
+    @property
+    def files_per_second(self) -> float:
+        """Upload rate in files per second"""
+        return self.files / self.seconds if self.seconds else 0.0
+
+    @property
+    def kbytes_per_second(self) -> float:
+        """Upload rate in KB per second"""
+        return self.bytes / 1024 / self.seconds if self.seconds else 0.0
 
 
 class S3ImageManager(ImageManager):
@@ -76,46 +350,333 @@ class S3ImageManager(ImageManager):
     """S3 bucket that gets written"""
     s3_manager: S3Manager
     """S3 manager object for handling credentials and uploads"""
+    upload_workers: int
+    """Number of files uploaded concurrently"""
+    bundle: bool
+    """Whether pending images are packed into tar bundles rather than uploaded one by one"""
+    bundle_max_files: int
+    """Maximum number of images in a bundle"""
+    bundle_max_bytes: int
+    """Maximum combined size of the images in a bundle"""
+    bundle_directory: Path
+    """Directory that bundles are written to before upload"""
+    rate_limiter: RateLimiter | None
+    """Optional cap on the upload rate shared by every upload"""
 
-    def __init__(self, bucket_name: str, s3_manager: S3Manager, *args, **kwargs) -> None:
+    def __init__(
+        self,
+        bucket_name: str,
+        s3_manager: S3Manager,
+        *args,
+        upload_workers: int = 1,
+        bundle: bool = False,
+        bundle_max_files: int = 100,
+        bundle_max_bytes: int = 8 * 1024 * 1024,
+        max_bytes_per_second: float = 0,
+        **kwargs,
+    ) -> None:
         """
         Args:
             bucket_name: S3 bucket that is written to
             s3_manager: The S3 management object
+            upload_workers: Number of files uploaded concurrently, 1 uploads them one at a time
+            bundle: Pack pending images into one tar object per date instead of one object per image
+            bundle_max_files: Maximum number of images in a bundle
+            bundle_max_bytes: Maximum combined size of the images in a bundle
+            max_bytes_per_second: Cap on the upload rate, 0 for no cap
         """
         self.bucket_name = bucket_name
         self.s3_manager = s3_manager
+        self.upload_workers = upload_workers
+        self.bundle = bundle
+        self.bundle_max_files = bundle_max_files
+        self.bundle_max_bytes = bundle_max_bytes
         super().__init__(*args, **kwargs)
+        self.rate_limiter = RateLimiter(max_bytes_per_second, clock=self.clock) if max_bytes_per_second else None
+        self.bundle_directory = self.base_directory / "bundles"
+        if bundle:
+            os.makedirs(self.bundle_directory, exist_ok=True)
+            if s3_manager.multipart:
+                # A bundle is rebuilt from its images, so its upload can resume even once the file has gone
+                s3_manager.multipart.rebuildable.append(self.bundle_directory)
 
-    def partition_path(self, image: str) -> None:
-        """Accepts an absolute path to the image
-        Returns the partitioned path with just the filename appended"""
+    def partition_prefix(self, day: date, direction: str | None = None) -> str:
+        """Gets the partitioned bucket prefix for a date
+        Args:
+            day: The date of the partition
+            direction: Direction the camera faces, defaults to the site's direction
+        Returns:
+            The bucket prefix without a trailing slash
+        """
         config = self.config
+        return f"catchment={config.catchment}/site={config.site}/compound=01/type=PCAM/direction={direction or config.direction}/date={day.strftime('%Y-%m-%d')}"  # noqa: E501
+
+    def partition_path(self, image: str) -> str:
+        """Accepts an absolute path to the image
+        Returns the partitioned path with just the filename appended. Images are filed under the date
+        they were captured, like bundles, falling back to today for names without a timestamp"""
         filename = Path(image).name
-        return f"catchment={config.catchment}/site={config.site}/compound=01/type=PCAM/direction={config.direction}/date={datetime.now().strftime('%Y-%m-%d')}/{filename}"  # noqa: E501
+        captured = parse_image_timestamp(filename) or self.clock.now()
+        return f"{self.partition_prefix(captured, parse_image_direction(filename))}/{filename}"
 
-    def upload_pending(self, debug: bool = False) -> None:
+    def upload_pending(
+        self,
+        debug: bool = False,
+        limit: int | None = None,
+        newest_first: bool | None = None,
+        deadline: datetime | None = None,
+    ) -> UploadReport:
         """Upload files from the pending directory to S3
         Args:
             debug: Flag to enable debugging mode
+            limit: Maximum number of images to upload, defaults to all of them
+            newest_first: Upload the newest images first, defaults to `newest_first`
+            deadline: Time after which no more uploads are started
+        Returns:
+            A report of the uploads made
         """
-        pending_images = self.get_pending_images()
+        if self.s3_manager.breaker.blocked:
+            # Don't touch the network, or the SD card for more than a count, while S3 is down
+            pending = self.pending_count()
+            logger.info(f"S3 unavailable, leaving {pending} images until {self.s3_manager.breaker.next_retry()}")
+            return UploadReport(deferred=pending)
+
+        pending_images = self.get_pending_images(limit, newest_first=newest_first)
         if len(pending_images) > 0:
             self.s3_manager.assume_role()
-            for image in pending_images:
-                try:
-                    bucket_path = self.partition_path(image)
-
-                    upload_successful = False
-                    if debug:
-                        logger.debug(f"Pretended to upload image {image} to bucket {self.bucket_name}")
-                    else:
-                        upload_successful = self.s3_manager.upload(image, self.bucket_name, bucket_path)
-                    if upload_successful:
-                        os.remove(image)
-                except Exception as e:
-                    logger.exception(f"Failed to upload image: {image}", exc_info=e)
-                # Not considered removing images due to size constraint as images are <200 kb with 10 gb it would take
-                # ~20 years to fill
+            self.s3_manager.abort_stale_uploads(self.bucket_name)
+            return self.upload_images(pending_images, debug=debug, deadline=deadline)
+
+        logger.info("No images to upload")
+        return UploadReport()
+
+    def upload_buffer(self, data: bytes, name: str, debug: bool = False) -> Path | None:
+        """Uploads an image straight from memory. The image only touches the SD card
+            if the upload fails, when it is written to the pending directory to retry later.
+        Args:
+            data: The encoded image
+            name: Filename of the image
+            debug: Flag to enable debugging mode
+        Returns:
+            None if the image was uploaded, otherwise the path it was written to
+        """
+        bucket_path = self.partition_path(name)
+        upload_successful = False
+        try:
+            if debug:
+                logger.debug(f"Pretended to upload image {name} to bucket {self.bucket_name}")
+            else:
+                self._throttle(len(data))
+                upload_successful = self.s3_manager.upload_bytes(data, self.bucket_name, bucket_path)
+        except Exception as e:
+            logger.exception(f"Failed to upload image: {name}", exc_info=e)
+        if upload_successful:
+            return None
+
+        staged = self.staging_directory / name
+        logger.info(f"Writing {name} to pending uploads to retry later")
+        with open(staged, "wb") as out:
+            out.write(data)
+        return self.commit(staged)
+
+    def upload_images(self, images: List[Path], debug: bool = False, deadline: datetime | None = None) -> UploadReport:
+        """Uploads a batch of images, deleting each one once its own upload succeeds.
+        In bundle mode the images are packed into tar bundles first.
+        Args:
+            images: The image files to upload
+            debug: Flag to enable debugging mode
+            deadline: Time after which no more uploads are started, the rest are left pending
+        Returns:
+            A report of the uploads made
+        """
+        report = UploadReport()
+        start = time.perf_counter()
+
+        if self.bundle:
+            jobs = self._plan_bundles(images)
+            upload = self._upload_bundle
+        else:
+            jobs = images
+            upload = self._upload_image
+
+        if deadline is not None:
+            upload = partial(self._before_deadline, upload, deadline)
+
+        if self.upload_workers > 1 and len(jobs) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.upload_workers, len(jobs))) as executor:
+                results = list(executor.map(lambda job: upload(job, debug), jobs))
         else:
-            logger.info("No images to upload")
+            results = [upload(job, debug) for job in jobs]
+
+        for result in results:
+            report.add(result)
+        report.seconds = time.perf_counter() - start
+
+        logger.info(
+            f"Uploaded {report.files} of {len(images)} images ({report.bytes / 1024:.2f}KB) in "
+            f"{report.requests} requests and {report.seconds:.2f}s: "
+            f"{report.files_per_second:.2f} files/s, {report.kbytes_per_second:.2f}KB/s"
+        )
+        if report.deferred:
+            logger.info(f"Deadline passed, left {report.deferred} images for later")
+        return report
+
+    def _before_deadline(
+        self,
+        upload: Callable[[Path | List[Path], bool], UploadReport],
+        deadline: datetime,
+        job: Path | List[Path],
+        debug: bool,
+    ) -> UploadReport:
+        """Runs an upload if the deadline hasn't passed yet
+        Args:
+            upload: Uploads an image or a bundle
+            deadline: Time after which no more uploads are started
+            job: The image or the images of a bundle
+            debug: Flag to enable debugging mode
+        Returns:
+            The report of the upload, or a report of the deferred images
+        """
+        if self.clock.now() >= deadline:
+            return UploadReport(deferred=len(job) if isinstance(job, list) else 1)
+        return upload(job, debug)
+
+    def _throttle(self, size: int) -> None:
+        """Waits until an upload fits in the rate limit, if there is one
+        Args:
+            size: Size of the upload in bytes
+        """
+        if self.rate_limiter:
+            self.rate_limiter.acquire(size)
+
+    def _upload_image(self, image: Path, debug: bool = False) -> UploadReport:
+        """Uploads a single image and deletes it if the upload succeeded
+        Args:
+            image: The image file to upload
+            debug: Flag to enable debugging mode
+        Returns:
+            A report of the upload
+        """
+        report = UploadReport()
+        if self._forget_if_missing(image):
+            return report
+        try:
+            bucket_path = self.partition_path(image)
+            size = os.path.getsize(image)
+
+            if self.journal:
+                self.journal.mark_in_flight(image)
+
+            upload_successful = False
+            if debug:
+                logger.debug(f"Pretended to upload image {image} to bucket {self.bucket_name}")
+            else:
+                self._throttle(size)
+                report.requests += 1
+                upload_successful = self.s3_manager.upload(image, self.bucket_name, bucket_path)
+            if upload_successful:
+                os.remove(image)
+                if self.journal:
+                    self.journal.mark_uploaded(image)
+                report.files = 1
+                report.bytes = size
+                return report
+        except Exception as e:
+            logger.exception(f"Failed to upload image: {image}", exc_info=e)
+        if self.journal:
+            self.journal.mark_failed(image)
+        # Not considered removing images due to size constraint as images are <200 kb with 10 gb it would take
+        # ~20 years to fill
+        report.failed = 1
+        return report
+
+    def _forget_if_missing(self, image: Path) -> bool:
+        """Drops an image deleted from the pending directory behind the app's back from the journal, so it
+            isn't handed out again and again
+        Args:
+            image: The pending image
+        Returns:
+            True if the image no longer exists
+        """
+        if os.path.exists(image):
+            return False
+        logger.warning(f"Pending image {image} no longer exists, skipping it")
+        if self.journal:
+            self.journal.forget(image)
+        return True
+
+    def _upload_in_progress(self, file_path: Path) -> bool:
+        """Checks whether a file has an unfinished multipart upload that can be resumed"""
+        multipart = self.s3_manager.multipart
+        return multipart is not None and multipart.in_progress(file_path)
+
+    def _plan_bundles(self, images: List[Path]) -> List[List[Path]]:
+        """Groups images by their capture date and direction and splits each group to fit the bundle limits
+        Args:
+            images: The image files to bundle
+        Returns:
+            A list of image groups, each sharing a partition date and direction
+        """
+        by_partition = defaultdict(list)
+        for image in images:
+            if self._forget_if_missing(image):
+                continue
+            captured = parse_image_timestamp(image) or self.clock.now()
+            by_partition[(captured.date(), parse_image_direction(image) or "")].append(image)
+
+        bundles = []
+        # The newest day's bundles go first like single images do
+        for partition in sorted(by_partition, reverse=self.newest_first):
+            bundles.extend(plan_bundles(sorted(by_partition[partition]), self.bundle_max_files, self.bundle_max_bytes))
+        return bundles
+
+    def _upload_bundle(self, images: List[Path], debug: bool = False) -> UploadReport:
+        """Packs images into a tar bundle, uploads it and deletes the images once the upload succeeded
+        Args:
+            images: The image files to bundle, all from the same date and direction
+            debug: Flag to enable debugging mode
+        Returns:
+            A report of the upload
+        """
+        report = UploadReport()
+        first = Path(images[0])
+        captured = parse_image_timestamp(first) or self.clock.now()
+        # Named after its members, so a retry of the same images picks up an interrupted upload
+        members = hashlib.sha1("\n".join(Path(image).name for image in images).encode()).hexdigest()[:12]
+        bundle_path = self.bundle_directory / f"{first.stem}_bundle_{members}.tar"
+        bucket_path = f"{self.partition_prefix(captured, parse_image_direction(first))}/{bundle_path.name}"
+
+        try:
+            if self.journal:
+                self.journal.set_state(images, ImageState.IN_FLIGHT)
+            if bundle_path.exists() and self._upload_in_progress(bundle_path):
+                index = read_index(bundle_path)
+            else:
+                index = write_bundle(images, bundle_path)
+
+            upload_successful = False
+            if debug:
+                logger.debug(f"Pretended to upload bundle {bundle_path} to bucket {self.bucket_name}")
+            else:
+                self._throttle(os.path.getsize(bundle_path))
+                report.requests += 1
+                upload_successful = self.s3_manager.upload(bundle_path, self.bucket_name, bucket_path)
+            if upload_successful:
+                for image in images:
+                    os.remove(image)
+                if self.journal:
+                    self.journal.set_state(images, ImageState.UPLOADED)
+                report.files = len(images)
+                report.bytes = sum(member["size"] for member in index)
+                return report
+        except Exception as e:
+            logger.exception(f"Failed to upload bundle: {bundle_path}", exc_info=e)
+        finally:
+            # Kept while a multipart upload of it can still be resumed
+            if bundle_path.exists() and not self._upload_in_progress(bundle_path):
+                os.remove(bundle_path)
+
+        if self.journal:
+            self.journal.set_state(images, ImageState.FAILED)
+        report.failed = len(images)
+        return report
@@ -0,0 +1,207 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from enum import StrEnum
+from pathlib import Path
+from typing import Callable, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+
+class ImageState(StrEnum):
+    """Upload states of an image in the journal"""
+
+    CAPTURED = "captured"
+    IN_FLIGHT = "in_flight"
+    UPLOADED = "uploaded"
+    FAILED = "failed"
+
+
+PENDING_STATES = (ImageState.CAPTURED, ImageState.FAILED)
+"""States of images that are waiting to be uploaded"""
+
+
+class UploadJournal:
+    """SQLite journal of captured images and their upload state.
+
+    The journal is updated as images are captured and uploaded, so the number of pending
+    images and the next batch to upload can be answered without listing the pending
+    directory. It is reconciled with the directory once, by `rebuild`, on startup.
+    """
+
+    path: Path
+    """Location of the journal database"""
+
+    retain_uploaded: float
+    """Seconds that uploaded images are kept in the journal"""
+
+    def __init__(self, path: Path, retain_uploaded: float = 7 * 24 * 3600) -> None:
+        """
+        Args:
+            path: Location of the journal database
+            retain_uploaded: Seconds that uploaded images are kept in the journal
+        """
+        self.path = Path(path)
+        self.retain_uploaded = retain_uploaded
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        # WAL with relaxed syncing keeps the number of flash writes per update down
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                captured_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS images_state ON images (state, captured_at)")
+
+    def close(self) -> None:
+        """Closes the database connection"""
+        with self._lock:
+            self._connection.close()
+
+    def _execute(self, sql: str, parameters: Iterable = ()) -> list:
+        """Runs a statement while holding the journal lock
+        Args:
+            sql: The statement to run
+            parameters: Parameters of the statement
+        Returns:
+            Any rows returned
+        """
+        with self._lock:
+            return self._connection.execute(sql, tuple(parameters)).fetchall()
+
+    def record_capture(self, image: Path, captured_at: float | None = None) -> None:
+        """Adds a newly captured image to the journal
+        Args:
+            image: Path of the captured image
+            captured_at: Capture time as a unix timestamp, defaults to now
+        """
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO images (path, state, captured_at, updated_at) VALUES (?, ?, ?, ?)",
+            (str(image), ImageState.CAPTURED, captured_at or now, now),
+        )
+
+    def forget(self, image: Path) -> None:
+        """Removes an image that will never be uploaded from the journal
+        Args:
+            image: Path of the image
+        """
+        self._execute("DELETE FROM images WHERE path = ?", (str(image),))
+
+    def set_state(self, images: List[Path], state: ImageState) -> None:
+        """Updates the state of one or more images
+        Args:
+            images: Paths of the images
+            state: The new state
+        """
+        attempt = 1 if state in (ImageState.UPLOADED, ImageState.FAILED) else 0
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE images SET state = ?, updated_at = ?, attempts = attempts + ? WHERE path = ?",
+                [(state, time.time(), attempt, str(image)) for image in images],
+            )
+
+    def mark_in_flight(self, image: Path) -> None:
+        """Marks an image as being uploaded"""
+        self.set_state([image], ImageState.IN_FLIGHT)
+
+    def mark_uploaded(self, image: Path) -> None:
+        """Marks an image as uploaded"""
+        self.set_state([image], ImageState.UPLOADED)
+
+    def mark_failed(self, image: Path) -> None:
+        """Marks an image as failed, it will be retried"""
+        self.set_state([image], ImageState.FAILED)
+
+    def pending_count(self) -> int:
+        """Gets the number of images waiting to be uploaded
+        Returns:
+            The number of captured and failed images
+        """
+        return self._execute(
+            "SELECT COUNT(*) FROM images WHERE state IN (?, ?)",
+            PENDING_STATES,
+        )[0][0]
+
+    def next_pending(self, limit: int | None = None, newest_first: bool = False) -> List[Path]:
+        """Gets the next images to upload, oldest first by their capture time
+        Args:
+            limit: Maximum number of images to return, defaults to all of them
+            newest_first: Return the newest images first instead
+        Returns:
+            A list of image paths
+        """
+        order = "captured_at DESC, path DESC" if newest_first else "captured_at, path"
+        rows = self._execute(
+            f"SELECT path FROM images WHERE state IN (?, ?) ORDER BY {order} LIMIT ?",
+            (*PENDING_STATES, -1 if limit is None else limit),
+        )
+        return [Path(row[0]) for row in rows]
+
+    def count(self, state: ImageState) -> int:
+        """Gets the number of images in a state
+        Args:
+            state: The state to count
+        Returns:
+            The number of images
+        """
+        return self._execute("SELECT COUNT(*) FROM images WHERE state = ?", (state,))[0][0]
+
+    def rebuild(self, directory: Path, capture_time: Callable[[str], float | None] | None = None) -> None:
+        """Reconciles the journal with the images on disk, intended to be run on startup.
+        Images left in flight by a crash become pending again, files missing from the journal
+        are added, pending entries whose file has gone are dropped and old uploads are pruned.
+        Args:
+            directory: The pending uploads directory
+            capture_time: Gets the capture time of an image from its name, images it gives None
+                for, or all of them without it, are given their modification time
+        """
+        on_disk = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    captured_at = capture_time(entry.name) if capture_time else None
+                    on_disk[str(Path(directory) / entry.name)] = captured_at or entry.stat().st_mtime
+
+        now = time.time()
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN")
+            try:
+                connection.execute(
+                    "UPDATE images SET state = ?, updated_at = ? WHERE state = ?",
+                    (ImageState.CAPTURED, now, ImageState.IN_FLIGHT),
+                )
+                journalled = {
+                    row[0]
+                    for row in connection.execute(
+                        "SELECT path FROM images WHERE state IN (?, ?)",
+                        PENDING_STATES,
+                    )
+                }
+                connection.executemany(
+                    "DELETE FROM images WHERE path = ?",
+                    [(path,) for path in journalled - on_disk.keys()],
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO images (path, state, captured_at, updated_at) VALUES (?, ?, ?, ?)",
+                    [(path, ImageState.CAPTURED, on_disk[path], now) for path in on_disk.keys() - journalled],
+                )
+                connection.execute(
+                    "DELETE FROM images WHERE state = ? AND updated_at < ?",
+                    (ImageState.UPLOADED, now - self.retain_uploaded),
+                )
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+        logger.info(f"Rebuilt upload journal, {self.pending_count()} images pending")
@@ -1,11 +1,12 @@
 import logging
 from datetime import date, datetime
-from typing import TypedDict
+from typing import TYPE_CHECKING, TypedDict
 
-from astral import Observer
-from astral.sun import sun
 from dateutil.tz import tzlocal
 
+if TYPE_CHECKING:
+    from astral import Observer
+
 logger = logging.getLogger(__name__)
 
 
@@ -27,16 +28,40 @@ class SunStats(TypedDict):
     dusk: datetime
 
 
-class Location(Observer):
-    """Location object used to calculate sun statistics"""
+class Location:
+    """Location object used to calculate sun statistics.
+
+    astral is only imported the first time sun statistics are needed, which a scheduler
+    with a saved sun table may never do.
+    """
+
+    latitude: float
+    """The location latitude"""
+    longitude: float
+    """The location longitude"""
+    elevation: float
+    """Height of the location above sea level in metres"""
 
-    def __init__(self, latitude: float, longitude: float, *args, **kwargs):
+    def __init__(self, latitude: float, longitude: float, elevation: float = 0.0):
         """
         Args:
             latitude: The location latitude
             longitude: The location longitude
+            elevation: Height of the location above sea level in metres
         """
-        super().__init__(*args, **kwargs, latitude=latitude, longitude=longitude)
+        self.latitude = latitude
+        self.longitude = longitude
+        self.elevation = elevation
+        self._observer: "Observer | None" = None
+
+    @property
+    def observer(self) -> "Observer":
+        """The astral observer for this location"""
+        if self._observer is None:
+            from astral import Observer  # noqa: PLC0415
+
+            self._observer = Observer(latitude=self.latitude, longitude=self.longitude, elevation=self.elevation)
+        return self._observer
 
     def get_sun_stats(self, date: date) -> SunStats:
         """Gets sun statistics at this location for a given date
@@ -46,10 +71,10 @@ class Location(Observer):
             A dictionary of sun statistics
         """
 
-        return Location._get_sun_stats(self, date)
+        return Location._get_sun_stats(self.observer, date)
 
     @staticmethod
-    def _get_sun_stats(observer: Observer, date: date) -> SunStats:
+    def _get_sun_stats(observer: "Observer", date: date) -> SunStats:
         """Gets sun statistics for a given observer and location
         Args:
             observer: An observer or location to query
@@ -57,4 +82,6 @@ class Location(Observer):
         Returns:
             A dictionary of sun statistics
         """
+        from astral.sun import sun  # noqa: PLC0415
+
         return sun(observer, date=date)  # type: ignore
@@ -1,13 +1,22 @@
 import logging
 import logging.handlers
+import queue
+import threading
+import time
 import traceback
 from datetime import datetime
 from pathlib import Path
 from types import TracebackType
-from typing import TypeAlias
+from typing import List, TypeAlias
+
+from raspberrycam.metrics import REGISTRY
 
 logging.getLogger("botocore").setLevel(logging.INFO)
 
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "raspberrycam_log_records_dropped_total", "Log records dropped because the logging queue was full"
+)
+
 SysExcInfoType: TypeAlias = tuple[type[BaseException], BaseException, TracebackType | None] | tuple[None, None, None]
 
 
@@ -70,7 +79,196 @@ class LogFormatter(logging.Formatter):
         return "".join(traceback.format_exception(*ei)).strip()
 
 
-def setup_logging(filename: Path, level: int = logging.INFO) -> None:
+_STOP = object()
+"""Queue item that tells the listener thread to finish"""
+
+
+class BatchingQueueHandler(logging.Handler):
+    """
+    A handler that puts records on a bounded queue and returns straight away, leaving a
+    background thread to format them and write them to the real handlers in batches.
+
+    The listener writes a batch once `batch_size` records are waiting or `flush_interval`
+    seconds after the first of them arrived, and flushes each handler once per batch rather
+    than once per record. When the queue is full, records are dropped and counted, so a
+    storm of errors can't stall the caller or exhaust memory.
+    """
+
+    handlers: List[logging.Handler]
+    """The handlers that records are written to"""
+
+    batch_size: int
+    """Number of waiting records that triggers a write"""
+
+    flush_interval: float
+    """Longest time in seconds that a record waits before being written"""
+
+    flush_timeout: float
+    """Longest time in seconds that `flush` waits for the listener"""
+
+    dropped: int
+    """Number of records dropped because the queue was full"""
+
+    def __init__(
+        self,
+        handlers: List[logging.Handler],
+        queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+        flush_timeout: float = 5.0,
+    ) -> None:
+        """
+        Args:
+            handlers: The handlers that records are written to
+            queue_size: Most records that can wait to be written before new ones are dropped
+            batch_size: Number of waiting records that triggers a write
+            flush_interval: Longest time in seconds that a record waits before being written
+            flush_timeout: Longest time in seconds that `flush` waits for the listener
+        """
+        super().__init__()
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_timeout = flush_timeout
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._listen, name="log-listener", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Queue a record without formatting it. Tracebacks are formatted by the listener.
+
+        Args:
+            record: A LogRecord instance representing the event being logged.
+        """
+        if record.args:
+            # Merge the arguments now in case they change before the listener gets to them
+            record.msg = record.getMessage()
+            record.args = None
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+    def flush(self) -> None:
+        """Wait until every record queued so far has been written and flushed"""
+        if not self._thread.is_alive():
+            return
+        written = threading.Event()
+        try:
+            self._queue.put(written, timeout=self.flush_timeout)
+        except queue.Full:
+            return
+        written.wait(self.flush_timeout)
+
+    def close(self) -> None:
+        """Write out the remaining records, stop the listener and close the handlers"""
+        if self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=self.flush_timeout)
+            except queue.Full:
+                pass
+            self._thread.join(self.flush_timeout)
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+    def _listen(self) -> None:
+        """Collects records from the queue and writes them in batches until stopped"""
+        batch: List[logging.LogRecord] = []
+        flushes: List[threading.Event] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, logging.LogRecord):
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+            elif isinstance(item, threading.Event):
+                flushes.append(item)
+
+            if item is _STOP or flushes or len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+                for written in flushes:
+                    written.set()
+                flushes = []
+            if item is _STOP:
+                return
+
+    def _write(self, batch: List[logging.LogRecord]) -> None:
+        """
+        Write a batch of records to every handler, flushing each handler once.
+
+        Args:
+            batch: The records to write
+        """
+        if self.dropped > self._reported_dropped:
+            message = f"Dropped {self.dropped - self._reported_dropped} log records, the logging queue was full"
+            batch.append(
+                logging.makeLogRecord(
+                    {
+                        "name": __name__,
+                        "levelno": logging.WARNING,
+                        "levelname": "WARNING",
+                        "msg": message,
+                    }
+                )
+            )
+            self._reported_dropped = self.dropped
+        if not batch:
+            return
+
+        for handler in self.handlers:
+            with handler.lock:
+                for record in batch:
+                    if record.levelno < handler.level or not handler.filter(record):
+                        continue
+                    try:
+                        self._write_record(handler, record)
+                    except Exception:
+                        handler.handleError(record)
+                try:
+                    handler.flush()
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _write_record(handler: logging.Handler, record: logging.LogRecord) -> None:
+        """
+        Write one record to a handler. Stream and file handlers are written to directly,
+        because their `emit` flushes after every record.
+
+        Args:
+            handler: The handler to write to
+            record: The record to write
+        """
+        if not isinstance(handler, logging.StreamHandler):
+            handler.emit(record)
+            return
+        if isinstance(handler, logging.handlers.BaseRotatingHandler) and handler.shouldRollover(record):
+            handler.doRollover()
+        if handler.stream is None:
+            # A file handler created with delay=True opens its file on first use
+            handler.stream = handler._open()
+        handler.stream.write(handler.format(record) + handler.terminator)
+
+
+def setup_logging(
+    filename: Path,
+    level: int = logging.INFO,
+    queued: bool = False,
+    queue_size: int = 10000,
+    flush_interval: float = 2.0,
+) -> None:
     """
     Set up basic logging configuration with a custom formatter.
 
@@ -81,6 +279,10 @@ def setup_logging(filename: Path, level: int = logging.INFO) -> None:
     Args:
         filename: Path to the current log file
         level: The logging level to set for the root logger. Defaults to logging.INFO.
+        queued: Hand records to a background thread that writes them in batches, so
+            logging never waits for the SD card. Defaults to False.
+        queue_size: Most records that can wait to be written in queued mode before new ones are dropped.
+        flush_interval: Longest time in seconds that a record waits to be written in queued mode.
 
     Returns:
         None
@@ -95,4 +297,12 @@ def setup_logging(filename: Path, level: int = logging.INFO) -> None:
     file_handler = logging.handlers.TimedRotatingFileHandler(filename, when="W0", backupCount=4)
     file_handler.setFormatter(formatter)
 
-    root_logger.handlers = [stream_handler, file_handler]
+    handlers: List[logging.Handler] = [stream_handler, file_handler]
+    if queued:
+        # logging.shutdown closes the handler at exit, which writes out whatever is still queued
+        handlers = [BatchingQueueHandler(handlers, queue_size=queue_size, flush_interval=flush_interval)]
+
+    for handler in root_logger.handlers:
+        if isinstance(handler, BatchingQueueHandler):
+            handler.close()
+    root_logger.handlers = handlers
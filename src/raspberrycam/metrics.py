@@ -0,0 +1,256 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+"""Histogram bucket upper bounds in seconds"""
+
+THROUGHPUT_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+"""Histogram bucket upper bounds in bytes per second"""
+
+
+def format_value(value: float) -> str:
+    """Formats a value at full precision, so large counters don't go up in rounded steps
+    Args:
+        value: The value to format
+    Returns:
+        The value as an integer if it is a whole number, otherwise the shortest exact float
+    """
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer() and abs(value) < 2**53:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(ABC):
+    """A named value that can be exported"""
+
+    name: str
+    """Name of the metric, following the Prometheus naming conventions"""
+    description: str
+    """Description of the metric"""
+    type: str = "untyped"
+    """Prometheus metric type"""
+
+    def __init__(self, name: str, description: str) -> None:
+        """
+        Args:
+            name: Name of the metric
+            description: Description of the metric
+        """
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def samples(self) -> List[tuple]:
+        """Gets the values of the metric
+        Returns:
+            A list of (name, labels, value)
+        """
+
+    @abstractmethod
+    def snapshot(self) -> dict | float:
+        """Gets the values of the metric for a JSON snapshot"""
+
+
+class Counter(Metric):
+    """A count that only goes up"""
+
+    type = "counter"
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        """Adds to the count
+        Args:
+            amount: How much to add
+        """
+        with self._lock:
+            self.value += amount
+
+    def samples(self) -> List[tuple]:
+        return [(self.name, "", self.value)]
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Gauge(Metric):
+    """A value that can go up and down"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        """Sets the value
+        Args:
+            value: The new value
+        """
+        with self._lock:
+            self.value = value
+
+    def samples(self) -> List[tuple]:
+        return [(self.name, "", self.value)]
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Histogram(Metric):
+    """Counts of observations in buckets, with their sum"""
+
+    type = "histogram"
+
+    buckets: Sequence[float]
+    """Upper bounds of the buckets"""
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        """
+        Args:
+            name: Name of the metric
+            description: Description of the metric
+            buckets: Upper bounds of the buckets
+        """
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Records an observation
+        Args:
+            value: The observed value
+        """
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observes how many seconds the body of a `with` block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self) -> List[tuple]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+            cumulative += bucket_count
+            samples.append((f"{self.name}_bucket", f'le="{format_value(bound)}"', cumulative))
+        samples.append((f"{self.name}_sum", "", total))
+        samples.append((f"{self.name}_count", "", count))
+        return samples
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "buckets": {format_value(bound): count for bound, count in zip(self.buckets, self.counts)},
+                "overflow": self.counts[-1],
+            }
+
+
+class MetricsRegistry:
+    """Collection of metrics that can be written out in one go.
+
+    Recording a value only takes a lock and some arithmetic; the file is written separately,
+    once per cycle of the main loop, and replaced atomically so readers never see half of it.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, metric_type: type, name: str, description: str, **kwargs) -> Metric:
+        """Gets a metric by name, creating it the first time"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_type(name, description, **kwargs)
+            elif not isinstance(metric, metric_type):
+                raise ValueError(f"{name} is already registered as a {metric.type}")
+            return metric
+
+    def counter(self, name: str, description: str) -> Counter:
+        """Gets or creates a counter"""
+        return self._get(Counter, name, description)
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        """Gets or creates a gauge"""
+        return self._get(Gauge, name, description)
+
+    def histogram(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Gets or creates a histogram"""
+        return self._get(Histogram, name, description, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        """Formats every metric in the Prometheus text exposition format
+        Returns:
+            The metrics text
+        """
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                text = format_value(value)
+                lines.append(f"{name}{{{labels}}} {text}" if labels else f"{name} {text}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Gets every metric as a JSON serialisable dictionary
+        Returns:
+            A dictionary of metric name to value
+        """
+        return {metric.name: metric.snapshot() for metric in sorted(self._metrics.values(), key=lambda m: m.name)}
+
+    def write(self, path: Path) -> None:
+        """Writes the metrics to a file, replacing it atomically.
+        Files ending `.json` get a JSON snapshot, anything else the Prometheus text format,
+        which node_exporter's textfile collector reads from files ending `.prom`.
+        Args:
+            path: Destination of the metrics
+        """
+        path = Path(path)
+        if path.suffix == ".json":
+            content = json.dumps({"timestamp": time.time(), "metrics": self.snapshot()}, indent=2)
+        else:
+            content = self.render_prometheus()
+
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+"""Registry shared by the whole app"""
@@ -0,0 +1,316 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, List
+
+from raspberrycam.clock import Clock
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+"""Smallest part S3 accepts, other than the last part of an upload"""
+
+MAX_PARTS = 10000
+"""Most parts S3 allows in one upload"""
+
+
+def fingerprint(file_path: Path) -> str:
+    """Hashes a file, to check that it is the same file an upload was started with
+    Args:
+        file_path: The file to hash
+    Returns:
+        The SHA-256 of the file's contents
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class MultipartUploader:
+    """Uploads large files in parts and checkpoints each finished part to disk, so an upload that
+    is interrupted by a dropped link, a crash or a reboot carries on from the last finished part
+    rather than from the start.
+
+    Parts are sized from the measured link speed so each one takes about `target_part_seconds`:
+    a slow link loses little when a part fails, a fast one doesn't pay for many small requests.
+    Uploads that were started but never finished are aborted by `abort_stale`, as S3 charges for
+    their parts until they are.
+    """
+
+    checkpoint_directory: Path
+    """Directory the checkpoint of each upload in progress is kept in"""
+
+    threshold: int
+    """Files this size in bytes or larger are uploaded in parts"""
+
+    min_part_size: int
+    """Smallest part in bytes"""
+
+    max_part_size: int
+    """Largest part in bytes"""
+
+    target_part_seconds: float
+    """Time each part should take to upload at the measured link speed"""
+
+    stale_after: float
+    """Seconds after which an unfinished upload is aborted"""
+
+    rebuildable: List[Path]
+    """Directories of files, such as bundles, that are rebuilt from their contents for each attempt.
+    Their uploads aren't stale just because the file is gone, and the file is deleted when the upload is aborted"""
+
+    def __init__(
+        self,
+        checkpoint_directory: Path,
+        threshold: int = MIN_PART_SIZE,
+        min_part_size: int = MIN_PART_SIZE,
+        max_part_size: int = 64 * 1024 * 1024,
+        target_part_seconds: float = 30,
+        stale_after: float = 7 * 24 * 3600,
+        clock: Clock | None = None,
+    ) -> None:
+        """
+        Args:
+            checkpoint_directory: Directory the checkpoint of each upload in progress is kept in
+            threshold: Files this size in bytes or larger are uploaded in parts, defaults to the smallest part
+                so bundles, which are limited to 8MB by default, can resume too
+            min_part_size: Smallest part in bytes, S3 needs at least 5MB
+            max_part_size: Largest part in bytes
+            target_part_seconds: Time each part should take to upload at the measured link speed
+            stale_after: Seconds after which an unfinished upload is aborted
+            clock: Source of time, defaults to the system clock
+        """
+        self.checkpoint_directory = Path(checkpoint_directory)
+        self.threshold = threshold
+        self.min_part_size = min_part_size
+        self.max_part_size = max_part_size
+        self.target_part_seconds = target_part_seconds
+        self.stale_after = stale_after
+        self.clock = clock or Clock()
+        self.rebuildable = []
+        self.bytes_per_second: float | None = None
+        os.makedirs(self.checkpoint_directory, exist_ok=True)
+
+    def checkpoint_path(self, file_path: Path) -> Path:
+        """Gets where the checkpoint of a file's upload is kept
+        Args:
+            file_path: The file being uploaded
+        Returns:
+            Path of the checkpoint
+        """
+        name = hashlib.sha1(str(Path(file_path).absolute()).encode()).hexdigest()
+        return self.checkpoint_directory / f"{name}.json"
+
+    def in_progress(self, file_path: Path) -> bool:
+        """Checks whether a file has an unfinished upload that can be resumed
+        Args:
+            file_path: The file being uploaded
+        Returns:
+            True if the file has a checkpoint
+        """
+        return self.checkpoint_path(file_path).exists()
+
+    def next_part_size(self, remaining: int, parts_done: int) -> int:
+        """Chooses the size of the next part from the measured link speed
+        Args:
+            remaining: Bytes of the file left to upload
+            parts_done: Number of parts already uploaded
+        Returns:
+            The part size in bytes
+        """
+        size = self.min_part_size
+        if self.bytes_per_second:
+            size = int(self.bytes_per_second * self.target_part_seconds)
+        # Never run out of parts
+        parts_left = max(1, MAX_PARTS - parts_done - 1)
+        size = max(size, -(-remaining // parts_left))
+        return max(self.min_part_size, min(size, self.max_part_size))
+
+    def upload(self, client: Any, file_path: Path, bucket_name: str, object_name: str) -> bool:
+        """Uploads a file in parts, carrying on from its checkpoint if it has one
+        Args:
+            client: A boto3 S3 client
+            file_path: The file to upload
+            bucket_name: Name of the S3 bucket
+            object_name: Key to upload to. A resumed upload keeps the key it was started with
+        Returns:
+            True if the upload completed
+        """
+        file_path = Path(file_path)
+        checkpoint = self._load_checkpoint(client, file_path, bucket_name)
+        if checkpoint is None:
+            response = client.create_multipart_upload(Bucket=bucket_name, Key=object_name, StorageClass="STANDARD")
+            checkpoint = {
+                "bucket": bucket_name,
+                "key": object_name,
+                "upload_id": response["UploadId"],
+                "file": str(file_path.absolute()),
+                "size": os.path.getsize(file_path),
+                "fingerprint": fingerprint(file_path),
+                "started": self.clock.now().timestamp(),
+                "parts": [],
+            }
+            self._save_checkpoint(file_path, checkpoint)
+        else:
+            logger.info(f"Resuming upload of {file_path} from part {len(checkpoint['parts']) + 1}")
+
+        key, upload_id, size = checkpoint["key"], checkpoint["upload_id"], checkpoint["size"]
+        parts: List[dict] = checkpoint["parts"]
+        try:
+            with open(file_path, "rb") as f:
+                offset = sum(part["Size"] for part in parts)
+                while offset < size:
+                    part_size = self.next_part_size(size - offset, len(parts))
+                    f.seek(offset)
+                    body = f.read(part_size)
+                    start = self.clock.monotonic()
+                    response = client.upload_part(
+                        Bucket=bucket_name, Key=key, UploadId=upload_id, PartNumber=len(parts) + 1, Body=body
+                    )
+                    self._measure(len(body), self.clock.monotonic() - start)
+                    parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"], "Size": len(body)})
+                    self._save_checkpoint(file_path, checkpoint)
+                    offset += len(body)
+                    logger.debug(f"Uploaded part {len(parts)} of {file_path}, {offset}/{size} bytes")
+
+            client.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in parts]},
+            )
+        except Exception as e:
+            if _is_missing_upload(e):
+                # Aborted or expired on the S3 side, so start again next time
+                logger.warning(f"Multipart upload of {file_path} no longer exists, starting again next time")
+                self._remove_checkpoint(file_path)
+            else:
+                logger.error(f"Multipart upload of {file_path} interrupted after {len(parts)} parts: {e}")
+            return False
+
+        self._remove_checkpoint(file_path)
+        logger.info(f"File uploaded to S3 in {len(parts)} parts: s3://{bucket_name}/{key}")
+        return True
+
+    def abort_stale(self, client: Any, bucket_name: str) -> int:
+        """Aborts uploads that were started too long ago or whose file is gone, and any in the
+            bucket that have no checkpoint and are too old
+        Args:
+            client: A boto3 S3 client
+            bucket_name: Name of the S3 bucket
+        Returns:
+            The number of uploads aborted
+        """
+        now = self.clock.now().timestamp()
+        aborted = 0
+        known = set()
+        for path in self.checkpoint_directory.glob("*.json"):
+            try:
+                checkpoint = json.loads(path.read_text())
+            except (OSError, ValueError):
+                path.unlink(missing_ok=True)
+                continue
+            if checkpoint["bucket"] != bucket_name:
+                continue
+            rebuildable = self._is_rebuildable(checkpoint["file"])
+            if now - checkpoint["started"] < self.stale_after and (rebuildable or os.path.exists(checkpoint["file"])):
+                known.add(checkpoint["upload_id"])
+                continue
+            aborted += self._abort(client, bucket_name, checkpoint["key"], checkpoint["upload_id"])
+            path.unlink(missing_ok=True)
+            if rebuildable:
+                # Only kept for the upload to resume from
+                Path(checkpoint["file"]).unlink(missing_ok=True)
+
+        try:
+            response = client.list_multipart_uploads(Bucket=bucket_name)
+        except Exception as e:
+            logger.error(f"Failed to list multipart uploads: {e}")
+            return aborted
+        for upload in response.get("Uploads", []):
+            initiated = upload["Initiated"]
+            if isinstance(initiated, datetime):
+                initiated = initiated.astimezone(timezone.utc).timestamp()
+            if upload["UploadId"] not in known and now - initiated >= self.stale_after:
+                aborted += self._abort(client, bucket_name, upload["Key"], upload["UploadId"])
+
+        if aborted:
+            logger.info(f"Aborted {aborted} stale multipart uploads")
+        return aborted
+
+    def _abort(self, client: Any, bucket_name: str, key: str, upload_id: str) -> int:
+        """Aborts an upload
+        Returns:
+            1 if it was aborted, otherwise 0
+        """
+        try:
+            client.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+            return 1
+        except Exception as e:
+            logger.error(f"Failed to abort multipart upload {upload_id} of {key}: {e}")
+            return 0
+
+    def _is_rebuildable(self, file_path: str) -> bool:
+        """Checks whether a file is in one of the `rebuildable` directories"""
+        return any(Path(file_path).parent == Path(directory).absolute() for directory in self.rebuildable)
+
+    def _measure(self, size: int, seconds: float) -> None:
+        """Updates the measured link speed with a part's upload"""
+        if seconds <= 0:
+            return
+        speed = size / seconds
+        if self.bytes_per_second is None:
+            self.bytes_per_second = speed
+        else:
+            self.bytes_per_second += 0.5 * (speed - self.bytes_per_second)
+
+    def _load_checkpoint(self, client: Any, file_path: Path, bucket_name: str) -> dict | None:
+        """Loads the checkpoint of a file's upload, discarding it if the file has changed since
+        Returns:
+            The checkpoint, None if the upload has to start from scratch
+        """
+        path = self.checkpoint_path(file_path)
+        if not path.exists():
+            return None
+        try:
+            checkpoint = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+            return None
+
+        if (
+            checkpoint["bucket"] == bucket_name
+            and checkpoint["size"] == os.path.getsize(file_path)
+            and checkpoint["fingerprint"] == fingerprint(file_path)
+        ):
+            return checkpoint
+
+        logger.info(f"{file_path} changed since its upload started, starting again")
+        self._abort(client, checkpoint["bucket"], checkpoint["key"], checkpoint["upload_id"])
+        self._remove_checkpoint(file_path)
+        return None
+
+    def _save_checkpoint(self, file_path: Path, checkpoint: dict) -> None:
+        """Writes a checkpoint, replacing the old one atomically so a crash never leaves half of it"""
+        path = self.checkpoint_path(file_path)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _remove_checkpoint(self, file_path: Path) -> None:
+        """Deletes the checkpoint of a file's upload"""
+        self.checkpoint_path(file_path).unlink(missing_ok=True)
+
+
+def _is_missing_upload(error: Exception) -> bool:
+    """Checks whether an error from S3 says the multipart upload doesn't exist"""
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code") == "NoSuchUpload"
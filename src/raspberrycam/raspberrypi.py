@@ -1,10 +1,20 @@
 import logging
 import subprocess
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from datetime import datetime
 from enum import StrEnum
+from pathlib import Path
+from typing import Iterator, List
+
+from raspberrycam.metrics import REGISTRY
 
 logger = logging.getLogger(__name__)
 
+GOVERNOR_SECONDS = REGISTRY.histogram("raspberrycam_governor_switch_seconds", "Time taken to set the CPU governor")
+GOVERNOR_FAILURES = REGISTRY.counter("raspberrycam_governor_failures_total", "Failed attempts to set the CPU governor")
+
 
 class GovernorMode(StrEnum):
     """Enum for allowed governor states in a RasberryPi"""
@@ -16,51 +26,175 @@ class GovernorMode(StrEnum):
     CONSERVATIVE = "conservative"
 
 
-def set_governer(mode: GovernorMode, debug: bool = False) -> None:
-    """Sets the governor mode.
-    Args:
-        mode: A GovernorMode enum
-        debug: Flag for setting debug mode
+class PowerMode(StrEnum):
+    """How the device spends the time between daylight windows"""
+
+    ALWAYS_ON = "always_on"
+    """Stay powered and sleep until the next ON time"""
+    DEEP_SLEEP = "deep_sleep"
+    """Set an RTC wake alarm and power off until shortly before the next ON time"""
+
+
+class PowerProfileManager:
+    """Sets the CPU governor for the work being done: raised for upload bursts and dropped back
+    to the idle governor when they finish.
+
+    The governor last set is remembered, so asking for the governor that is already in place
+    doesn't touch sysfs. The governor files are written directly when the process is allowed to,
+    falling back to `sudo tee` (without a shell) when it isn't.
     """
 
-    try:
+    sysfs_root: Path
+    """Root of the sysfs tree, replaced with a fake tree for testing"""
+
+    idle_mode: GovernorMode
+    """Governor used between upload bursts"""
+
+    burst_mode: GovernorMode
+    """Governor used while uploading"""
+
+    debug: bool
+    """Flag for setting debug mode, where the governor is only logged"""
+
+    switches: int
+    """Number of times the governor has been changed"""
+
+    def __init__(
+        self,
+        sysfs_root: Path = Path("/sys"),
+        idle_mode: GovernorMode = GovernorMode.ONDEMAND,
+        burst_mode: GovernorMode = GovernorMode.PERFORMANCE,
+        debug: bool = False,
+    ) -> None:
+        """
+        Args:
+            sysfs_root: Root of the sysfs tree
+            idle_mode: Governor used between upload bursts
+            burst_mode: Governor used while uploading
+            debug: Flag for setting debug mode
+        """
+        self.sysfs_root = Path(sysfs_root)
+        self.idle_mode = GovernorMode(idle_mode)
+        self.burst_mode = GovernorMode(burst_mode)
+        self.debug = debug
+        self.switches = 0
+        self._current: GovernorMode | None = None
+        self._use_sudo = False
+        self._bursts = 0
+        self._lock = threading.RLock()
+
+    def governor_files(self) -> List[Path]:
+        """Gets the scaling governor file of every CPU
+        Returns:
+            A list of sysfs paths
+        """
+        return sorted((self.sysfs_root / "devices/system/cpu").glob("cpu[0-9]*/cpufreq/scaling_governor"))
+
+    @property
+    def current(self) -> GovernorMode | None:
+        """The governor in use, read from sysfs the first time it is needed"""
+        with self._lock:
+            if self._current is None and not self.debug:
+                files = self.governor_files()
+                try:
+                    self._current = GovernorMode(files[0].read_text().strip()) if files else None
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Couldn't read the CPU governor: {e}")
+            return self._current
+
+    def set_mode(self, mode: GovernorMode) -> bool:
+        """Sets the governor of every CPU, unless it is already set
+        Args:
+            mode: A GovernorMode enum
+        Returns:
+            True if the governor is now set, False if it couldn't be
+        """
         if not isinstance(mode, GovernorMode):
             raise TypeError("mode is not a valid GovernorMode.")
 
-        logger.info(f"Setting CPU governor to {mode.value}.")
-        if debug:
-            logger.info("Governor set")
-            return
+        with self._lock:
+            if mode == self.current:
+                logger.debug(f"CPU governor is already {mode.value}")
+                return True
+
+            logger.info(f"Setting CPU governor to {mode.value}.")
+            if self.debug:
+                logger.info("Governor set")
+            else:
+                try:
+                    with GOVERNOR_SECONDS.time():
+                        self._write(mode)
+                except Exception as e:
+                    GOVERNOR_FAILURES.inc()
+                    # The governor is now unknown, so read it again next time
+                    self._current = None
+                    logger.exception("Failed to set CPU governor", exc_info=e)
+                    return False
+            self._current = mode
+            self.switches += 1
+            return True
 
-        result = subprocess.call(
-            f"echo '{mode}' | sudo tee /sys/devices/system/cpu/cpu*/cpufreq/scaling_governor", shell=True
+    def _write(self, mode: GovernorMode) -> None:
+        """Writes the governor to every CPU's sysfs file
+        Args:
+            mode: A GovernorMode enum
+        """
+        files = self.governor_files()
+        if not files:
+            raise RuntimeError(f"No CPU governor files found under {self.sysfs_root}")
+
+        if not self._use_sudo:
+            try:
+                for path in files:
+                    path.write_text(mode.value)
+                return
+            except PermissionError:
+                logger.info("No permission to write the CPU governor directly, using sudo")
+                self._use_sudo = True
+
+        subprocess.run(
+            ["sudo", "tee", *[str(path) for path in files]],
+            input=mode.value,
+            text=True,
+            stdout=subprocess.DEVNULL,
+            check=True,
         )
 
-        if result:
-            raise RuntimeError(f"Failed to set governer to {mode}")
-    except Exception as e:
-        logger.exception("Failed to set CPU governor", exc_info=e)
+    @contextmanager
+    def boost(self) -> Iterator[None]:
+        """Raises the governor for the body of a `with` block, such as an upload burst.
+        Bursts can overlap, the governor drops back to idle when the last one finishes."""
+        with self._lock:
+            self._bursts += 1
+            if self._bursts == 1:
+                self.set_mode(self.burst_mode)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._bursts -= 1
+                if self._bursts == 0:
+                    self.set_mode(self.idle_mode)
 
 
 def shutdown(debug: bool = False) -> None:
     """Shuts down the device
     Args:
         debug: Flag for setting debug mode
+    Raises:
+        OSError, subprocess.CalledProcessError: If the device couldn't be powered off
     """
 
-    try:
-        logger.info("Initiating system shutdown")
-        if debug:
-            logger.info("Shut down")
-            return
+    logger.info("Initiating system shutdown")
+    if debug:
+        logger.info("Shut down")
+        return
 
-        # Final sync to make sure all data is written
-        subprocess.run("sync", shell=True, check=False)
+    # Final sync to make sure all data is written
+    subprocess.run(["sync"], check=False)
 
-        # Execute shutdown command
-        subprocess.run("sudo shutdown -h now", check=False)
-    except Exception as e:
-        logger.error(f"Failed to shutdown: {e}")
+    # Execute shutdown command
+    subprocess.run(["sudo", "shutdown", "-h", "now"], check=True)
 
 
 def schedule_wakeup(wake_time: datetime, debug: bool = False) -> None:
@@ -68,13 +202,76 @@ def schedule_wakeup(wake_time: datetime, debug: bool = False) -> None:
     Args:
         wake_time: The time to wake up
         debug: Flag for setting debug mode
+    Raises:
+        OSError, subprocess.CalledProcessError: If the alarm couldn't be set
     """
 
-    try:
-        epoch_time = int(wake_time.timestamp())
-        logger.info(f"Scheduling wakeup at {wake_time.strftime('%Y-%m-%d %H:%M:%S')}")
-        if debug:
-            logger.debug("Wakeup time set")
-        subprocess.run(f"sudo rtcwake -m no -t {str(epoch_time)}", shell=True, check=False)
-    except Exception as e:
-        logger.error(f"Failed to schedule wakeup: {e}")
+    epoch_time = int(wake_time.timestamp())
+    logger.info(f"Scheduling wakeup at {wake_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    if debug:
+        logger.debug("Wakeup time set")
+        return
+    # "-m no" only sets the RTC alarm, the device is powered off separately by shutdown()
+    subprocess.run(["sudo", "rtcwake", "-m", "no", "-t", str(epoch_time)], check=True)
+
+
+class PowerInterface(ABC):
+    """Abstract implementation of the device's power controls"""
+
+    @abstractmethod
+    def schedule_wakeup(self, wake_time: datetime) -> None:
+        """Sets the time the device will power back on
+        Args:
+            wake_time: The time to wake up
+        Raises:
+            Exception: If the wake up couldn't be scheduled
+        """
+
+    @abstractmethod
+    def shutdown(self) -> None:
+        """Powers off the device
+        Raises:
+            Exception: If the device couldn't be powered off
+        """
+
+
+class RaspberryPiPower(PowerInterface):
+    """Power controls for a Raspberry Pi with a real time clock"""
+
+    def schedule_wakeup(self, wake_time: datetime) -> None:
+        """Sets an RTC wake alarm
+        Args:
+            wake_time: The time to wake up
+        """
+        schedule_wakeup(wake_time)
+
+    def shutdown(self) -> None:
+        """Shuts down the device"""
+        shutdown()
+
+
+class DebugPower(PowerInterface):
+    """Debug power controls that record what would have happened, used for testing"""
+
+    wakeups: List[datetime]
+    """Wake up times that have been scheduled"""
+
+    shutdowns: int
+    """Number of times the device would have been shut down"""
+
+    def __init__(self) -> None:
+        self.wakeups = []
+        self.shutdowns = 0
+
+    def schedule_wakeup(self, wake_time: datetime) -> None:
+        """Records a wake up time
+        Args:
+            wake_time: The time to wake up
+        """
+        schedule_wakeup(wake_time, debug=True)
+        self.wakeups.append(wake_time)
+
+    def shutdown(self) -> None:
+        """Records a shutdown"""
+        shutdown(debug=True)
+        self.shutdowns += 1
@@ -0,0 +1,57 @@
+import logging
+import threading
+
+from raspberrycam.clock import Clock
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket that keeps uploads under a byte rate, so they don't saturate a link shared with
+    other equipment at the site.
+
+    The bucket fills at `bytes_per_second` up to `burst` bytes. Each upload takes its size from the
+    bucket before it starts, and waits if that leaves the bucket in debt, which lets objects larger
+    than the burst through at the average rate. It is shared by every upload worker.
+    """
+
+    bytes_per_second: float
+    """Average upload rate allowed"""
+
+    burst: float
+    """Bytes that can be sent at once after a quiet spell"""
+
+    def __init__(self, bytes_per_second: float, burst: float | None = None, clock: Clock | None = None) -> None:
+        """
+        Args:
+            bytes_per_second: Average upload rate allowed
+            burst: Bytes that can be sent at once after a quiet spell, defaults to a second's worth
+            clock: Source of monotonic time and the way to wait, defaults to the system clock
+        """
+        if bytes_per_second <= 0:
+            raise ValueError("The rate has to be positive")
+        self.bytes_per_second = bytes_per_second
+        self.burst = burst or bytes_per_second
+        self.clock = clock or Clock()
+        self._tokens = self.burst
+        self._last = self.clock.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int) -> float:
+        """Waits until an upload fits in the rate
+        Args:
+            size: Size of the upload in bytes
+        Returns:
+            The number of seconds waited
+        """
+        with self._lock:
+            now = self.clock.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.bytes_per_second)
+            self._last = now
+            self._tokens -= size
+            wait = -self._tokens / self.bytes_per_second if self._tokens < 0 else 0.0
+
+        if wait:
+            logger.debug(f"Waiting {wait:.2f}s to keep uploads under {self.bytes_per_second / 1024:.2f}KB/s")
+            self.clock.sleep(wait)
+        return wait
@@ -1,14 +1,58 @@
 import logging
 import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Optional, TypedDict
+from typing import Any, Optional, TypedDict
 
-import boto3
-import boto3.session
-from botocore.exceptions import NoCredentialsError
+from raspberrycam.breaker import BreakerState, CircuitBreaker
+from raspberrycam.metrics import REGISTRY, THROUGHPUT_BUCKETS
+from raspberrycam.multipart import MultipartUploader
 
 logger = logging.getLogger(__name__)
 
+ASSUME_ROLE_SECONDS = REGISTRY.histogram("raspberrycam_assume_role_seconds", "Time taken to assume the AWS role")
+ASSUME_ROLE_FAILURES = REGISTRY.counter("raspberrycam_assume_role_failures_total", "Failed attempts to assume the role")
+UPLOAD_SECONDS = REGISTRY.histogram("raspberrycam_upload_seconds", "Time taken by each S3 upload")
+UPLOAD_THROUGHPUT = REGISTRY.histogram(
+    "raspberrycam_upload_bytes_per_second", "Throughput of each successful S3 upload", buckets=THROUGHPUT_BUCKETS
+)
+UPLOAD_BYTES = REGISTRY.counter("raspberrycam_upload_bytes_total", "Bytes uploaded to S3")
+UPLOAD_FAILURES = REGISTRY.counter("raspberrycam_upload_failures_total", "Failed S3 uploads")
+CONNECTION_METRICS = {
+    "sts_calls": REGISTRY.counter("raspberrycam_sts_calls_total", "Times the role was assumed through STS"),
+    "sts_calls_avoided": REGISTRY.counter(
+        "raspberrycam_sts_calls_avoided_total", "Role requests answered from cached credentials"
+    ),
+    "clients_created": REGISTRY.counter(
+        "raspberrycam_s3_clients_created_total", "S3 clients and their connection pools created"
+    ),
+    "client_reuses": REGISTRY.counter(
+        "raspberrycam_s3_client_reuses_total", "Uploads that reused the pooled S3 client"
+    ),
+    "multipart_uploads": REGISTRY.counter("raspberrycam_multipart_uploads_total", "Files uploaded in resumable parts"),
+}
+"""Metric exported for each of the `ConnectionStats`, other than the skipped calls the circuit breaker counts itself"""
+
+
+def record_upload(size: int, seconds: float, success: bool) -> None:
+    """Records the metrics of an upload
+    Args:
+        size: Size of the upload in bytes
+        seconds: Time the upload took
+        success: Whether the upload succeeded
+    """
+    UPLOAD_SECONDS.observe(seconds)
+    if not success:
+        UPLOAD_FAILURES.inc()
+        return
+    UPLOAD_BYTES.inc(size)
+    if seconds > 0:
+        UPLOAD_THROUGHPUT.observe(size / seconds)
+
 
 class AWSCredentials(TypedDict):
     """Typed dictionary for AWS credentials"""
@@ -16,6 +60,34 @@ class AWSCredentials(TypedDict):
     access_key_id: str
     secret_access_key: str
     session_token: str
+    expiration: datetime
+
+
+@dataclass
+class ConnectionStats:
+    """Counters for the STS calls and client connections made by an S3Manager"""
+
+    sts_calls: int = 0
+    """Number of times the role was assumed through STS"""
+    sts_calls_avoided: int = 0
+    """Number of role requests answered from cached credentials"""
+    clients_created: int = 0
+    """Number of S3 clients (and their connection pools) created"""
+    client_reuses: int = 0
+    """Number of uploads that reused an existing pooled client"""
+    calls_skipped: int = 0
+    """Number of role requests and uploads skipped while S3 was unavailable"""
+    multipart_uploads: int = 0
+    """Number of files uploaded in resumable parts"""
+
+    def inc(self, name: str) -> None:
+        """Adds one to a counter and to its metric
+        Args:
+            name: Name of the counter
+        """
+        setattr(self, name, getattr(self, name) + 1)
+        if name in CONNECTION_METRICS:
+            CONNECTION_METRICS[name].inc()
 
 
 def assume_role(
@@ -38,7 +110,11 @@ def assume_role(
     Returns:
         None or a credentials dictionary
     """
+    start = time.perf_counter()
     try:
+        # boto3 takes a noticeable time to import, so it is only loaded once AWS is needed
+        import boto3  # noqa: PLC0415
+
         logger.info(f"Attempting to assume role: {role_arn}")
 
         # Create a boto3 STS client with initial credentials
@@ -54,20 +130,61 @@ def assume_role(
         )
 
         credentials = assumed_role["Credentials"]
+        ASSUME_ROLE_SECONDS.observe(time.perf_counter() - start)
         logger.info("Successfully assumed role")
 
         return {
             "access_key_id": credentials["AccessKeyId"],
             "secret_access_key": credentials["SecretAccessKey"],
             "session_token": credentials["SessionToken"],
+            "expiration": credentials.get(
+                "Expiration", datetime.now(timezone.utc) + timedelta(seconds=duration_seconds)
+            ),
         }
     except Exception as e:
+        ASSUME_ROLE_FAILURES.inc()
         logger.error(f"Error assuming role: {e}")
         return None
 
 
+def _no_credentials_error() -> type[Exception]:
+    """Gets botocore's NoCredentialsError without importing botocore until an upload fails"""
+    from botocore.exceptions import NoCredentialsError  # noqa: PLC0415
+
+    return NoCredentialsError
+
+
+def create_s3_client(credentials: AWSCredentials, max_pool_connections: int = 10) -> Any:
+    """Creates an S3 client that keeps its connections alive between requests
+    Args:
+        credentials: Credential dictionary to authenticate with
+        max_pool_connections: Number of connections kept in the client's pool
+    Returns:
+        A boto3 S3 client
+    """
+    import boto3  # noqa: PLC0415
+    import boto3.session  # noqa: PLC0415
+
+    # Create S3 client with role credentials and reduced part size for multipart uploads
+    return boto3.client(
+        "s3",
+        aws_access_key_id=credentials["access_key_id"],
+        aws_secret_access_key=credentials["secret_access_key"],
+        aws_session_token=credentials["session_token"],
+        config=boto3.session.Config(
+            s3={"multipart_threshold": 10 * 1024 * 1024},  # Only use multipart for files >10MB
+            max_pool_connections=max_pool_connections,
+            tcp_keepalive=True,
+        ),
+    )
+
+
 def upload_to_s3(
-    file_path: Path, bucket_name: str, credentials: AWSCredentials, object_name: Optional[str] = None
+    file_path: Path,
+    bucket_name: str,
+    credentials: AWSCredentials,
+    object_name: Optional[str] = None,
+    s3_client: Any = None,
 ) -> bool:
     """Uploads a file to an S3 bucket
     Args:
@@ -75,33 +192,29 @@ def upload_to_s3(
         bucket_name: Name of the S3 bucket (Not the arn)
         credentials: Credential dictionary to authenticate with
         object_name: Hardcoded path to use in the S3 bucket.
+        s3_client: An existing client to upload with, a new one is created if not given
     """
 
-    # If we couldn't authenticate, stop trying here
+    # If we couldn't authenticate, stop trying here. The file stays pending to retry later
     if not credentials:
-        logging.error("Can't authenticate to AWS. Have you checked the .env file?")
-        exit(1)
+        logger.error("Can't authenticate to AWS. Have you checked the .env file?")
+        UPLOAD_FAILURES.inc()
+        return False
 
     # If S3 object_name was not specified, use file_path with images/ prefix only
     if object_name is None:
         object_name = os.path.basename(file_path)
         object_name = f"images/{object_name}"
 
+    size = 0
+    start = time.perf_counter()
     try:
-        # Create S3 client with role credentials and reduced part size for multipart uploads
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=credentials["access_key_id"],
-            aws_secret_access_key=credentials["secret_access_key"],
-            aws_session_token=credentials["session_token"],
-            config=boto3.session.Config(
-                s3={"multipart_threshold": 10 * 1024 * 1024}  # Only use multipart for files >10MB
-            ),
-        )
+        if s3_client is None:
+            s3_client = create_s3_client(credentials)
 
         # Upload the file
-        file_size = os.path.getsize(file_path) / 1024
-        logger.info(f"Uploading file to S3 ({file_size:.2f}KB): {file_path}")
+        size = os.path.getsize(file_path)
+        logger.info(f"Uploading file to S3 ({size / 1024:.2f}KB): {file_path}")
 
         s3_client.upload_file(
             file_path,
@@ -109,43 +222,385 @@ def upload_to_s3(
             object_name,
             ExtraArgs={"StorageClass": "STANDARD"},  # Use standard storage class
         )
+        record_upload(size, time.perf_counter() - start, success=True)
         logger.info(f"File uploaded to S3: s3://{bucket_name}/{object_name}")
         return True
     except FileNotFoundError:
         logger.error(f"File not found: {file_path}")
+        UPLOAD_FAILURES.inc()
+        return False
+    except _no_credentials_error():
+        logger.error("AWS credentials not available or incorrect")
+        record_upload(size, time.perf_counter() - start, success=False)
+        return False
+    except Exception as e:
+        logger.error(f"Error uploading to S3: {e}")
+        record_upload(size, time.perf_counter() - start, success=False)
+        return False
+
+
+def upload_bytes_to_s3(
+    data: bytes,
+    bucket_name: str,
+    credentials: AWSCredentials,
+    object_name: str,
+    s3_client: Any = None,
+) -> bool:
+    """Uploads an in-memory object to an S3 bucket
+    Args:
+        data: The object contents
+        bucket_name: Name of the S3 bucket (Not the arn)
+        credentials: Credential dictionary to authenticate with
+        object_name: Path to use in the S3 bucket
+        s3_client: An existing client to upload with, a new one is created if not given
+    Returns:
+        True if the upload succeeded
+    """
+    # The caller keeps the data if this fails, so don't exit
+    if not credentials:
+        logger.error("Can't authenticate to AWS. Have you checked the .env file?")
         return False
-    except NoCredentialsError:
+
+    start = time.perf_counter()
+    try:
+        if s3_client is None:
+            s3_client = create_s3_client(credentials)
+
+        logger.info(f"Uploading object to S3 ({len(data) / 1024:.2f}KB): {object_name}")
+        s3_client.put_object(Body=data, Bucket=bucket_name, Key=object_name, StorageClass="STANDARD")
+        record_upload(len(data), time.perf_counter() - start, success=True)
+        logger.info(f"Object uploaded to S3: s3://{bucket_name}/{object_name}")
+        return True
+    except _no_credentials_error():
         logger.error("AWS credentials not available or incorrect")
+        record_upload(len(data), time.perf_counter() - start, success=False)
         return False
     except Exception as e:
         logger.error(f"Error uploading to S3: {e}")
+        record_upload(len(data), time.perf_counter() - start, success=False)
         return False
 
 
 class S3Manager:
-    """Object for managing S3 sessions and uploading files"""
+    """Object for managing S3 sessions and uploading files.
+
+    Role credentials are cached until shortly before they expire and a single pooled
+    client is kept for as long as those credentials are valid, so repeated uploads
+    don't pay for an STS round trip or a new TLS handshake each time.
+
+    STS and S3 calls go through a circuit breaker, so while the link is down they are
+    skipped straight away rather than each waiting to time out.
+    """
 
     access_key_id: str
     secret_access_key: str
     role_arn: str
 
+    duration_seconds: int
+    """Lifetime of the assumed role session in seconds"""
+    refresh_margin: int
+    """Credentials are refreshed this many seconds before they expire"""
+    max_pool_connections: int
+    """Number of connections kept open by the S3 client"""
+    stats: ConnectionStats
+    """Counters of STS calls and client connections"""
+    breaker: CircuitBreaker
+    """Backs off from STS and S3 while they keep failing"""
+    multipart: MultipartUploader | None
+    """Uploads large files in parts that survive a restart, None to leave them to boto3"""
+    cleanup_interval: float
+    """Seconds between checks for stale multipart uploads"""
+
     credentials: AWSCredentials | None = None
 
-    def __init__(self, access_key_id: str, secret_access_key: str, role_arn: str) -> None:
+    def __init__(
+        self,
+        access_key_id: str,
+        secret_access_key: str,
+        role_arn: str,
+        duration_seconds: int = 3600,
+        refresh_margin: int = 300,
+        max_pool_connections: int = 10,
+        breaker: CircuitBreaker | None = None,
+        multipart: MultipartUploader | None = None,
+        cleanup_interval: float = 24 * 3600,
+    ) -> None:
         """
         Args:
             access_key_id: The access key ID
             secret_access_key: The access key secret
             role_arn: The ARN of the AWS role to assume
+            duration_seconds: Length of the assumed role session in seconds
+            refresh_margin: Seconds before expiry at which the credentials are renewed
+            max_pool_connections: Number of connections kept open by the S3 client
+            breaker: Circuit breaker for STS and S3 calls, defaults to one with the default backoff
+            multipart: Uploader for large files in resumable parts, defaults to boto3's own multipart upload
+            cleanup_interval: Seconds between checks for stale multipart uploads
         """
         self.access_key_id = access_key_id
         self.secret_access_key = secret_access_key
         self.role_arn = role_arn
+        self.duration_seconds = duration_seconds
+        self.refresh_margin = refresh_margin
+        self.max_pool_connections = max_pool_connections
+        self.stats = ConnectionStats()
+        self.breaker = breaker or CircuitBreaker()
+        self.multipart = multipart
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup: float | None = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def credentials_valid(self, now: datetime | None = None) -> bool:
+        """Checks whether the cached credentials can still be used
+        Args:
+            now: The time to check against, defaults to the current time
+        Returns:
+            True if credentials are cached and not within the refresh margin of expiring
+        """
+        if not self.credentials:
+            return False
+        if now is None:
+            now = datetime.now(timezone.utc)
+        return self.credentials["expiration"] - timedelta(seconds=self.refresh_margin) > now
 
     def assume_role(self) -> None:
-        """Assumes the role"""
-        self.credentials = assume_role(self.role_arn, self.access_key_id, self.secret_access_key)
+        """Assumes the role, reusing cached credentials until they are close to expiry"""
+        with self._lock:
+            if self.credentials_valid():
+                self.stats.inc("sts_calls_avoided")
+                return
+            self._assume_role()
+
+    def _assume_role(self, trial: bool = False) -> None:
+        """Requests new credentials from STS and drops the client built with the old ones
+        Args:
+            trial: The caller already holds the breaker's trial call, so this doesn't ask for another
+        """
+        self._client = None
+        if not trial and self.breaker.allow() is None:
+            self.stats.inc("calls_skipped")
+            self.credentials = None
+            logger.info(f"Not assuming the role while S3 is unavailable, next retry at {self.breaker.next_retry()}")
+            return
+
+        self.stats.inc("sts_calls")
+        self.credentials = assume_role(
+            self.role_arn, self.access_key_id, self.secret_access_key, duration_seconds=self.duration_seconds
+        )
+        if self.credentials:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def get_client(self, trial: bool = False) -> Any:
+        """Gets the pooled S3 client, refreshing the credentials first if they are expiring
+        Args:
+            trial: The caller holds the breaker's trial call, which the refresh then uses, and
+                credentials are requested even if there were none
+        Returns:
+            A boto3 S3 client, or None if no credentials are available
+        """
+        with self._lock:
+            if (self.credentials or trial) and not self.credentials_valid():
+                self._assume_role(trial=trial)
+            if not self.credentials:
+                return None
+            if self._client is None:
+                self._client = create_s3_client(self.credentials, max_pool_connections=self.max_pool_connections)
+                self.stats.inc("clients_created")
+            else:
+                self.stats.inc("client_reuses")
+            return self._client
 
     def upload(self, file_path: Path, bucket_name: str, object_name: str | None = None) -> bool:
         """Upload a file to S3"""
-        return upload_to_s3(file_path, bucket_name, self.credentials, object_name=object_name)  # type:ignore
+        permit = self._allow()
+        if permit is None:
+            return False
+        trial = permit == BreakerState.HALF_OPEN
+        s3_client = self.get_client(trial=trial)
+        if self._resumable(file_path) and s3_client is not None:
+            success = self._upload_multipart(s3_client, file_path, bucket_name, object_name)
+        else:
+            success = upload_to_s3(
+                file_path,
+                bucket_name,
+                self.credentials,  # type:ignore
+                object_name=object_name,
+                s3_client=s3_client,
+            )
+        # Failing for want of credentials was already counted when the role couldn't be assumed,
+        # and a missing file is nothing to do with the link
+        if success or (self.credentials and os.path.exists(file_path)):
+            self._record(success)
+        else:
+            self._end_trial(trial)
+        return success
+
+    def _resumable(self, file_path: Path) -> bool:
+        """Checks whether a file is uploaded in resumable parts"""
+        return (
+            self.multipart is not None
+            and os.path.exists(file_path)
+            and os.path.getsize(file_path) >= self.multipart.threshold
+        )
+
+    def _upload_multipart(self, s3_client: Any, file_path: Path, bucket_name: str, object_name: str | None) -> bool:
+        """Uploads a large file in parts, carrying on from where an earlier attempt stopped
+        Returns:
+            True if the upload completed
+        """
+        if object_name is None:
+            object_name = f"images/{os.path.basename(file_path)}"
+
+        size = os.path.getsize(file_path)
+        logger.info(f"Uploading file to S3 in parts ({size / 1024:.2f}KB): {file_path}")
+        start = time.perf_counter()
+        try:
+            success = self.multipart.upload(s3_client, file_path, bucket_name, object_name)  # type:ignore
+        except Exception as e:
+            # Starting the upload failed, so there is nothing to resume
+            logger.error(f"Error uploading to S3: {e}")
+            success = False
+        record_upload(size, time.perf_counter() - start, success=success)
+        if success:
+            self.stats.inc("multipart_uploads")
+        return success
+
+    def abort_stale_uploads(self, bucket_name: str) -> int:
+        """Aborts multipart uploads that were never finished, at most once every `cleanup_interval`
+        Args:
+            bucket_name: Name of the S3 bucket
+        Returns:
+            The number of uploads aborted
+        """
+        if self.multipart is None:
+            return 0
+        now = time.monotonic()
+        if self._last_cleanup is not None and now - self._last_cleanup < self.cleanup_interval:
+            return 0
+        if self.breaker.blocked:
+            return 0
+        s3_client = self.get_client()
+        if s3_client is None:
+            return 0
+        self._last_cleanup = now
+        return self.multipart.abort_stale(s3_client, bucket_name)
+
+    def upload_bytes(self, data: bytes, bucket_name: str, object_name: str) -> bool:
+        """Upload an in-memory object to S3"""
+        permit = self._allow()
+        if permit is None:
+            return False
+        trial = permit == BreakerState.HALF_OPEN
+        s3_client = self.get_client(trial=trial)
+        success = upload_bytes_to_s3(
+            data,
+            bucket_name,
+            self.credentials,  # type:ignore
+            object_name=object_name,
+            s3_client=s3_client,
+        )
+        if success or self.credentials:
+            self._record(success)
+        else:
+            self._end_trial(trial)
+        return success
+
+    def _allow(self) -> BreakerState | None:
+        """Checks the breaker before an upload
+        Returns:
+            The state the upload was let through in, HALF_OPEN if it is the breaker's trial, or None to
+                skip it. An upload that is made must then be reported with `_record`
+        """
+        permit = self.breaker.allow()
+        if permit is None:
+            self.stats.inc("calls_skipped")
+            logger.debug(f"Skipping upload while S3 is unavailable, next retry at {self.breaker.next_retry()}")
+        return permit
+
+    def _end_trial(self, trial: bool) -> None:
+        """Fails a trial call whose outcome wasn't recorded, as the circuit would otherwise stay
+            half open and skip every call from then on
+        Args:
+            trial: Whether the call was the breaker's trial
+        """
+        if trial and self.breaker.state == BreakerState.HALF_OPEN:
+            self.breaker.record_failure()
+
+    def _record(self, success: bool) -> None:
+        """Tells the breaker how an upload went
+        Args:
+            success: Whether the upload succeeded
+        """
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+
+class LocalS3Manager(S3Manager):
+    """Stand-in for S3 that stores objects in a local directory, used for testing and benchmarking"""
+
+    root: Path
+    """Directory that buckets and their objects are written under"""
+    latency: float
+    """Seconds each request takes, to imitate a round trip over the network"""
+    requests: int
+    """Number of upload requests received"""
+    bytes_received: int
+    """Total number of bytes uploaded"""
+
+    def __init__(self, root: Path, latency: float = 0.0) -> None:
+        """
+        Args:
+            root: Directory that buckets and their objects are written under
+            latency: Seconds each request takes
+        """
+        super().__init__(access_key_id="", secret_access_key="", role_arn="")
+        self.root = Path(root)
+        self.latency = latency
+        self.requests = 0
+        self.bytes_received = 0
+
+    def assume_role(self) -> None:
+        """No credentials are needed for a local bucket"""
+        self.stats.inc("sts_calls_avoided")
+
+    def upload(self, file_path: Path, bucket_name: str, object_name: str | None = None) -> bool:
+        """Copies a file into the local bucket"""
+        if object_name is None:
+            object_name = f"images/{os.path.basename(file_path)}"
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        destination = self.root / bucket_name / object_name
+        try:
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(file_path, destination)
+        except FileNotFoundError:
+            logger.error(f"File not found: {file_path}")
+            return False
+
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += os.path.getsize(destination)
+        logger.debug(f"File uploaded to local bucket: {destination}")
+        return True
+
+    def upload_bytes(self, data: bytes, bucket_name: str, object_name: str) -> bool:
+        """Writes an in-memory object into the local bucket"""
+        if self.latency:
+            time.sleep(self.latency)
+
+        destination = self.root / bucket_name / object_name
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        destination.write_bytes(data)
+
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += len(data)
+        logger.debug(f"Object uploaded to local bucket: {destination}")
+        return True
@@ -1,9 +1,15 @@
 import logging
+from collections import OrderedDict
 from datetime import date, datetime, timedelta
 from enum import Enum
-from typing import Callable, List, TypedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, List, TypedDict
 
-from raspberrycam.location import Location
+from raspberrycam.suntable import SunTable
+
+if TYPE_CHECKING:
+    # Only needed for type hints, so a scheduler with a saved sun table never imports astral
+    from raspberrycam.location import Location
 
 logger = logging.getLogger(__name__)
 
@@ -40,29 +46,98 @@ ScheduleList = List[ScheduleItem]
 class FdriScheduler:
     """Scheduling class for managing schedules in FDRI devices"""
 
-    location: Location
+    location: "Location"
     """Location of the device, used to calculate the sunrise/sunset time"""
 
-    def __init__(self, location: Location) -> None:
+    sun_table: SunTable | None
+    """Precomputed sunrise/sunset times, the location is only asked for dates outside it"""
+
+    cache_size: int
+    """Number of daily schedules kept in memory"""
+
+    def __init__(self, location: "Location", sun_table: SunTable | None = None, cache_size: int = 8) -> None:
         """
         Args:
             location: The temporal location of the device
+            sun_table: Precomputed sunrise/sunset times for the location
+            cache_size: Number of daily schedules kept in memory
         """
         self.location = location
+        self.sun_table = sun_table
+        self.cache_size = cache_size
+        self._cache: OrderedDict[date, ScheduleList] = OrderedDict()
 
     def get_schedule(self, time: date) -> ScheduleList:
-        """Gets a schedule list for the date specified.
+        """Gets a schedule list for the date specified. Schedules only change once
+            per date so they are cached, oldest used first out.
         Args:
             time: The time to query
         Returns:
             A list of schedules
         """
-        stats = self.location.get_sun_stats(time)
-
-        return [
-            {"time": stats["sunrise"], "state": ScheduleState.ON},
-            {"time": stats["sunset"], "state": ScheduleState.OFF},
+        day = time.date() if isinstance(time, datetime) else time
+        schedule = self._cache.get(day)
+        if schedule is not None:
+            self._cache.move_to_end(day)
+            return schedule
+
+        times = self.sun_table.get(day) if self.sun_table else None
+        if times is None:
+            stats = self.location.get_sun_stats(day)
+            times = (stats["sunrise"], stats["sunset"])
+
+        schedule = [
+            {"time": times[0], "state": ScheduleState.ON},
+            {"time": times[1], "state": ScheduleState.OFF},
         ]
+        self._cache[day] = schedule
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return schedule
+
+    def precompute(self, start: date | None = None, days: int = 366) -> SunTable:
+        """Computes a table of sunrise/sunset times for the location in one pass
+        Args:
+            start: First date of the table, defaults to today
+            days: Number of dates in the table
+        Returns:
+            The table, which is also used by this scheduler from now on
+        """
+        if start is None:
+            start = date.today()
+        self.sun_table = SunTable.compute(self.location.latitude, self.location.longitude, start, days)
+        self._cache.clear()
+        return self.sun_table
+
+    def load_sun_table(self, path: Path, days: int = 366) -> SunTable:
+        """Loads a saved sun table, replacing it with a new one if it's for another location
+            or doesn't cover the next month
+        Args:
+            path: Location of the saved table
+            days: Number of dates in a new table
+        Returns:
+            The table in use
+        """
+        today = date.today()
+        latitude, longitude = self.location.latitude, self.location.longitude
+        try:
+            table = SunTable.load(path)
+            if table.matches(latitude, longitude) and table.covers(today) and table.covers(today + timedelta(days=31)):
+                self.sun_table = table
+                self._cache.clear()
+                return table
+            logger.info(f"Sun table at {path} is out of date, recomputing")
+        except FileNotFoundError:
+            logger.info(f"No sun table at {path}, computing one")
+        except Exception as e:
+            logger.exception(f"Failed to load sun table from {path}", exc_info=e)
+
+        table = self.precompute(today, days)
+        try:
+            table.save(path)
+        except OSError as e:
+            logger.exception(f"Failed to save sun table to {path}", exc_info=e)
+        return table
 
     def get_next_on_time(self, time: datetime) -> datetime:
         """Gets next ON state after the provided datetime which may roll over into the
@@ -82,6 +157,21 @@ class FdriScheduler:
 
         raise RuntimeError("No next on time found")
 
+    def get_next_transition(self, time: datetime) -> ScheduleItem:
+        """Gets the next change of state after the provided datetime, which may roll over
+            into the next day
+        Args:
+            time: The datetime to search after
+        Returns:
+            The schedule item of the next sunrise or sunset
+        """
+        for day in (time.date(), (time + timedelta(days=1)).date()):
+            for item in self.get_schedule(day):
+                if item["time"] > time:
+                    return item
+
+        raise RuntimeError("No next transition found")
+
     def get_state(self, time: datetime) -> ScheduleState:
         """Returns the state at a given datetime
         Args:
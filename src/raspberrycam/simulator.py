@@ -0,0 +1,681 @@
+"""Simulations of the main loop that run off-device and faster than real time.
+
+`fleet` runs many devices uploading to one bucket, to see how the bucket layout and the ingest
+side cope when they flush their backlogs at once. Every device is a full `Raspberrycam` with a
+`DebugCamera`, its own site configuration and a backlog of images, running on a shared
+accelerated clock and uploading to a local stand-in for S3.
+
+`timewarp` replays one device's schedule over days or a whole year in seconds, with a clock that
+jumps forward whenever the app sleeps, and traces its captures, uploads and sleeps.
+
+    python -m raspberrycam.simulator fleet --devices 200 --backlog 50 --hours 6 --speed 3600
+    python -m raspberrycam.simulator timewarp --days 365 --timezone Europe/London
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+from dateutil.tz import gettz
+
+from raspberrycam.camera import DebugCamera
+from raspberrycam.clock import Clock
+from raspberrycam.config import Config
+from raspberrycam.core import Raspberrycam
+from raspberrycam.image import IMAGE_TIMESTAMP_FORMAT, S3ImageManager
+from raspberrycam.location import Location
+from raspberrycam.raspberrypi import DebugPower, PowerProfileManager
+from raspberrycam.s3 import LocalS3Manager
+from raspberrycam.scheduler import FdriScheduler, ScheduleState
+
+logger = logging.getLogger(__name__)
+
+CATCHMENTS = ["SE", "NW", "EA", "SW", "NE"]
+"""Catchments the simulated sites are spread over"""
+
+DIRECTIONS = ["N", "E", "S", "W"]
+"""Directions the simulated cameras face"""
+
+
+class AcceleratedClock(Clock):
+    """Clock that starts at a chosen time and runs faster than real time"""
+
+    start: datetime
+    """Simulated time when the clock was created"""
+    speed: float
+    """Simulated seconds that pass for every real second"""
+
+    def __init__(self, start: datetime, speed: float) -> None:
+        """
+        Args:
+            start: Simulated time to start from, timezone aware
+            speed: Simulated seconds that pass for every real second
+        """
+        self.start = start
+        self.speed = speed
+        self._origin = time.monotonic()
+        self._stopped = threading.Event()
+
+    def now(self) -> datetime:
+        return self.start + timedelta(seconds=self.monotonic())
+
+    def monotonic(self) -> float:
+        return (time.monotonic() - self._origin) * self.speed
+
+    def sleep(self, seconds: float) -> None:
+        self._stopped.wait(seconds / self.speed)
+
+    def stop(self) -> None:
+        """Wakes every sleeper, later sleeps return straight away"""
+        self._stopped.set()
+
+
+@dataclass
+class RequestRecord:
+    """An upload received by the stand-in bucket"""
+
+    key: str
+    """Object key the upload was written to"""
+    size: int
+    """Size of the upload in bytes"""
+    started: float
+    """Real monotonic time the request arrived"""
+    seconds: float
+    """Real time taken to serve the request, including waiting for a free slot"""
+    success: bool
+    """Whether the upload was stored"""
+
+
+class RecordingS3Manager(LocalS3Manager):
+    """Local S3 stand-in shared by a simulated fleet. Every request is timed and recorded, and
+    the link speed and number of requests served at once can be limited to imitate the ingest side"""
+
+    bytes_per_second: float
+    """Transfer speed of each request, 0 for no limit"""
+    records: List[RequestRecord]
+    """Every request received, in the order they finished"""
+
+    def __init__(
+        self, root: Path, latency: float = 0.0, bytes_per_second: float = 0.0, max_concurrent: int = 0
+    ) -> None:
+        """
+        Args:
+            root: Directory that buckets and their objects are written under
+            latency: Seconds each request takes on top of the transfer
+            bytes_per_second: Transfer speed of each request, 0 for no limit
+            max_concurrent: Number of requests served at once, 0 for no limit
+        """
+        super().__init__(root, latency=latency)
+        self.bytes_per_second = bytes_per_second
+        self.records = []
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else nullcontext()
+
+    def _serve(self, key: str, size: int, store: Callable[[], bool]) -> bool:
+        """Serves a request once a slot is free, and records it
+        Args:
+            key: Object key of the upload
+            size: Size of the upload in bytes
+            store: Writes the object to the local bucket
+        Returns:
+            Whether the upload was stored
+        """
+        started = time.monotonic()
+        with self._slots:
+            if self.bytes_per_second:
+                time.sleep(size / self.bytes_per_second)
+            success = store()
+        record = RequestRecord(key, size, started, time.monotonic() - started, success)
+        with self._lock:
+            self.records.append(record)
+        return success
+
+    def upload(self, file_path: Path, bucket_name: str, object_name: str | None = None) -> bool:
+        if object_name is None:
+            object_name = f"images/{os.path.basename(file_path)}"
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        store = partial(super().upload, file_path, bucket_name, object_name)
+        return self._serve(object_name, size, store)
+
+    def upload_bytes(self, data: bytes, bucket_name: str, object_name: str) -> bool:
+        store = partial(super().upload_bytes, data, bucket_name, object_name)
+        return self._serve(object_name, len(data), store)
+
+
+class SizedDebugCamera(DebugCamera):
+    """Debug camera whose fake images are padded to the size of a real one"""
+
+    def __init__(self, image_size: int, *args, **kwargs) -> None:
+        """
+        Args:
+            image_size: Size of each fake image in bytes
+        """
+        super().__init__(*args, **kwargs)
+        self.image_size = image_size
+
+    def capture_bytes(self, vflip: bool = False, hflip: bool = False) -> bytes:
+        content = super().capture_bytes(vflip=vflip, hflip=hflip)
+        return content.ljust(self.image_size, b"\0")
+
+
+def fleet_configs(devices: int, interval: int) -> List[Config]:
+    """Makes up the configuration of each device, spreading the sites over Great Britain
+    Args:
+        devices: Number of devices
+        interval: Seconds between captures
+    Returns:
+        A configuration per device
+    """
+    return [
+        Config(
+            site=f"SIM{i:04d}",
+            lat=50.5 + (i * 0.37) % 8,
+            lon=-5.0 + (i * 0.53) % 6.5,
+            catchment=CATCHMENTS[i % len(CATCHMENTS)],
+            direction=DIRECTIONS[i % len(DIRECTIONS)],
+            interval=interval,
+        )
+        for i in range(devices)
+    ]
+
+
+def make_backlog(image_manager: S3ImageManager, count: int, size: int, end: datetime, interval: int) -> None:
+    """Fills a device's pending directory with images it failed to upload earlier
+    Args:
+        image_manager: The device's image manager
+        count: Number of images
+        size: Size of each image in bytes
+        end: Capture time of the newest image
+        interval: Seconds between the images
+    """
+    config = image_manager.config
+    data = b"\xff" * size
+    for i in range(1, count + 1):
+        timestamp = (end - timedelta(seconds=i * interval)).strftime(IMAGE_TIMESTAMP_FORMAT)
+        name = f"{config.catchment}_{config.site}_01_PCAM_{config.direction}_{timestamp}"
+        with open(image_manager.pending_directory / name, "wb") as out:
+            out.write(data)
+        image_manager.record_capture(image_manager.pending_directory / name)
+
+
+def percentile(values: Sequence[float], fraction: float) -> float | None:
+    """Gets a percentile by the nearest rank method
+    Args:
+        values: The values, in any order
+        fraction: The percentile from 0-1
+    Returns:
+        The smallest value with at least `fraction` of the values at or below it, None if there are none
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarise(records: List[RequestRecord], wall_seconds: float, prefix_depth: int = 2, top: int = 10) -> dict:
+    """Summarises the requests received by the stand-in bucket
+    Args:
+        records: The requests
+        wall_seconds: Real time the simulation ran for
+        prefix_depth: Number of leading key components counted as a prefix
+        top: Number of busiest prefixes to list
+    Returns:
+        Aggregate rates, latency percentiles and how the keys are spread over prefixes
+    """
+    stored = [record for record in records if record.success]
+    total_bytes = sum(record.size for record in stored)
+    latencies = [record.seconds for record in records]
+
+    per_second = Counter()
+    if records:
+        first = min(record.started for record in records)
+        per_second.update(int(record.started - first) for record in records)
+
+    prefixes = Counter("/".join(record.key.split("/")[:prefix_depth]) for record in stored)
+    depth = max((record.key.count("/") for record in stored), default=0)
+    return {
+        "requests": len(records),
+        "failed_requests": len(records) - len(stored),
+        "bytes": total_bytes,
+        "requests_per_second": round(len(records) / wall_seconds, 2) if wall_seconds else None,
+        "peak_requests_per_second": max(per_second.values(), default=0),
+        "bytes_per_second": round(total_bytes / wall_seconds, 2) if wall_seconds else None,
+        "latency_seconds": {
+            name: round(value, 6) if value is not None else None
+            for name, value in (
+                ("p50", percentile(latencies, 0.5)),
+                ("p90", percentile(latencies, 0.9)),
+                ("p99", percentile(latencies, 0.99)),
+                ("p999", percentile(latencies, 0.999)),
+                ("max", max(latencies, default=None)),
+            )
+        },
+        "prefixes": {
+            "depth": prefix_depth,
+            "distinct": len(prefixes),
+            "largest_share": round(max(prefixes.values()) / len(stored), 4) if stored else None,
+            "top": dict(prefixes.most_common(top)),
+            "distinct_by_depth": {
+                d: len({"/".join(record.key.split("/")[:d]) for record in stored}) for d in range(1, depth + 1)
+            },
+        },
+    }
+
+
+def run_fleet(
+    root: Path,
+    devices: int,
+    hours: float,
+    speed: float,
+    start: datetime,
+    interval: int = 3600,
+    backlog: int = 0,
+    image_size: int = 200 * 1024,
+    upload_workers: int = 1,
+    bundle: bool = False,
+    s3_manager: RecordingS3Manager | None = None,
+    prefix_depth: int = 2,
+) -> dict:
+    """Runs a simulated fleet and reports on the requests it made
+    Args:
+        root: Directory the devices and the stand-in bucket are kept in
+        devices: Number of devices
+        hours: Simulated hours to run for
+        speed: Simulated seconds that pass for every real second
+        start: Simulated time to start from
+        interval: Seconds between captures
+        backlog: Number of pending images each device starts with
+        image_size: Size of each image in bytes
+        upload_workers: Number of files each device uploads concurrently
+        bundle: Whether devices upload tar bundles rather than single images
+        s3_manager: The stand-in bucket, defaults to one without limits under `root`
+        prefix_depth: Number of leading key components counted as a prefix in the report
+    Returns:
+        The report, see `summarise`
+    """
+    root = Path(root)
+    s3_manager = s3_manager or RecordingS3Manager(root / "s3")
+    clock = AcceleratedClock(start, speed)
+
+    apps = []
+    for i, config in enumerate(fleet_configs(devices, interval)):
+        image_manager = S3ImageManager(
+            "bucket",
+            s3_manager,
+            root / "devices" / config.site,
+            config,
+            upload_workers=upload_workers,
+            bundle=bundle,
+            clock=clock,
+            durable=False,
+        )
+        make_backlog(image_manager, backlog, image_size, start, interval)
+        apps.append(
+            Raspberrycam(
+                FdriScheduler(Location(config.lat, config.lon)),
+                SizedDebugCamera(image_size, 256, 256),
+                image_manager,
+                capture_interval=interval,
+                clock=clock,
+                jump_check_interval=config.jump_check_interval,
+                power=DebugPower(),
+                power_profile=PowerProfileManager(debug=True),
+            )
+        )
+
+    def run_device(app: Raspberrycam) -> None:
+        try:
+            app.run()
+        except Exception as e:
+            logger.exception(f"Simulated device {app.image_manager.config.site} failed", exc_info=e)
+
+    threads = [threading.Thread(target=run_device, args=(app,), daemon=True) for app in apps]
+    wall_start = time.monotonic()
+    for thread in threads:
+        thread.start()
+
+    time.sleep(hours * 3600 / speed)
+    for app in apps:
+        app.stop()
+    clock.stop()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.monotonic() - wall_start
+
+    report = {
+        "devices": devices,
+        "simulated_hours": hours,
+        "speed": speed,
+        "wall_seconds": round(wall_seconds, 3),
+        "pending_after": sum(app.image_manager.pending_count() for app in apps),
+    }
+    report.update(summarise(list(s3_manager.records), wall_seconds, prefix_depth))
+    return report
+
+
+@dataclass
+class TraceEvent:
+    """Something the app did during a time-warp run"""
+
+    kind: str
+    """What happened, one of "capture", "upload" or "sleep" """
+    time: datetime
+    """Simulated time of the event, for a sleep the time it started"""
+    seconds: float = 0.0
+    """Simulated length of a sleep"""
+    cpu: float = 0.0
+    """CPU seconds the app used while awake before a sleep"""
+    size: int = 0
+    """Bytes of a capture or upload"""
+    detail: str = ""
+    """Object key of an upload"""
+
+
+class Trace:
+    """Events recorded during a time-warp run"""
+
+    events: List[TraceEvent]
+    """Every event in the order it happened"""
+
+    def __init__(self) -> None:
+        self.events = []
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, time: datetime, **kwargs) -> None:
+        """Records an event
+        Args:
+            kind: One of "capture", "upload" or "sleep"
+            time: Simulated time of the event
+            kwargs: Other fields of the `TraceEvent`
+        """
+        with self._lock:
+            self.events.append(TraceEvent(kind, time, **kwargs))
+
+    def of(self, kind: str) -> List[TraceEvent]:
+        """Gets the events of one kind
+        Args:
+            kind: One of "capture", "upload" or "sleep"
+        Returns:
+            The events in the order they happened
+        """
+        return [event for event in self.events if event.kind == kind]
+
+    def daily(self) -> Dict[date, dict]:
+        """Totals the events of each simulated day. Wake-ups count on the day the app woke up
+        Returns:
+            Per date, the number of captures, uploads and wake-ups and the seconds slept and of CPU used
+        """
+        days = defaultdict(
+            lambda: {"captures": 0, "uploads": 0, "wakeups": 0, "sleep_seconds": 0.0, "cpu_seconds": 0.0}
+        )
+        for event in self.events:
+            day = days[event.time.date()]
+            if event.kind == "sleep":
+                day["sleep_seconds"] += event.seconds
+                day["cpu_seconds"] += event.cpu
+                days[(event.time + timedelta(seconds=event.seconds)).date()]["wakeups"] += 1
+            else:
+                day[f"{event.kind}s"] += 1
+        return dict(sorted(days.items()))
+
+    def write(self, path: Path) -> None:
+        """Writes the events to a file as JSON lines
+        Args:
+            path: Destination of the trace
+        """
+        with open(path, "w") as out:
+            for event in self.events:
+                out.write(json.dumps({**asdict(event), "time": event.time.isoformat()}) + "\n")
+
+
+class SimulatedClock(Clock):
+    """Clock where sleeping moves time on instantly. Each sleep is traced along with the CPU time
+    the app used since it last woke up, and the app is stopped once the clock reaches `end`"""
+
+    tz: tzinfo
+    """Timezone the time is given in, which decides when the clocks change"""
+    end: datetime | None
+    """Time to stop the app at"""
+    trace: Trace
+    """Trace that sleeps are recorded in"""
+    on_end: Callable[[], None] | None
+    """Called when the clock reaches `end`, usually the app's `stop`"""
+
+    def __init__(self, start: datetime, end: datetime | None = None, tz: tzinfo | None = None) -> None:
+        """
+        Args:
+            start: Time to start from, timezone aware
+            end: Time to stop the app at
+            tz: Timezone the time is given in, defaults to the timezone of `start`
+        """
+        self.tz = tz or start.tzinfo
+        self.end = end
+        self.trace = Trace()
+        self.on_end = None
+        # Kept in UTC so that sleeping over a change of the clocks moves time on by the right amount
+        self._utc = start.astimezone(timezone.utc)
+        self._mono = 0.0
+        self._cpu = time.process_time()
+
+    def now(self) -> datetime:
+        return self._utc.astimezone(self.tz)
+
+    def monotonic(self) -> float:
+        return self._mono
+
+    def sleep(self, seconds: float) -> None:
+        self.trace.record("sleep", self.now(), seconds=seconds, cpu=time.process_time() - self._cpu)
+        self._utc += timedelta(seconds=seconds)
+        self._mono += seconds
+        if self.end and self._utc >= self.end and self.on_end:
+            self.on_end()
+        self._cpu = time.process_time()
+
+
+class TracingCamera(DebugCamera):
+    """Debug camera that traces each capture"""
+
+    def __init__(self, clock: SimulatedClock, *args, **kwargs) -> None:
+        """
+        Args:
+            clock: Clock that gives the time of each capture and holds the trace
+        """
+        super().__init__(*args, **kwargs)
+        self.clock = clock
+
+    def capture_bytes(self, vflip: bool = False, hflip: bool = False) -> bytes:
+        content = super().capture_bytes(vflip=vflip, hflip=hflip)
+        self.clock.trace.record("capture", self.clock.now(), size=len(content))
+        return content
+
+
+class TracingS3Manager(LocalS3Manager):
+    """Local S3 stand-in that traces each upload"""
+
+    def __init__(self, root: Path, clock: SimulatedClock) -> None:
+        """
+        Args:
+            root: Directory that buckets and their objects are written under
+            clock: Clock that gives the time of each upload and holds the trace
+        """
+        super().__init__(root)
+        self.clock = clock
+
+    def upload(self, file_path: Path, bucket_name: str, object_name: str | None = None) -> bool:
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        success = super().upload(file_path, bucket_name, object_name)
+        if success:
+            self.clock.trace.record("upload", self.clock.now(), size=size, detail=object_name or "")
+        return success
+
+    def upload_bytes(self, data: bytes, bucket_name: str, object_name: str) -> bool:
+        success = super().upload_bytes(data, bucket_name, object_name)
+        if success:
+            self.clock.trace.record("upload", self.clock.now(), size=len(data), detail=object_name)
+        return success
+
+
+def time_warp(root: Path, config: Config, start: datetime, days: float, interval: int | None = None) -> Trace:
+    """Runs the main loop of one device over simulated days, as fast as it can go
+    Args:
+        root: Directory the device and the stand-in bucket are kept in
+        config: Configuration of the device
+        start: Time to start from, timezone aware in the device's timezone
+        days: Simulated days to run for
+        interval: Seconds between captures, defaults to the configured interval
+    Returns:
+        The trace of the run
+    """
+    root = Path(root)
+    clock = SimulatedClock(start, end=start + timedelta(days=days))
+    # Flushing every capture to disk would take longer than the rest of the replay
+    image_manager = S3ImageManager(
+        "bucket", TracingS3Manager(root / "s3", clock), root / "app", config, clock=clock, durable=False
+    )
+    app = Raspberrycam(
+        FdriScheduler(Location(config.lat, config.lon)),
+        TracingCamera(clock, 256, 256),
+        image_manager,
+        capture_interval=interval or config.interval,
+        clock=clock,
+        jump_check_interval=config.jump_check_interval,
+        power=DebugPower(),
+        power_profile=PowerProfileManager(debug=True),
+    )
+    clock.on_end = app.stop
+    app.run()
+    return clock.trace
+
+
+def check_schedule(trace: Trace, scheduler: FdriScheduler, interval: int, tolerance: float = 1.0) -> List[str]:
+    """Checks the captures of a time-warp run against the schedule. Captures should only happen
+        while the camera is ON, start at sunrise and follow each other every `interval` seconds
+    Args:
+        trace: The trace of the run
+        scheduler: Scheduler of the device
+        interval: Seconds between captures
+        tolerance: Seconds a capture can be off from when it was due
+    Returns:
+        A description of each problem found
+    """
+    problems = []
+    previous = None
+    for capture in trace.of("capture"):
+        if scheduler.get_state(capture.time) != ScheduleState.ON:
+            problems.append(f"{capture.time.isoformat()}: captured while OFF")
+        if previous is not None:
+            gap = (capture.time - previous).total_seconds()
+            if scheduler.get_next_transition(previous)["time"] > capture.time:
+                if abs(gap - interval) > tolerance:
+                    problems.append(f"{capture.time.isoformat()}: captured {gap:.0f}s after the last capture")
+            else:
+                sunrise = scheduler.get_next_on_time(previous)
+                if abs((capture.time - sunrise).total_seconds()) > tolerance:
+                    problems.append(f"{capture.time.isoformat()}: first capture of the day, sunrise was {sunrise}")
+        previous = capture.time
+    return problems
+
+
+def summarise_trace(trace: Trace, problems: List[str], wall_seconds: float) -> dict:
+    """Summarises a time-warp run
+    Args:
+        trace: The trace of the run
+        problems: Problems found by `check_schedule`
+        wall_seconds: Real time the run took
+    Returns:
+        Totals and per day averages of the run, and the schedule problems
+    """
+    daily = trace.daily()
+    totals = {key: sum(day[key] for day in daily.values()) for key in next(iter(daily.values()), {})}
+    return {
+        "days": len(daily),
+        "wall_seconds": round(wall_seconds, 3),
+        "totals": {key: round(value, 6) for key, value in totals.items()},
+        "per_day": {key: round(value / len(daily), 6) for key, value in totals.items()},
+        "schedule_problems": len(problems),
+        "first_problems": problems[:20],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, help="File to write the report to as well as stdout")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    fleet = subparsers.add_parser("fleet", help="Many devices uploading to one bucket")
+    fleet.add_argument("--devices", type=int, default=100)
+    fleet.add_argument("--hours", type=float, default=6, help="Simulated hours to run for")
+    fleet.add_argument("--speed", type=float, default=3600, help="Simulated seconds per real second")
+    fleet.add_argument("--start", type=datetime.fromisoformat, default=datetime(2025, 6, 6, 9, 0, tzinfo=timezone.utc))
+    fleet.add_argument("--interval", type=int, default=3600, help="Seconds between captures")
+    fleet.add_argument("--backlog", type=int, default=20, help="Pending images each device starts with")
+    fleet.add_argument("--image-size", type=int, default=200 * 1024)
+    fleet.add_argument("--upload-workers", type=int, default=1)
+    fleet.add_argument("--bundle", action="store_true")
+    fleet.add_argument("--latency", type=float, default=0.0, help="Seconds each request takes")
+    fleet.add_argument("--bandwidth", type=float, default=0.0, help="Bytes per second of each request")
+    fleet.add_argument("--max-concurrent", type=int, default=0, help="Requests the bucket serves at once")
+    fleet.add_argument("--prefix-depth", type=int, default=2, help="Key components counted as a prefix")
+    fleet.add_argument("--root", type=Path, help="Directory to keep the devices and bucket in, defaults to a temp dir")
+
+    warp = subparsers.add_parser("timewarp", help="One device's schedule replayed over days")
+    warp.add_argument("--days", type=float, default=365)
+    warp.add_argument("--start", type=date.fromisoformat, default=date(2025, 1, 1))
+    warp.add_argument("--timezone", default="Europe/London")
+    warp.add_argument("--lat", type=float, default=51.8626453)
+    warp.add_argument("--lon", type=float, default=-0.2031049)
+    warp.add_argument("--interval", type=int, default=300, help="Seconds between captures")
+    warp.add_argument("--trace", type=Path, help="File to write every event to as JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.mode == "fleet":
+            root = args.root or Path(tmp)
+            s3_manager = RecordingS3Manager(root / "s3", args.latency, args.bandwidth, args.max_concurrent)
+            report = run_fleet(
+                root,
+                args.devices,
+                args.hours,
+                args.speed,
+                args.start,
+                interval=args.interval,
+                backlog=args.backlog,
+                image_size=args.image_size,
+                upload_workers=args.upload_workers,
+                bundle=args.bundle,
+                s3_manager=s3_manager,
+                prefix_depth=args.prefix_depth,
+            )
+        else:
+            config = Config(
+                site="WARP", lat=args.lat, lon=args.lon, catchment="SE", direction="E", interval=args.interval
+            )
+            start = datetime.combine(args.start, datetime.min.time(), tzinfo=gettz(args.timezone))
+            wall_start = time.monotonic()
+            trace = time_warp(Path(tmp), config, start, args.days)
+            wall_seconds = time.monotonic() - wall_start
+            scheduler = FdriScheduler(Location(config.lat, config.lon))
+            report = summarise_trace(trace, check_schedule(trace, scheduler, args.interval), wall_seconds)
+            if args.trace:
+                trace.write(args.trace)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
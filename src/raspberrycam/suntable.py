@@ -0,0 +1,252 @@
+import logging
+from datetime import date, datetime, timedelta, timezone
+from math import acos, degrees, radians, tan
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Same constants as astral, so the table agrees with `Location.get_sun_stats`
+SUN_APPARENT_RADIUS = 32.0 / (60.0 * 2.0)
+"""Apparent radius of the sun in degrees"""
+EARTH_RADIUS = 6356900
+"""Radius of the earth in metres, used for the horizon dip of an elevated observer"""
+JULIAN_DAY_OFFSET = 1721424.5
+"""Difference between a proleptic Gregorian ordinal and the Julian day at midnight"""
+UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+"""Ordinal of the unix epoch"""
+
+
+def _refraction_at_zenith(zenith: float) -> float:
+    """Degrees of atmospheric refraction of the sun at a zenith angle"""
+    elevation = 90 - zenith
+    if elevation >= 85.0:
+        return 0.0
+    te = tan(radians(elevation))
+    if elevation > 5.0:
+        correction = 58.1 / te - 0.07 / te**3 + 0.000086 / te**5
+    elif elevation > -0.575:
+        correction = 1735.0 + elevation * (-518.2 + elevation * (103.4 + elevation * (-12.79 + elevation * 0.711)))
+    else:
+        correction = -20.774 / te
+    return correction / 3600.0
+
+
+def _sun_position(jc: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Solar declination and equation of time for an array of julian centuries
+    Args:
+        jc: Julian centuries since J2000
+    Returns:
+        The declination in degrees and equation of time in minutes
+    """
+    l0 = np.mod(280.46646 + jc * (36000.76983 + 0.0003032 * jc), 360.0)
+    m = 357.52911 + jc * (35999.05029 - 0.0001537 * jc)
+    e = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+
+    mrad = np.radians(m)
+    c = (
+        np.sin(mrad) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+        + np.sin(2 * mrad) * (0.019993 - 0.000101 * jc)
+        + np.sin(3 * mrad) * 0.000289
+    )
+    omega = np.radians(125.04 - 1934.136 * jc)
+    apparent_long = l0 + c - 0.00569 - 0.00478 * np.sin(omega)
+
+    seconds = 21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))
+    obliquity = 23.0 + (26.0 + seconds / 60.0) / 60.0 + 0.00256 * np.cos(omega)
+
+    declination = np.degrees(np.arcsin(np.sin(np.radians(obliquity)) * np.sin(np.radians(apparent_long))))
+
+    y = np.tan(np.radians(obliquity) / 2.0) ** 2
+    l0rad = np.radians(l0)
+    eqtime = (
+        y * np.sin(2.0 * l0rad)
+        - 2.0 * e * np.sin(mrad)
+        + 4.0 * e * y * np.sin(mrad) * np.cos(2.0 * l0rad)
+        - 0.5 * y * y * np.sin(4.0 * l0rad)
+        - 1.25 * e * e * np.sin(2.0 * mrad)
+    )
+    return declination, np.degrees(eqtime) * 4.0
+
+
+def _transit_times(
+    ordinals: np.ndarray, latitude: float, longitude: float, elevation: float, rising: bool
+) -> np.ndarray:
+    """Vectorised version of astral's `time_of_transit` for sunrise or sunset
+    Args:
+        ordinals: Proleptic Gregorian ordinals of the dates
+        latitude: The location latitude
+        longitude: The location longitude
+        elevation: Height of the observer above sea level in metres
+        rising: True for sunrise, False for sunset
+    Returns:
+        Transit times as unix timestamps, NaN where the sun doesn't cross the horizon on that date
+    """
+    latitude = min(max(latitude, -89.8), 89.8)
+    zenith = 90.0 + SUN_APPARENT_RADIUS
+    if elevation > 0:
+        zenith += degrees(acos(EARTH_RADIUS / (EARTH_RADIUS + elevation)))
+    zenith += _refraction_at_zenith(zenith)
+
+    jd = ordinals + JULIAN_DAY_OFFSET
+    adjustment = np.zeros(len(ordinals))
+    minutes = np.zeros(len(ordinals))
+    latitude_rad = radians(latitude)
+    with np.errstate(invalid="ignore"):
+        for _ in range(2):
+            declination, eqtime = _sun_position((jd + adjustment - 2451545.0) / 36525.0)
+            declination_rad = np.radians(declination)
+            h = (np.cos(radians(zenith)) - np.sin(latitude_rad) * np.sin(declination_rad)) / (
+                np.cos(latitude_rad) * np.cos(declination_rad)
+            )
+            hour_angle = np.arccos(h)
+            if not rising:
+                hour_angle = -hour_angle
+
+            offset = (-longitude - np.degrees(hour_angle)) * 4.0 - eqtime
+            offset = np.where(offset < -720.0, offset + 1440, offset)
+            minutes = 720.0 + offset
+            adjustment = minutes / 1440.0
+
+    timestamps = (ordinals - UNIX_EPOCH_ORDINAL) * 86400.0 + minutes * 60.0
+    # astral looks at the neighbouring date when the transit falls outside the requested UTC date,
+    # leave those rare cases to it
+    outside = (minutes < 0) | (minutes >= 1440)
+    return np.where(outside, np.nan, timestamps)
+
+
+class SunTable:
+    """Precomputed table of sunrise and sunset times for a location.
+
+    The whole table is computed in one vectorised pass with the same formulae astral uses,
+    and can be saved to disk so a device can load it at startup without importing astral.
+    """
+
+    latitude: float
+    """The location latitude"""
+    longitude: float
+    """The location longitude"""
+    start: date
+    """First date in the table"""
+    sunrise: np.ndarray
+    """Sunrise for each date as a unix timestamp, NaN if there is none"""
+    sunset: np.ndarray
+    """Sunset for each date as a unix timestamp, NaN if there is none"""
+
+    def __init__(self, latitude: float, longitude: float, start: date, sunrise: np.ndarray, sunset: np.ndarray) -> None:
+        """
+        Args:
+            latitude: The location latitude
+            longitude: The location longitude
+            start: First date in the table
+            sunrise: Sunrise for each date as a unix timestamp
+            sunset: Sunset for each date as a unix timestamp
+        """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.start = start
+        self.sunrise = sunrise
+        self.sunset = sunset
+
+    def __len__(self) -> int:
+        return len(self.sunrise)
+
+    @property
+    def end(self) -> date:
+        """Last date in the table"""
+        return self.start + timedelta(days=len(self) - 1)
+
+    @classmethod
+    def compute(
+        cls, latitude: float, longitude: float, start: date, days: int = 366, elevation: float = 0.0
+    ) -> "SunTable":
+        """Computes sunrise and sunset for a run of dates
+        Args:
+            latitude: The location latitude
+            longitude: The location longitude
+            start: First date of the table
+            days: Number of dates in the table
+            elevation: Height of the observer above sea level in metres
+        Returns:
+            A new table
+        """
+        ordinals = np.arange(start.toordinal(), start.toordinal() + days, dtype=np.float64)
+        return cls(
+            latitude,
+            longitude,
+            start,
+            _transit_times(ordinals, latitude, longitude, elevation, rising=True),
+            _transit_times(ordinals, latitude, longitude, elevation, rising=False),
+        )
+
+    def matches(self, latitude: float, longitude: float) -> bool:
+        """Checks whether the table was computed for a location
+        Args:
+            latitude: The location latitude
+            longitude: The location longitude
+        Returns:
+            True if the table is for this location
+        """
+        return bool(np.isclose(self.latitude, latitude) and np.isclose(self.longitude, longitude))
+
+    def covers(self, day: date) -> bool:
+        """Checks whether a date is in the table
+        Args:
+            day: The date to check
+        Returns:
+            True if the date is in the table
+        """
+        return self.start <= day <= self.end
+
+    def get(self, day: date) -> tuple[datetime, datetime] | None:
+        """Gets sunrise and sunset for a date
+        Args:
+            day: The date to look up
+        Returns:
+            Sunrise and sunset as UTC datetimes, or None if the date isn't in the table
+            or the sun doesn't rise and set that day
+        """
+        if not self.covers(day):
+            return None
+        i = day.toordinal() - self.start.toordinal()
+        sunrise, sunset = self.sunrise[i], self.sunset[i]
+        if np.isnan(sunrise) or np.isnan(sunset):
+            return None
+        return (
+            datetime.fromtimestamp(float(sunrise), tz=timezone.utc),
+            datetime.fromtimestamp(float(sunset), tz=timezone.utc),
+        )
+
+    def save(self, path: Path) -> None:
+        """Writes the table to a `.npz` file
+        Args:
+            path: Destination of the table
+        """
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                location=np.array([self.latitude, self.longitude]),
+                start=np.array(self.start.toordinal()),
+                sunrise=self.sunrise,
+                sunset=self.sunset,
+            )
+        logger.info(f"Saved sun table for {self.start} to {self.end} to {path}")
+
+    @classmethod
+    def load(cls, path: Path) -> "SunTable":
+        """Reads a table written by `save`
+        Args:
+            path: Location of the table
+        Returns:
+            The table
+        """
+        with np.load(path) as data:
+            latitude, longitude = data["location"]
+            return cls(
+                float(latitude),
+                float(longitude),
+                date.fromordinal(int(data["start"])),
+                data["sunrise"],
+                data["sunset"],
+            )
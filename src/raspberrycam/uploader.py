@@ -0,0 +1,223 @@
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from pathlib import Path
+from typing import ContextManager
+
+from raspberrycam.image import S3ImageManager, UploadReport
+from raspberrycam.raspberrypi import PowerProfileManager
+from raspberrycam.watcher import DirectoryWatcher
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundUploader:
+    """Uploads captured images on a worker thread so that capturing never waits on the network.
+
+    The capture loop hands finished images to `enqueue`, which never blocks. The worker
+    uploads whatever is queued as soon as it arrives and sweeps the pending directory every
+    `upload_interval` seconds to retry failed uploads and images that didn't fit in the queue.
+
+    With a `watcher` on the pending directory the uploader finds new images by itself, as soon
+    as they are committed and whichever process captured them, so nothing has to be enqueued.
+    """
+
+    image_manager: S3ImageManager
+    """Image manager used to upload the images"""
+
+    upload_interval: float
+    """Seconds between sweeps of the pending directory"""
+
+    max_queue_size: int
+    """Maximum number of images waiting in the queue"""
+
+    debug: bool
+    """Flag to activate debug mode"""
+
+    power_profile: PowerProfileManager | None
+    """Optional CPU governor manager, raised while each batch uploads"""
+
+    watcher: DirectoryWatcher | None
+    """Optional watcher of the pending directory, which queues images as they are committed"""
+
+    def __init__(
+        self,
+        image_manager: S3ImageManager,
+        max_queue_size: int = 100,
+        upload_interval: float = 300,
+        debug: bool = False,
+        power_profile: PowerProfileManager | None = None,
+        watcher: DirectoryWatcher | None = None,
+    ) -> None:
+        """
+        Args:
+            image_manager: Image manager used to upload the images
+            max_queue_size: Maximum number of images waiting in the queue
+            upload_interval: Seconds between sweeps of the pending directory
+            debug: Flag to activate debug mode
+            power_profile: CPU governor manager, raised while each batch uploads
+            watcher: Watcher of the pending directory, which queues images as they are committed
+        """
+        self.image_manager = image_manager
+        self.max_queue_size = max_queue_size
+        self.upload_interval = upload_interval
+        self.debug = debug
+        self.power_profile = power_profile
+        self.watcher = watcher
+
+        self._queue: queue.Queue[Path | None] = queue.Queue(maxsize=max_queue_size)
+        self._pending: OrderedDict[Path, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._watch_thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the worker thread is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def watching(self) -> bool:
+        """Whether committed images are queued by the watcher, so they don't need to be enqueued"""
+        return self._watch_thread is not None and self._watch_thread.is_alive()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of images waiting to be picked up by the worker"""
+        return self._queue.qsize()
+
+    def oldest_pending_age(self) -> float | None:
+        """Gets the age of the oldest image handed to the uploader that hasn't been uploaded yet
+        Returns:
+            The age in seconds, or None if nothing is pending
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            return time.monotonic() - next(iter(self._pending.values()))
+
+    def start(self) -> None:
+        """Starts the worker thread"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="raspberrycam-uploader", daemon=True)
+        self._thread.start()
+        if self.watcher:
+            self.watcher.open()
+            self._watch_thread = threading.Thread(target=self._watch, name="raspberrycam-watcher", daemon=True)
+            self._watch_thread.start()
+        logger.info("Started background uploader")
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stops the worker thread once its current batch has finished.
+        Images still queued stay in the pending directory for the next run.
+        Args:
+            timeout: Seconds to wait for the worker to finish
+        """
+        self._stop_event.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._watch_thread is not None:
+            self._watch_thread.join(timeout)
+            # Closing under a running wait would pull the descriptor out from under it
+            if not self._watch_thread.is_alive():
+                self.watcher.close()  # type:ignore
+            self._watch_thread = None
+        logger.info("Stopped background uploader")
+
+    def enqueue(self, image: Path) -> bool:
+        """Hands a captured image to the uploader without blocking
+        Args:
+            image: Path of the captured image
+        Returns:
+            True if queued, False if the queue was full. A file that isn't queued
+            stays in the pending directory and is picked up by the next sweep.
+        """
+        with self._lock:
+            self._pending.setdefault(Path(image), time.monotonic())
+        try:
+            self._queue.put_nowait(Path(image))
+        except queue.Full:
+            logger.warning(f"Upload queue is full, {image} will be uploaded on the next sweep")
+            return False
+        return True
+
+    def _watch(self) -> None:
+        """Watcher loop, queues images as they are committed to the pending directory"""
+        try:
+            while not self._stop_event.is_set():
+                for image in self.watcher.wait(timeout=1.0):  # type:ignore
+                    self.enqueue(image)
+        except Exception as e:
+            logger.exception("Stopped watching the pending directory, relying on sweeps", exc_info=e)
+
+    def _run(self) -> None:
+        """Worker loop, uploads queued images as they arrive and sweeps the pending directory on timeout"""
+        while not self._stop_event.is_set():
+            try:
+                image = self._queue.get(timeout=self.upload_interval)
+            except queue.Empty:
+                self._sweep()
+                continue
+
+            batch = [image]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # The capture loop and the watcher can both queue an image
+            images = [x for x in dict.fromkeys(batch) if x is not None and x.exists()]
+            if images:
+                self._upload(images)
+
+    def _upload(self, images: list[Path]) -> UploadReport | None:
+        """Uploads a batch of queued images
+        Args:
+            images: The image files to upload
+        Returns:
+            A report of the uploads made
+        """
+        try:
+            with self._boost():
+                self.image_manager.s3_manager.assume_role()
+                report = self.image_manager.upload_images(images, debug=self.debug)
+        except Exception as e:
+            logger.exception("Background upload failed", exc_info=e)
+            return None
+        self._forget(images)
+        return report
+
+    def _sweep(self) -> None:
+        """Uploads everything left in the pending directory"""
+        try:
+            if self.image_manager.pending_count() > 0:
+                with self._boost():
+                    self.image_manager.upload_pending(debug=self.debug)
+        except Exception as e:
+            logger.exception("Background upload failed", exc_info=e)
+        self._forget()
+
+    def _boost(self) -> ContextManager[None]:
+        """Raises the CPU governor for an upload, if there is a power profile manager"""
+        return self.power_profile.boost() if self.power_profile else nullcontext()
+
+    def _forget(self, images: list[Path] | None = None) -> None:
+        """Stops tracking images that are no longer in the pending directory
+        Args:
+            images: The images to check, defaults to every tracked image
+        """
+        with self._lock:
+            for image in list(self._pending) if images is None else images:
+                if not image.exists():
+                    self._pending.pop(image, None)
@@ -0,0 +1,155 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+IN_MOVED_TO = 0x00000080
+"""inotify event for a file renamed into the watched directory"""
+
+IN_Q_OVERFLOW = 0x00004000
+"""inotify event for events lost because the kernel's queue filled up"""
+
+EVENT_HEADER = struct.Struct("iIII")
+"""Layout of the fixed part of a `struct inotify_event`: wd, mask, cookie and the length of the name"""
+
+
+class DirectoryWatcher(ABC):
+    """Reports files committed to a directory, which captures reach by an atomic rename"""
+
+    directory: Path
+    """Directory being watched"""
+
+    @abstractmethod
+    def wait(self, timeout: float) -> List[Path]:
+        """Waits for files to be committed to the directory
+        Args:
+            timeout: Longest time to wait in seconds
+        Returns:
+            Paths of the files committed since the last call, empty if none arrived in time
+        """
+
+    def open(self) -> None:
+        """Starts watching the directory again after `close`"""
+
+    def close(self) -> None:
+        """Stops watching the directory"""
+
+
+class InotifyWatcher(DirectoryWatcher):
+    """Watches a directory with Linux inotify, so the kernel wakes the waiter when a file is renamed
+    into it without the directory ever being listed"""
+
+    def __init__(self, directory: Path) -> None:
+        """
+        Args:
+            directory: Directory to watch
+        Raises:
+            OSError: If inotify isn't available
+        """
+        self.directory = Path(directory)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._fd = -1
+        self.open()
+
+    def open(self) -> None:
+        """Starts watching the directory, if it isn't already"""
+        if self._fd >= 0:
+            return
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "Failed to start inotify")
+        if self._libc.inotify_add_watch(fd, os.fsencode(self.directory), IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"Failed to watch {self.directory}")
+        self._fd = fd
+
+    def wait(self, timeout: float) -> List[Path]:
+        """Waits for files to be renamed into the directory"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Missed some new files, they will be uploaded on the next sweep")
+            elif name:
+                paths.append(self.directory / os.fsdecode(name))
+        return paths
+
+    def close(self) -> None:
+        """Stops watching the directory"""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(DirectoryWatcher):
+    """Watches a directory by checking its modification time, for systems without inotify.
+    The directory is only listed when the time changes"""
+
+    poll_interval: float
+    """Seconds between checks of the directory"""
+
+    def __init__(self, directory: Path, poll_interval: float = 1.0) -> None:
+        """
+        Args:
+            directory: Directory to watch
+            poll_interval: Seconds between checks of the directory
+        """
+        self.directory = Path(directory)
+        self.poll_interval = poll_interval
+        self._mtime = os.stat(self.directory).st_mtime_ns
+        self._names = set(os.listdir(self.directory))
+
+    def wait(self, timeout: float) -> List[Path]:
+        """Waits for files to appear in the directory"""
+        end = time.monotonic() + timeout
+        while True:
+            mtime = os.stat(self.directory).st_mtime_ns
+            if mtime != self._mtime:
+                self._mtime = mtime
+                names = set(os.listdir(self.directory))
+                new = sorted(names - self._names)
+                self._names = names
+                if new:
+                    return [self.directory / name for name in new]
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(self.poll_interval, remaining))
+
+
+def create_watcher(directory: Path, poll_interval: float = 1.0) -> DirectoryWatcher:
+    """Watches a directory with inotify where the system has it, otherwise by polling
+    Args:
+        directory: Directory to watch
+        poll_interval: Seconds between checks of the directory when polling
+    Returns:
+        A directory watcher
+    """
+    try:
+        return InotifyWatcher(directory)
+    except (OSError, AttributeError) as e:
+        logger.info(f"Polling {directory} for new files every {poll_interval}s, inotify unavailable: {e}")
+        return PollingWatcher(directory, poll_interval)
@@ -0,0 +1,102 @@
+import logging
+from datetime import datetime, time, timedelta
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def parse_hours(hours: str) -> Tuple[time, time]:
+    """Reads a range of wall-clock hours
+    Args:
+        hours: A range such as "22:00-06:00", which can cross midnight
+    Returns:
+        The start and end of the range
+    """
+    try:
+        start, end = hours.split("-")
+        return time.fromisoformat(start.strip()), time.fromisoformat(end.strip())
+    except ValueError as e:
+        raise ValueError(f"Hours should look like 22:00-06:00, not {hours}") from e
+
+
+class UploadWindow:
+    """Decides when the backlog of pending images is uploaded.
+
+    While the camera is OFF there is nothing to compete with, so the backlog is drained at full
+    speed until shortly before the next ON time. Off-peak hours get the same treatment while the
+    camera is ON. The rest of the ON time can be limited to the newest frames, so the live feed
+    stays current while older images wait for the next window.
+    """
+
+    drain_when_off: bool
+    """Whether the backlog is drained while the camera is OFF"""
+
+    off_peak: List[Tuple[time, time]]
+    """Wall-clock hours, in local time, when the whole backlog is uploaded even while the camera is ON"""
+
+    drain_margin: int
+    """Seconds before the next ON time that draining stops"""
+
+    drain_batch: int
+    """Number of images uploaded between checks of the time while draining"""
+
+    on_time_newest: int | None
+    """Number of the newest images uploaded after a capture outside off-peak hours, None for all of them"""
+
+    def __init__(
+        self,
+        drain_when_off: bool = True,
+        off_peak: List[Tuple[time, time]] | None = None,
+        drain_margin: int = 600,
+        drain_batch: int = 50,
+        on_time_newest: int | None = None,
+    ) -> None:
+        """
+        Args:
+            drain_when_off: Drain the backlog while the camera is OFF
+            off_peak: Wall-clock hours, in local time, when the whole backlog is uploaded
+            drain_margin: Seconds before the next ON time that draining stops
+            drain_batch: Number of images uploaded between checks of the time while draining
+            on_time_newest: Number of the newest images uploaded after a capture outside off-peak hours
+        """
+        self.drain_when_off = drain_when_off
+        self.off_peak = off_peak or []
+        self.drain_margin = drain_margin
+        self.drain_batch = drain_batch
+        self.on_time_newest = on_time_newest
+
+    def in_off_peak(self, now: datetime) -> bool:
+        """Checks whether a time falls in the off-peak hours
+        Args:
+            now: The time to check
+        Returns:
+            True if it is in any of the off-peak ranges
+        """
+        wall = now.time()
+        for start, end in self.off_peak:
+            if start <= end and start <= wall < end:
+                return True
+            # The range crosses midnight
+            if start > end and (wall >= start or wall < end):
+                return True
+        return False
+
+    def drain_deadline(self, next_on_time: datetime) -> datetime:
+        """Gets the time draining has to stop by to be ready for the next ON time
+        Args:
+            next_on_time: The next time the camera is ON
+        Returns:
+            The time to stop draining
+        """
+        return next_on_time - timedelta(seconds=self.drain_margin)
+
+    def on_time_limit(self, now: datetime) -> int | None:
+        """Gets how many images to upload after a capture
+        Args:
+            now: The time of the capture
+        Returns:
+            The number of the newest images to upload, None to upload all of them
+        """
+        if self.in_off_peak(now):
+            return None
+        return self.on_time_newest
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+
+from raspberrycam.breaker import BreakerState, CircuitBreaker
+from raspberrycam.clock import Clock
+
+
+class FakeClock(Clock):
+    def __init__(self) -> None:
+        self.mono = 0.0
+
+    def now(self) -> datetime:
+        return datetime(2025, 6, 6, tzinfo=timezone.utc) + timedelta(seconds=self.mono)
+
+    def monotonic(self) -> float:
+        return self.mono
+
+
+def test_breaker_opens_and_backs_off() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, base_delay=10, max_delay=25, jitter=0, clock=clock)
+
+    assert breaker.allow() == BreakerState.CLOSED
+    breaker.record_failure()
+    assert breaker.state == BreakerState.CLOSED
+    breaker.record_failure()
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.allow()
+    assert breaker.blocked
+    assert breaker.next_retry() == datetime(2025, 6, 6, 0, 0, 10, tzinfo=timezone.utc)
+
+    # One trial call once the delay is up, everything else waits for it
+    clock.mono = 10
+    assert not breaker.blocked
+    assert breaker.allow() == BreakerState.HALF_OPEN
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert breaker.allow() is None
+
+    # The trial failed, so back off for twice as long, up to the limit
+    breaker.record_failure()
+    assert breaker.retry_in() == 20
+    clock.mono = 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.retry_in() == 25
+
+    clock.mono = 55
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.next_retry() is None
+    assert breaker.allow()
+
+
+def test_breaker_jitter() -> None:
+    clock = FakeClock()
+    delays = set()
+    for _ in range(20):
+        breaker = CircuitBreaker(failure_threshold=1, base_delay=100, jitter=0.5, clock=clock)
+        breaker.record_failure()
+        delays.add(breaker.retry_in())
+
+    # Retries are spread out but never later than the full delay
+    assert len(delays) > 1
+    assert all(50 <= delay <= 100 for delay in delays)
@@ -0,0 +1,75 @@
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from raspberrycam.budget import BandwidthController, CaptureSettings, build_ladder
+
+LADDER = build_ladder([(1024, 768), (768, 576), (512, 384)], range(90, 49, -10))
+DAY = date(2025, 6, 6)
+
+
+def run_day(controller: BandwidthController, captures: int, detail: np.ndarray) -> list[tuple[CaptureSettings, int]]:
+    """Captures a day of images whose size follows the settings and the amount of detail in the scene"""
+    taken = []
+    for i in range(captures):
+        settings = controller.next_settings(DAY, captures - i)
+        size = int(detail[i] * settings.cost)
+        controller.record(DAY, settings, size)
+        taken.append((settings, size))
+    return taken
+
+
+def test_build_ladder() -> None:
+    assert len(LADDER) == 15
+    assert LADDER[0] == CaptureSettings(1024, 768, 90)
+    assert LADDER[-1] == CaptureSettings(512, 384, 50)
+    costs = [settings.cost for settings in LADDER]
+    assert costs == sorted(costs, reverse=True)
+
+
+def test_generous_budget_uses_best_quality() -> None:
+    controller = BandwidthController(100 * 1024 * 1024, LADDER)
+    taken = run_day(controller, 20, np.full(20, 0.1))
+
+    # After the first capture has measured the scene, everything is taken at the best settings
+    assert all(settings == LADDER[0] for settings, _ in taken[1:])
+
+
+def test_stays_within_budget() -> None:
+    budget = 2 * 1024 * 1024
+    controller = BandwidthController(budget, LADDER)
+    # The scene gets busier through the day, with some noise
+    detail = np.linspace(0.05, 0.15, 48) * np.random.default_rng(0).uniform(0.9, 1.1, 48)
+    taken = run_day(controller, 48, detail)
+
+    assert sum(size for _, size in taken) <= budget
+    # The budget isn't wasted: quality is traded down only as far as needed
+    assert sum(size for _, size in taken) > 0.8 * budget
+    assert taken[0][0] != LADDER[-1]
+
+
+def test_budget_resets_each_day() -> None:
+    controller = BandwidthController(1000, LADDER)
+    controller.record(DAY, LADDER[0], 800)
+    assert controller.remaining(DAY) == 200
+    assert controller.remaining(date(2025, 6, 7)) == 1000
+    # Held back images teach the size estimate without using the budget
+    controller.record(DAY, LADDER[0], 800, uploaded=False)
+    assert controller.remaining(DAY) == 200
+
+
+def test_budget_survives_restart(tmp_path: Path) -> None:
+    state_file = tmp_path / "budget.json"
+    controller = BandwidthController(1000, LADDER, state_file=state_file)
+    controller.record(DAY, LADDER[0], 800)
+
+    # Restarted partway through the day, the spend and the size estimate carry on
+    controller = BandwidthController(1000, LADDER, state_file=state_file)
+    assert controller.remaining(DAY) == 200
+    assert controller.estimate(LADDER[0]) == 800
+    assert controller.remaining(date(2025, 6, 7)) == 1000
+
+    # A corrupt file starts the day over rather than stopping captures
+    state_file.write_text("{")
+    assert BandwidthController(1000, LADDER, state_file=state_file).remaining(DAY) == 1000
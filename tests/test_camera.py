@@ -0,0 +1,82 @@
+import subprocess
+from pathlib import Path
+from typing import BinaryIO
+from unittest.mock import MagicMock, patch
+
+from raspberrycam.camera import CaptureSession, DebugCamera, LibCamera, Picamera2Camera
+
+
+class FakeSession(CaptureSession):
+    """Capture session that writes a fixed JPEG-like payload"""
+
+    opened = 0
+    closed = 0
+
+    def __init__(self, width: int, height: int, quality: int, vflip: bool, hflip: bool) -> None:
+        FakeSession.opened += 1
+        self.quality = quality
+        self.flips = (vflip, hflip)
+
+    def capture_file(self, target: Path | BinaryIO) -> None:
+        data = b"\xff\xd8" + bytes([self.quality]) + bytes(self.flips)
+        if isinstance(target, Path):
+            target.write_bytes(data)
+        else:
+            target.write(data)
+
+    def close(self) -> None:
+        FakeSession.closed += 1
+
+
+def test_persistent_session(tmp_path: Path) -> None:
+    FakeSession.opened = FakeSession.closed = 0
+    cam = Picamera2Camera(256, 256, quality=80, session_factory=FakeSession)
+
+    for i in range(5):
+        cam.capture_image(tmp_path / f"{i}.jpg", vflip=True)
+    # The pipeline is only started once
+    assert FakeSession.opened == 1
+    assert (tmp_path / "4.jpg").read_bytes() == b"\xff\xd8\x50\x01\x00"
+
+    # Quality changes don't need a restart, orientation changes do
+    cam.quality = 60
+    assert cam.capture_bytes(vflip=True) == b"\xff\xd8\x3c\x01\x00"
+    assert FakeSession.opened == 1
+    assert cam.capture_bytes(vflip=True, hflip=True) == b"\xff\xd8\x3c\x01\x01"
+    assert FakeSession.opened == 2
+    assert FakeSession.closed == 1
+
+    cam.close()
+    assert FakeSession.closed == 2
+
+
+def test_capture_bytes_fallback() -> None:
+    # Cameras without their own in-memory capture go through a temporary file
+    cam = DebugCamera(256, 256)
+    assert cam.capture_bytes(vflip=True) == b"Pretend I'm an upside-down image"
+
+
+@patch("raspberrycam.camera.subprocess.run")
+def test_libcamera_capture_bytes(mock_run: MagicMock) -> None:
+    mock_run.return_value = subprocess.CompletedProcess([], 0, stdout=b"\xff\xd8jpeg", stderr=b"")
+    cam = LibCamera(80, 256, 256, camera_num=1)
+
+    # The image is read from stdout without touching the SD card
+    assert cam.capture_bytes(vflip=True) == b"\xff\xd8jpeg"
+    cmd = mock_run.call_args.args[0]
+    assert cmd[cmd.index("-o") + 1] == "-"
+    assert cmd[-3:] == ["--camera", "1", "--vflip"]
+
+    mock_run.return_value = subprocess.CompletedProcess([], 1, stdout=b"", stderr=b"ERROR: no cameras available")
+    assert cam.capture_bytes() == b""
+
+
+def test_configure() -> None:
+    cam = Picamera2Camera(256, 256, quality=80, session_factory=FakeSession)
+    cam.configure(128, 96, quality=60)
+    assert (cam.image_width, cam.image_height, cam.quality) == (128, 96, 60)
+
+    # Cameras without a quality setting only change size
+    debug = DebugCamera(256, 256)
+    debug.configure(128, 96, quality=60)
+    assert (debug.image_width, debug.image_height) == (128, 96)
@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+
+from raspberrycam.changes import ChangeDetector, decode_grayscale, difference_hash
+
+
+def make_frame(seed: int = 0) -> np.ndarray:
+    """A smooth gradient scene with some blobs, different for each seed"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:96, 0:128]
+    blobs = np.zeros(x.shape, dtype=bool)
+    for cx, cy, radius in rng.integers(10, 90, size=(6, 3)):
+        blobs |= ((x - cx) ** 2 + (y - cy) ** 2) < (radius // 2) ** 2
+    return (x + y // 2 + 60 * blobs).astype(np.uint8)
+
+
+def test_difference_hash() -> None:
+    frame = make_frame()
+    assert difference_hash(frame).shape == (64,)
+    # Sensor noise and a change in exposure leave the hash alone
+    noise = np.random.default_rng(1).normal(0, 2, frame.shape)
+    noisy = np.clip(frame * 0.9 + noise, 0, 255).astype(np.uint8)
+    assert np.count_nonzero(difference_hash(noisy) != difference_hash(frame)) <= 2
+    assert np.count_nonzero(difference_hash(make_frame(2)) != difference_hash(frame)) > 8
+
+
+def test_decode_grayscale() -> None:
+    frame = make_frame()
+    data = cv2.imencode(".jpg", frame)[1].tobytes()
+    gray = decode_grayscale(data)
+    assert gray.shape == (12, 16)
+    assert decode_grayscale(b"not an image") is None
+
+
+def test_change_detector_skips_duplicates() -> None:
+    detector = ChangeDetector(threshold=4, max_skipped=2)
+    frame = make_frame()
+
+    assert detector.should_upload(frame, "first", 100)
+    assert not detector.should_upload(frame, "second", 100)
+    assert not detector.should_upload(frame, "third", 100)
+    # At least one frame in every three is kept, however still the scene
+    assert detector.should_upload(frame, "fourth", 100)
+    assert detector.should_upload(make_frame(2), "changed", 100)
+    # Frames that can't be decoded are always uploaded
+    assert detector.should_upload(b"not an image", "broken", 100)
+
+    assert detector.stats.kept == 4
+    assert detector.stats.skipped == 2
+    assert detector.stats.bytes_saved == 200
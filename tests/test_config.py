@@ -21,3 +21,24 @@ def test_config_invalid(tmp_path: Path) -> None:
     # Config dataclass will throw errors without all its fields set
     with pytest.raises(ConfigurationError):
         load_config(tmp_path / "bad_config.yml")
+
+
+def test_config_camera_directions(tmp_path: Path, config_file: str) -> None:
+    site = Path(config_file).read_text()
+    with open(tmp_path / "config.yml", "w") as out:
+        # The second camera falls back to the site's direction
+        out.write(site + "\ncameras:\n  - direction: NW\n  - {}\n")
+    load_config(tmp_path / "config.yml")
+
+    with open(tmp_path / "config.yml", "a") as out:
+        out.write("  - index: 2\n")
+    with pytest.raises(ConfigurationError, match="direction"):
+        load_config(tmp_path / "config.yml")
+
+
+def test_config_upload_window_needs_inline_uploads(tmp_path: Path, config_file: str) -> None:
+    site = Path(config_file).read_text()
+    with open(tmp_path / "config.yml", "w") as out:
+        out.write(site + "\nbackground_upload: true\nnight_drain: true\n")
+    with pytest.raises(ConfigurationError, match="background_upload"):
+        load_config(tmp_path / "config.yml")
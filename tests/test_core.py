@@ -0,0 +1,318 @@
+import subprocess
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import cv2
+import numpy as np
+import pytest
+
+from raspberrycam.camera import CameraInterface, DebugCamera, MountedCamera
+from raspberrycam.changes import ChangeDetector
+from raspberrycam.clock import Clock
+from raspberrycam.config import load_config
+from raspberrycam.core import Raspberrycam
+from raspberrycam.image import S3ImageManager
+from raspberrycam.location import Location
+from raspberrycam.raspberrypi import DebugPower, PowerMode, PowerProfileManager, RaspberryPiPower
+from raspberrycam.s3 import LocalS3Manager
+from raspberrycam.scheduler import FdriScheduler
+from raspberrycam.window import UploadWindow
+
+FRAME = cv2.imencode(".jpg", np.tile(np.arange(0, 256, 2, dtype=np.uint8), (96, 1)))[1].tobytes()
+"""A gradient JPEG that decodes to a usable grayscale image"""
+
+
+class FakeClock(Clock):
+    """Clock where sleeping moves time on instantly"""
+
+    def __init__(self, start: datetime, max_sleeps: int) -> None:
+        self.time = start
+        self.mono = 0.0
+        self.sleeps = []
+        self.max_sleeps = max_sleeps
+        self.app = None
+        self.jump_at = None
+        self.jump = timedelta(hours=1)
+
+    def now(self) -> datetime:
+        return self.time
+
+    def monotonic(self) -> float:
+        return self.mono
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append((self.time, seconds))
+        self.time += timedelta(seconds=seconds)
+        self.mono += seconds
+        if self.jump_at is not None and len(self.sleeps) == self.jump_at:
+            self.time += self.jump
+        if len(self.sleeps) >= self.max_sleeps:
+            self.app.stop()
+
+
+def make_app(tmp_path: Path, config_file: Path, clock: Clock) -> Raspberrycam:
+    config = load_config(config_file)
+    location = Location(55.8626453, -3.2031049)
+    image_manager = S3ImageManager("bucket", LocalS3Manager(tmp_path / "s3"), tmp_path / "app", config)
+    app = Raspberrycam(
+        FdriScheduler(location),
+        DebugCamera(256, 256),
+        image_manager,
+        capture_interval=3 * 3600,
+        debug=True,
+        power_profile=PowerProfileManager(debug=True),
+        # Sleeps go straight to each event, test_run_clock_jump_while_off covers the checks between
+        jump_check_interval=0,
+    )
+    app.clock = clock
+    app.image_manager.clock = clock
+    clock.app = app
+    return app
+
+
+class FileOnlyCamera(CameraInterface):
+    """Camera that can only write to a file, like picamzero"""
+
+    def capture_image(self, filepath: Path, vflip: bool = False, hflip: bool = False) -> None:
+        filepath.write_bytes(b"image")
+
+
+def test_in_memory_warns_for_file_only_camera(
+    tmp_path: Path, config_file: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    config = load_config(config_file)
+    image_manager = S3ImageManager("bucket", LocalS3Manager(tmp_path / "s3"), tmp_path / "app", config)
+    scheduler = FdriScheduler(Location(55.8626453, -3.2031049))
+
+    Raspberrycam(scheduler, DebugCamera(256, 256), image_manager, in_memory=True)
+    assert "temporary file" not in caplog.text
+    Raspberrycam(scheduler, FileOnlyCamera(256, 256), image_manager, in_memory=True)
+    assert "FileOnlyCamera can't encode to memory" in caplog.text
+
+
+def test_run_sleeps_until_events(tmp_path: Path, config_file: Path) -> None:
+    clock = FakeClock(datetime(2025, 6, 6, 12, 0, tzinfo=timezone.utc), max_sleeps=6)
+    app = make_app(tmp_path, config_file, clock)
+    sunset = app.scheduler.get_schedule(clock.time.date())[1]["time"]
+    sunrise = app.scheduler.get_schedule((clock.time + timedelta(days=1)).date())[0]["time"]
+
+    with patch.object(app.camera, "capture_image", wraps=app.camera.capture_image) as mock_capture:
+        app.run()
+
+    wake_times = [start + timedelta(seconds=seconds) for start, seconds in clock.sleeps]
+    # Three captures, then sunset arrives before the 21:00 tick
+    assert wake_times[:4] == [
+        datetime(2025, 6, 6, 15, 0, tzinfo=timezone.utc),
+        datetime(2025, 6, 6, 18, 0, tzinfo=timezone.utc),
+        sunset,
+        # One sleep through the night, no polling
+        sunrise,
+    ]
+    # 12:00, 15:00, 18:00, sunrise and three hours after sunrise
+    assert mock_capture.call_count == 5
+
+
+def test_run_clock_jump(tmp_path: Path, config_file: Path) -> None:
+    clock = FakeClock(datetime(2025, 6, 6, 9, 0, tzinfo=timezone.utc), max_sleeps=2)
+    # The wall clock moves an hour forward during the first sleep
+    clock.jump_at = 1
+    app = make_app(tmp_path, config_file, clock)
+
+    app.run()
+
+    # The capture cadence is kept in monotonic time, so the next capture moves with the jump
+    assert clock.sleeps[0] == (datetime(2025, 6, 6, 9, 0, tzinfo=timezone.utc), 3 * 3600)
+    assert clock.sleeps[1] == (datetime(2025, 6, 6, 13, 0, tzinfo=timezone.utc), 3 * 3600)
+
+
+def test_run_clock_jump_while_off(tmp_path: Path, config_file: Path) -> None:
+    # Started at night from a stale RTC, then NTP sets the clock six hours on, past sunrise
+    clock = FakeClock(datetime(2025, 6, 6, 22, 0, tzinfo=timezone.utc), max_sleeps=3)
+    clock.jump_at = 2
+    clock.jump = timedelta(hours=6)
+    app = make_app(tmp_path, config_file, clock)
+    app.jump_check_interval = 300
+
+    with patch.object(app.camera, "capture_image", wraps=app.camera.capture_image) as mock_capture:
+        app.run()
+
+    # The night is slept in short stretches, and the jump is noticed at the end of the one it happened in
+    assert clock.sleeps[:2] == [
+        (datetime(2025, 6, 6, 22, 0, tzinfo=timezone.utc), 300),
+        (datetime(2025, 6, 6, 22, 5, tzinfo=timezone.utc), 300),
+    ]
+    assert mock_capture.call_count == 1
+    assert clock.sleeps[2][0] == datetime(2025, 6, 7, 4, 10, tzinfo=timezone.utc)
+
+
+def test_run_deep_sleep(tmp_path: Path, config_file: Path) -> None:
+    clock = FakeClock(datetime(2025, 6, 6, 18, 0, tzinfo=timezone.utc), max_sleeps=10)
+    app = make_app(tmp_path, config_file, clock)
+    app.debug = False
+    app.power_mode = PowerMode.DEEP_SLEEP
+    app.power = DebugPower()
+    sunrise = app.scheduler.get_schedule(date(2025, 6, 7))[0]["time"]
+
+    # Something left over from a failed upload
+    (app.image_manager.pending_directory / "old.jpg").write_text("image")
+
+    app.run()
+
+    # Capture at 18:00, sleep to sunset, then power off until just before sunrise
+    assert len(clock.sleeps) == 1
+    assert app.power.shutdowns == 1
+    assert app.power.wakeups == [sunrise - timedelta(seconds=app.wake_warmup)]
+    assert app.image_manager.pending_count() == 0
+    assert app.image_manager.s3_manager.requests == 2
+
+
+@patch("raspberrycam.raspberrypi.subprocess.run")
+def test_deep_sleep_power_off_fails(mock_run: MagicMock, tmp_path: Path, config_file: Path) -> None:
+    def run(argv: list, **kwargs) -> None:  # noqa: ANN003
+        if argv[:2] == ["sudo", "shutdown"]:
+            raise subprocess.CalledProcessError(1, argv)
+
+    mock_run.side_effect = run
+    clock = FakeClock(datetime(2025, 6, 6, 22, 0, tzinfo=timezone.utc), max_sleeps=1)
+    app = make_app(tmp_path, config_file, clock)
+    app.power = RaspberryPiPower()
+
+    # Keep running rather than exit and be restarted by systemd all night
+    assert not app.deep_sleep(datetime(2025, 6, 7, 4, 0, tzinfo=timezone.utc))
+    assert not app._stop_event.is_set()
+    mock_run.assert_any_call(["sudo", "shutdown", "-h", "now"], check=True)
+
+
+def test_deep_sleep_wake_alarm_fails(tmp_path: Path, config_file: Path) -> None:
+    clock = FakeClock(datetime(2025, 6, 6, 22, 0, tzinfo=timezone.utc), max_sleeps=1)
+    app = make_app(tmp_path, config_file, clock)
+    app.power = DebugPower()
+    app.power.schedule_wakeup = MagicMock(side_effect=subprocess.CalledProcessError(1, ["rtcwake"]))
+
+    # Powering off without an alarm would leave the device off for good
+    assert not app.deep_sleep(datetime(2025, 6, 7, 4, 0, tzinfo=timezone.utc))
+    assert app.power.shutdowns == 0
+    assert not app._stop_event.is_set()
+
+
+def test_deep_sleep_too_short(tmp_path: Path, config_file: Path) -> None:
+    # Woken by the RTC alarm shortly before sunrise, so it mustn't power off again
+    clock = FakeClock(datetime(2025, 6, 7, 2, 0, tzinfo=timezone.utc), max_sleeps=1)
+    app = make_app(tmp_path, config_file, clock)
+    app.power_mode = PowerMode.DEEP_SLEEP
+    app.power = DebugPower()
+    sunrise = app.scheduler.get_schedule(date(2025, 6, 7))[0]["time"]
+    clock.time = sunrise - timedelta(seconds=app.wake_warmup)
+
+    app.run()
+
+    assert app.power.shutdowns == 0
+    assert clock.sleeps == [(clock.time - timedelta(seconds=app.wake_warmup), app.wake_warmup)]
+
+
+def test_capture_in_memory(tmp_path: Path, config_file: Path) -> None:
+    app = make_app(tmp_path, config_file, Clock())
+    app.debug = False
+    app.in_memory = True
+    s3 = app.image_manager.s3_manager
+
+    with patch("raspberrycam.image.open") as mock_open:
+        app.capture()
+        # Nothing written to the SD card
+        mock_open.assert_not_called()
+    assert s3.requests == 1
+    assert app.image_manager.pending_count() == 0
+    uploaded = list((tmp_path / "s3" / "bucket").rglob("SE_CARGN_*"))
+    assert uploaded[0].read_bytes() == b"Pretend I'm an upside-down image"
+
+    # A failed upload spills the image to the pending directory
+    with patch.object(s3, "upload_bytes", return_value=False), patch.object(s3, "upload", return_value=False):
+        app.capture()
+    pending = app.image_manager.get_pending_images()
+    assert len(pending) == 1
+    assert pending[0].read_bytes() == b"Pretend I'm an upside-down image"
+
+
+def test_capture_holds_back_duplicates(tmp_path: Path, config_file: Path) -> None:
+    app = make_app(tmp_path, config_file, Clock())
+    app.debug = False
+    app.change_detector = ChangeDetector()
+    s3 = app.image_manager.s3_manager
+
+    with patch.object(app.camera, "capture_image", side_effect=lambda path, **kwargs: path.write_bytes(FRAME)):
+        for _ in range(3):
+            app.capture()
+
+    # The first frame is uploaded, the two repeats are kept on the SD card instead
+    assert s3.requests == 1
+    assert app.change_detector.stats.skipped == 2
+    assert any(app.image_manager.held_back_directory.iterdir())
+    assert app.image_manager.pending_count() == 0
+
+
+def test_capture_writes_metrics(tmp_path: Path, config_file: Path) -> None:
+    app = make_app(tmp_path, config_file, Clock())
+    app.debug = False
+    app.metrics_file = tmp_path / "metrics.prom"
+
+    app.capture()
+
+    lines = app.metrics_file.read_text().splitlines()
+    assert "raspberrycam_backlog_images 0" in lines
+    assert any(line.startswith("raspberrycam_captures_total") for line in lines)
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_capture_several_cameras(parallel: bool, tmp_path: Path, config_file: Path) -> None:
+    app = make_app(tmp_path, config_file, Clock())
+    app.debug = False
+    app.cameras = [MountedCamera(DebugCamera(256, 256), direction="N"), MountedCamera(DebugCamera(256, 256), "S")]
+    app.parallel_capture = parallel
+
+    app.capture()
+
+    # Each camera's image is named and partitioned by the direction it faces
+    uploaded = sorted((tmp_path / "s3" / "bucket").rglob("SE_CARGN_*"))
+    assert [path.name.split("_")[4] for path in uploaded] == ["N", "S"]
+    assert [path.parent.parent.name for path in uploaded] == ["direction=N", "direction=S"]
+    assert app.image_manager.pending_count() == 0
+
+
+def test_run_drains_backlog_when_off(tmp_path: Path, config_file: Path) -> None:
+    clock = FakeClock(datetime(2025, 6, 6, 22, 0, tzinfo=timezone.utc), max_sleeps=1)
+    app = make_app(tmp_path, config_file, clock)
+    app.debug = False
+    app.upload_window = UploadWindow(drain_batch=2)
+    for i in range(5):
+        (app.image_manager.pending_directory / f"SE_CARGN_01_PCAM_E_20250606_1{i}0000").write_text("image")
+
+    app.run()
+
+    # Everything went up during the night, in batches, before sleeping until sunrise
+    assert app.image_manager.pending_count() == 0
+    assert app.image_manager.s3_manager.requests == 5
+    sunrise = app.scheduler.get_next_on_time(clock.sleeps[0][0])
+    assert clock.sleeps[0][0] + timedelta(seconds=clock.sleeps[0][1]) == sunrise
+
+    # Nothing is uploaded once it is too close to sunrise
+    (app.image_manager.pending_directory / "SE_CARGN_01_PCAM_E_20250606_200000").write_text("image")
+    app.upload_window.drain_margin = 24 * 3600
+    assert app.drain_backlog(app.upload_window.drain_deadline(sunrise)).files == 0
+    assert app.image_manager.pending_count() == 1
+
+
+def test_capture_uploads_newest(tmp_path: Path, config_file: Path) -> None:
+    app = make_app(tmp_path, config_file, Clock())
+    app.debug = False
+    app.upload_window = UploadWindow(on_time_newest=1)
+    for i in range(3):
+        (app.image_manager.pending_directory / f"SE_CARGN_01_PCAM_E_20250606_1{i}0000").write_text("image")
+
+    app.capture()
+
+    # Only the new capture is uploaded, the backlog waits for the night
+    assert app.image_manager.s3_manager.requests == 1
+    assert sorted(path.name for path in app.image_manager.get_pending_images()) == [
+        f"SE_CARGN_01_PCAM_E_20250606_1{i}0000" for i in range(3)
+    ]
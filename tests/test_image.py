@@ -1,13 +1,22 @@
 import os
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
 from dotenv import load_dotenv
 
+from raspberrycam.bundle import read_index
 from raspberrycam.config import load_config
-from raspberrycam.image import ImageManager, S3ImageManager
-from raspberrycam.s3 import S3Manager
+from raspberrycam.image import (
+    ImageManager,
+    S3ImageManager,
+    capture_order_key,
+    parse_image_direction,
+    parse_image_timestamp,
+)
+from raspberrycam.s3 import LocalS3Manager, S3Manager
 
 load_dotenv()
 AWS_ROLE_ARN = os.environ["AWS_ROLE_ARN"]
@@ -65,3 +74,216 @@ def test_upload_deletion(mock_upload: MagicMock, tmp_path: Path, config_file: Pa
     s3im.upload_pending()
 
     assert not os.path.exists(filepath)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_upload_concurrent(workers: int, tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3 = LocalS3Manager(tmp_path / "s3")
+    s3im = S3ImageManager("bucket", s3, tmp_path / "app", config, upload_workers=workers)
+
+    for i in range(20):
+        with open(s3im.pending_directory / f"image_{i}.jpg", "w") as out:
+            out.write("x" * 100)
+
+    report = s3im.upload_pending()
+
+    assert report.files == 20
+    assert report.failed == 0
+    assert report.bytes == 2000
+    assert report.files_per_second > 0
+    assert s3.requests == 20
+    assert len(s3im.get_pending_images()) == 0
+    assert len(list((tmp_path / "s3" / "bucket").rglob("*.jpg"))) == 20
+
+
+@patch("raspberrycam.s3.LocalS3Manager.upload")
+def test_upload_concurrent_failures(mock_upload: MagicMock, tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3im = S3ImageManager("bucket", LocalS3Manager(tmp_path / "s3"), tmp_path / "app", config, upload_workers=4)
+
+    for i in range(10):
+        with open(s3im.pending_directory / f"image_{i}.jpg", "w") as out:
+            out.write("\n")
+
+    # Only the even numbered images make it, the others should stay behind
+    mock_upload.side_effect = lambda image, *args: int(Path(image).stem.split("_")[1]) % 2 == 0
+    report = s3im.upload_pending()
+
+    assert report.files == 5
+    assert report.failed == 5
+    assert sorted(x.name for x in s3im.get_pending_images()) == [f"image_{i}.jpg" for i in range(1, 10, 2)]
+
+
+def test_parse_image_timestamp(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    im = ImageManager(tmp_path, config)
+    assert parse_image_timestamp(im.get_pending_image_path()).date() == datetime.now().date()
+    assert parse_image_timestamp("SE_CARGN_01_PCAM_E_20250606_160000.jpg") == datetime(2025, 6, 6, 16)
+    assert parse_image_timestamp("test.txt") is None
+
+
+def test_parse_image_direction(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3im = S3ImageManager("bucket", LocalS3Manager(tmp_path / "s3"), tmp_path / "app", config)
+    assert parse_image_direction(s3im.get_image_name()) == config.direction
+    assert parse_image_direction(s3im.get_image_name("NW")) == "NW"
+    assert parse_image_direction("test.txt") is None
+
+    # Images are partitioned by the direction in their name
+    assert "direction=NW" in s3im.partition_path("SE_CARGN_01_PCAM_NW_20250606_160000")
+    # And by the date they were captured, whenever they are uploaded
+    assert "/date=2025-06-06/" in s3im.partition_path("SE_CARGN_01_PCAM_NW_20250606_160000")
+
+
+def test_upload_bundles(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3 = LocalS3Manager(tmp_path / "s3")
+    s3im = S3ImageManager("bucket", s3, tmp_path / "app", config, bundle=True, bundle_max_files=4)
+
+    # Two days of images, 5 on the first and 3 on the second
+    for day, count in ((6, 5), (7, 3)):
+        for i in range(count):
+            with open(s3im.pending_directory / f"SE_CARGN_01_PCAM_E_202506{day:02d}_1000{i:02d}", "wb") as out:
+                out.write(bytes([i]) * (1000 + i))
+
+    report = s3im.upload_pending()
+    assert report.files == 8
+    assert report.requests == 3
+    assert len(s3im.get_pending_images()) == 0
+    assert len(os.listdir(s3im.bundle_directory)) == 0
+
+    bundles = sorted((tmp_path / "s3" / "bucket").rglob("*.tar"))
+    assert [b.parent.name for b in bundles] == ["date=2025-06-06", "date=2025-06-06", "date=2025-06-07"]
+
+    # The index points at the bytes of each image
+    index = read_index(bundles[0])
+    assert len(index) == 4
+    with open(bundles[0], "rb") as f:
+        for i, member in enumerate(index):
+            f.seek(member["offset"])
+            assert f.read(member["size"]) == bytes([i]) * (1000 + i)
+
+
+@patch("raspberrycam.s3.LocalS3Manager.upload")
+def test_upload_bundle_failure(mock_upload: MagicMock, tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3im = S3ImageManager("bucket", LocalS3Manager(tmp_path / "s3"), tmp_path / "app", config, bundle=True)
+    for i in range(3):
+        with open(s3im.pending_directory / f"SE_CARGN_01_PCAM_E_20250606_1000{i:02d}", "w") as out:
+            out.write("\n")
+
+    mock_upload.return_value = False
+    report = s3im.upload_pending()
+    assert report.failed == 3
+    assert len(s3im.get_pending_images()) == 3
+    assert len(os.listdir(s3im.bundle_directory)) == 0
+
+
+def test_newest_first(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3im = S3ImageManager("bucket", LocalS3Manager(tmp_path / "s3"), tmp_path / "app", config, newest_first=True)
+    names = [
+        "SE_CARGN_01_PCAM_N_20250606_100000",
+        "SE_CARGN_01_PCAM_S_20250606_120000",
+        "SE_CARGN_01_PCAM_E_20250605_230000",
+        "old.jpg",
+    ]
+    for name in names:
+        (s3im.pending_directory / name).write_text("image")
+
+    assert capture_order_key("SE_CARGN_01_PCAM_N_20250606_100000.jpg") == "20250606_100000"
+    assert capture_order_key("old.jpg") == ""
+    # Ordered by capture time whatever the direction, names without one last
+    assert [path.name for path in s3im.get_pending_images()] == [names[1], names[0], names[2], names[3]]
+    assert [path.name for path in s3im.get_pending_images(1)] == [names[1]]
+
+
+def test_upload_deadline(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3 = LocalS3Manager(tmp_path / "s3")
+    s3im = S3ImageManager("bucket", s3, tmp_path / "app", config)
+    for i in range(3):
+        (s3im.pending_directory / f"image_{i}.jpg").write_text("image")
+
+    # Nothing is started after the deadline
+    report = s3im.upload_pending(deadline=datetime.now(s3im.clock.now().tzinfo) - timedelta(seconds=1))
+    assert (report.files, report.deferred, report.failed) == (0, 3, 0)
+    assert s3im.pending_count() == 3
+
+    report = s3im.upload_pending(deadline=s3im.clock.now() + timedelta(hours=1))
+    assert (report.files, report.deferred) == (3, 0)
+
+
+def test_upload_rate_limit(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3im = S3ImageManager(
+        "bucket", LocalS3Manager(tmp_path / "s3"), tmp_path / "app", config, max_bytes_per_second=1000
+    )
+    for i in range(3):
+        (s3im.pending_directory / f"image_{i}.jpg").write_bytes(b"x" * 1000)
+
+    with patch.object(s3im.clock, "sleep") as mock_sleep:
+        report = s3im.upload_pending()
+
+    # The first upload uses up the burst, the others wait about a second each
+    assert report.files == 3
+    assert mock_sleep.call_count == 2
+    assert all(0.9 < call.args[0] <= 2.0 for call in mock_sleep.call_args_list)
+
+
+def test_upload_skipped_while_s3_down(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3 = LocalS3Manager(tmp_path / "s3")
+    s3im = S3ImageManager("bucket", s3, tmp_path / "app", config)
+    for i in range(3):
+        (s3im.pending_directory / f"image_{i}.jpg").write_text("image")
+    for _ in range(s3.breaker.failure_threshold):
+        s3.breaker.record_failure()
+
+    report = s3im.upload_pending()
+    assert (report.files, report.failed, report.deferred) == (0, 0, 3)
+    assert s3.requests == 0
+
+
+def test_held_back_capped(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    im = ImageManager(tmp_path, config, held_back_max_files=3)
+    for hour in (14, 10, 12, 13, 11):
+        image = im.pending_directory / f"SE_CARGN_01_PCAM_E_20250606_{hour}0000"
+        image.write_bytes(b"jpeg")
+        im.hold_back(image)
+    im.hold_back_data(b"jpeg", "SE_CARGN_01_PCAM_E_20250606_150000")
+
+    # The oldest captures make way for the newest
+    assert sorted(os.listdir(im.held_back_directory)) == [
+        f"SE_CARGN_01_PCAM_E_20250606_{hour}0000" for hour in (13, 14, 15)
+    ]
+    assert im.pending_count() == 0
+
+
+def test_commit_capture(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    im = ImageManager(tmp_path, config)
+    image = im.get_staging_image_path()
+    assert image.parent == im.staging_directory
+    # Nothing is pending until the capture is committed
+    image.write_bytes(b"jpeg")
+    assert im.pending_count() == 0
+
+    pending = im.commit(image)
+    assert pending == im.pending_directory / image.name
+    assert pending.read_bytes() == b"jpeg"
+    assert not image.exists()
+    assert im.commit(image) is None
+
+    # A capture cut short by a crash is thrown away on the next start
+    partial = im.staging_directory / "partial.jpg"
+    partial.write_bytes(b"jp")
+    two_hours_ago = time.time() - 2 * 3600
+    os.utime(partial, (two_hours_ago, two_hours_ago))
+    # but one that another process is still writing is left alone
+    (im.staging_directory / "writing.jpg").write_bytes(b"jp")
+    im = ImageManager(tmp_path, config)
+    assert os.listdir(im.staging_directory) == ["writing.jpg"]
+    assert im.pending_count() == 1
@@ -0,0 +1,110 @@
+from pathlib import Path
+from unittest.mock import patch
+
+from raspberrycam.config import load_config
+from raspberrycam.image import S3ImageManager
+from raspberrycam.journal import ImageState, UploadJournal
+from raspberrycam.s3 import LocalS3Manager
+
+
+def test_journal_states(tmp_path: Path) -> None:
+    journal = UploadJournal(tmp_path / "journal.sqlite3")
+
+    for i in range(5):
+        journal.record_capture(tmp_path / f"image_{i}.jpg", captured_at=100 + i)
+    assert journal.pending_count() == 5
+    assert journal.next_pending(2) == [tmp_path / "image_0.jpg", tmp_path / "image_1.jpg"]
+    assert journal.next_pending(2, newest_first=True) == [tmp_path / "image_4.jpg", tmp_path / "image_3.jpg"]
+
+    journal.mark_in_flight(tmp_path / "image_0.jpg")
+    journal.mark_uploaded(tmp_path / "image_1.jpg")
+    journal.mark_failed(tmp_path / "image_2.jpg")
+
+    # Failed images are retried, in flight and uploaded ones are not pending
+    assert journal.pending_count() == 3
+    assert journal.next_pending() == [tmp_path / f"image_{i}.jpg" for i in (2, 3, 4)]
+    assert journal.count(ImageState.UPLOADED) == 1
+    assert journal.count(ImageState.IN_FLIGHT) == 1
+
+
+def test_journal_rebuild(tmp_path: Path) -> None:
+    pending = tmp_path / "pending"
+    pending.mkdir()
+    for i in range(3):
+        (pending / f"image_{i}.jpg").write_text("image")
+
+    journal = UploadJournal(tmp_path / "journal.sqlite3")
+    # Left in flight by a crash, still on disk
+    journal.record_capture(pending / "image_0.jpg")
+    journal.mark_in_flight(pending / "image_0.jpg")
+    # Journalled but deleted from disk
+    journal.record_capture(pending / "gone.jpg")
+    journal.close()
+
+    journal = UploadJournal(tmp_path / "journal.sqlite3")
+    journal.rebuild(pending)
+    assert sorted(journal.next_pending()) == sorted(pending / f"image_{i}.jpg" for i in range(3))
+
+
+def test_journal_image_manager(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3 = LocalS3Manager(tmp_path / "s3")
+    s3im = S3ImageManager("bucket", s3, tmp_path / "app", config, use_journal=True)
+
+    for i in range(4):
+        image = s3im.pending_directory / f"image_{i}.jpg"
+        image.write_text("image")
+        s3im.record_capture(image)
+
+    # Once the journal is up to date the pending directory is never listed
+    with patch("raspberrycam.image.os.listdir") as mock_listdir:
+        assert s3im.pending_count() == 4
+        assert len(s3im.get_pending_images(limit=2)) == 2
+        report = s3im.upload_pending()
+        mock_listdir.assert_not_called()
+
+    assert report.files == 4
+    assert s3im.pending_count() == 0
+    assert s3im.journal.count(ImageState.UPLOADED) == 4
+
+
+def test_journal_newest_by_capture_time(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3im = S3ImageManager("bucket", LocalS3Manager(tmp_path / "s3"), tmp_path / "app", config, use_journal=True)
+    names = [f"SE_CARGN_01_PCAM_E_{day}_120000.jpg" for day in ("20250103", "20250105", "20250101")]
+    # Recorded out of capture order, as after a backlog is copied back in
+    for name in names:
+        image = s3im.pending_directory / name
+        image.write_text("image")
+        s3im.record_capture(image)
+
+    expected = [s3im.pending_directory / names[i] for i in (1, 0, 2)]
+    assert s3im.get_pending_images(newest_first=True) == expected
+
+    # Rebuilt from the directory, where the modification times are in the wrong order too
+    s3im.journal.close()
+    (tmp_path / "app" / "journal.sqlite3").unlink()
+    s3im = S3ImageManager("bucket", LocalS3Manager(tmp_path / "s3"), tmp_path / "app", config, use_journal=True)
+    assert s3im.get_pending_images(newest_first=True) == expected
+
+
+def test_journal_forgets_deleted_images(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    for bundle in (False, True):
+        s3 = LocalS3Manager(tmp_path / "s3")
+        s3im = S3ImageManager("bucket", s3, tmp_path / f"app_{bundle}", config, use_journal=True, bundle=bundle)
+        images = [s3im.pending_directory / f"SE_CARGN_01_PCAM_E_20250606_1{i}0000" for i in range(4)]
+        for image in images:
+            image.write_text("image")
+            s3im.record_capture(image)
+
+        # Cleared off the SD card by hand, with the app none the wiser
+        images[0].unlink()
+        images[1].unlink()
+
+        report = s3im.upload_images(s3im.get_pending_images(limit=2))
+        assert (report.files, report.failed) == (0, 0)
+        # Never handed out again, so the rest of the backlog isn't stuck behind them
+        assert s3im.get_pending_images() == images[2:]
+        assert s3im.upload_pending().files == 2
+        assert s3im.pending_count() == 0
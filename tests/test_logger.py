@@ -0,0 +1,90 @@
+import io
+import logging
+import threading
+from pathlib import Path
+
+from raspberrycam.logger import BatchingQueueHandler, LogFormatter, setup_logging
+
+
+class CountingStream(io.StringIO):
+    """Stream that counts how often it is flushed"""
+
+    flushes = 0
+
+    def flush(self) -> None:
+        self.flushes += 1
+
+
+class BlockingHandler(logging.Handler):
+    """Handler that holds up the listener until released"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.unblock = threading.Event()
+        self.records = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.unblock.wait(5)
+        self.records.append(record.getMessage())
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = [handler]
+    return logger
+
+
+def test_batches_writes() -> None:
+    stream = CountingStream()
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(LogFormatter())
+    handler = BatchingQueueHandler([stream_handler], batch_size=100, flush_interval=60)
+    logger = make_logger("test_batches_writes", handler)
+
+    for i in range(50):
+        logger.info("record %d", i)
+    try:
+        raise ValueError("boom")
+    except ValueError as e:
+        logger.exception("failed", exc_info=e)
+    handler.flush()
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 51
+    assert lines[0].endswith("record 0")
+    assert "Exception: Traceback" in lines[-1] and "ValueError: boom" in lines[-1]
+    # One flush for the whole batch rather than one per record
+    assert stream.flushes == 1
+    handler.close()
+
+
+def test_drops_when_full() -> None:
+    blocking = BlockingHandler()
+    handler = BatchingQueueHandler([blocking], queue_size=5, batch_size=1, flush_interval=60)
+    logger = make_logger("test_drops_when_full", handler)
+
+    for i in range(20):
+        logger.warning(f"record {i}")
+    assert handler.dropped > 0
+
+    blocking.unblock.set()
+    handler.close()
+    assert len(blocking.records) == 20 - handler.dropped + 1
+    assert f"Dropped {handler.dropped} log records, the logging queue was full" in blocking.records
+
+
+def test_setup_queued_logging(tmp_path: Path) -> None:
+    root = logging.getLogger()
+    original = root.handlers, root.level
+    try:
+        setup_logging(tmp_path / "log.log", queued=True)
+        logging.getLogger("test_setup_queued_logging").info("queued")
+        [handler] = root.handlers
+        assert isinstance(handler, BatchingQueueHandler)
+        handler.flush()
+        assert "queued" in (tmp_path / "log.log").read_text()
+        handler.close()
+    finally:
+        root.handlers, root.level = original
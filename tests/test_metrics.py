@@ -0,0 +1,53 @@
+import json
+from pathlib import Path
+
+from raspberrycam.metrics import MetricsRegistry
+
+
+def test_prometheus_format(tmp_path: Path) -> None:
+    registry = MetricsRegistry()
+    registry.counter("uploads_total", "Uploads").inc(3)
+    registry.gauge("backlog_images", "Backlog").set(7)
+    histogram = registry.histogram("capture_seconds", "Capture time", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.6, 5.0):
+        histogram.observe(value)
+    # Registering a name again gets the same metric
+    assert registry.counter("uploads_total", "Uploads").value == 3
+
+    registry.write(tmp_path / "metrics.prom")
+    lines = (tmp_path / "metrics.prom").read_text().splitlines()
+    assert "# TYPE uploads_total counter" in lines
+    assert "uploads_total 3" in lines
+    assert "backlog_images 7" in lines
+    assert 'capture_seconds_bucket{le="0.1"} 1' in lines
+    assert 'capture_seconds_bucket{le="1"} 3' in lines
+    assert 'capture_seconds_bucket{le="+Inf"} 4' in lines
+    assert "capture_seconds_sum 6.15" in lines
+    assert "capture_seconds_count 4" in lines
+    # Nothing is left behind by the atomic replace
+    assert [path.name for path in tmp_path.iterdir()] == ["metrics.prom"]
+
+
+def test_prometheus_full_precision() -> None:
+    registry = MetricsRegistry()
+    registry.counter("upload_bytes_total", "Bytes").inc(123456829)
+    registry.gauge("ratio", "Ratio").set(0.1234567891)
+    registry.histogram("throughput", "Throughput", buckets=(1234567.5, 2.5e6))
+
+    lines = registry.render_prometheus().splitlines()
+    # Rounding to six digits would make counters rise in steps
+    assert "upload_bytes_total 123456829" in lines
+    assert "ratio 0.1234567891" in lines
+    assert 'throughput_bucket{le="1234567.5"} 0' in lines
+    assert 'throughput_bucket{le="2500000"} 0' in lines
+
+
+def test_json_snapshot(tmp_path: Path) -> None:
+    registry = MetricsRegistry()
+    with registry.histogram("upload_seconds", "Upload time").time():
+        pass
+    registry.write(tmp_path / "metrics.json")
+
+    snapshot = json.loads((tmp_path / "metrics.json").read_text())["metrics"]
+    assert snapshot["upload_seconds"]["count"] == 1
+    assert snapshot["upload_seconds"]["buckets"]["0.005"] == 1
@@ -0,0 +1,219 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from raspberrycam.clock import Clock
+from raspberrycam.config import load_config
+from raspberrycam.image import S3ImageManager
+from raspberrycam.multipart import MultipartUploader
+from raspberrycam.s3 import S3Manager
+
+
+class LinkDown(Exception):
+    pass
+
+
+class FakeMultipartClient:
+    """Keeps multipart uploads in memory, and can drop the link after a number of parts"""
+
+    def __init__(self, fail_after: int | None = None) -> None:
+        self.fail_after = fail_after
+        self.uploads: dict = {}
+        self.objects: dict = {}
+        self.part_sizes: list = []
+        self.aborted: list = []
+        self.created = 0
+
+    def create_multipart_upload(self, Bucket: str, Key: str, StorageClass: str) -> dict:  # noqa: N803
+        self.created += 1
+        upload_id = f"upload-{self.created}"
+        self.uploads[upload_id] = {"Key": Key, "Parts": {}, "Initiated": datetime.now(timezone.utc)}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes) -> dict:  # noqa: N803
+        if self.fail_after is not None and len(self.part_sizes) >= self.fail_after:
+            raise LinkDown("Connection reset")
+        self.uploads[UploadId]["Parts"][PartNumber] = Body
+        self.part_sizes.append(len(Body))
+        return {"ETag": f'"{PartNumber}-{len(Body)}"'}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict) -> None:  # noqa: N803
+        parts = self.uploads.pop(UploadId)["Parts"]
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        assert numbers == sorted(parts)
+        self.objects[Key] = b"".join(parts[number] for number in numbers)
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> None:  # noqa: N803
+        self.uploads.pop(UploadId)
+        self.aborted.append(UploadId)
+
+    def list_multipart_uploads(self, Bucket: str) -> dict:  # noqa: N803
+        return {
+            "Uploads": [
+                {"Key": upload["Key"], "UploadId": upload_id, "Initiated": upload["Initiated"]}
+                for upload_id, upload in self.uploads.items()
+            ]
+        }
+
+
+def fake_credentials() -> dict:
+    return {
+        "access_key_id": "id",
+        "secret_access_key": "secret",
+        "session_token": "token",
+        "expiration": datetime.now(timezone.utc) + timedelta(hours=1),
+    }
+
+
+@pytest.fixture
+def large_file(tmp_path: Path) -> Path:
+    path = tmp_path / "bundle.tar"
+    path.write_bytes(bytes(range(256)) * 400)
+    return path
+
+
+class SlowLinkClock(Clock):
+    """Each part takes half a second to upload"""
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+
+    def monotonic(self) -> float:
+        self.seconds += 0.5
+        return self.seconds
+
+
+def make_uploader(tmp_path: Path, **kwargs) -> MultipartUploader:  # noqa: ANN003
+    kwargs.setdefault("clock", SlowLinkClock())
+    kwargs.setdefault("max_part_size", 20000)
+    return MultipartUploader(tmp_path / "multipart", threshold=1, min_part_size=10000, **kwargs)
+
+
+def test_resumes_after_interruption(tmp_path: Path, large_file: Path) -> None:
+    client = FakeMultipartClient(fail_after=3)
+    assert not make_uploader(tmp_path).upload(client, large_file, "bucket", "images/bundle.tar")
+    assert len(list((tmp_path / "multipart").glob("*.json"))) == 1
+
+    # A new uploader, as after a reboot, carries on from the fourth part
+    client.fail_after = None
+    uploader = make_uploader(tmp_path)
+    assert uploader.upload(client, large_file, "bucket", "images/bundle.tar")
+
+    assert client.created == 1
+    assert client.objects["images/bundle.tar"] == large_file.read_bytes()
+    assert sum(client.part_sizes) == large_file.stat().st_size
+    assert list((tmp_path / "multipart").glob("*.json")) == []
+
+
+def test_changed_file_starts_again(tmp_path: Path, large_file: Path) -> None:
+    client = FakeMultipartClient(fail_after=2)
+    make_uploader(tmp_path).upload(client, large_file, "bucket", "images/bundle.tar")
+
+    large_file.write_bytes(b"x" * 50000)
+    client.fail_after = None
+    assert make_uploader(tmp_path).upload(client, large_file, "bucket", "images/bundle.tar")
+
+    assert client.aborted == ["upload-1"]
+    assert client.objects["images/bundle.tar"] == b"x" * 50000
+
+
+def test_part_size_follows_link_speed(tmp_path: Path) -> None:
+    uploader = make_uploader(tmp_path, max_part_size=10**9, target_part_seconds=30)
+    assert uploader.next_part_size(10**7, 0) == 10000
+
+    uploader._measure(100000, 1.0)
+    assert uploader.next_part_size(10**7, 1) == 3000000
+
+    # A slow link shrinks the parts, but never below the minimum
+    for _ in range(10):
+        uploader._measure(10, 1.0)
+    assert uploader.next_part_size(10**7, 11) == 10000
+
+    # Nor so small that the file needs more than 10,000 parts
+    assert uploader.next_part_size(10**9, 0) == 100011
+
+
+def test_stale_uploads_aborted(tmp_path: Path, large_file: Path) -> None:
+    clock = MagicMock(wraps=Clock())
+    uploader = make_uploader(tmp_path, stale_after=3600, clock=clock)
+    client = FakeMultipartClient(fail_after=1)
+    uploader.upload(client, large_file, "bucket", "images/bundle.tar")
+    # Started by an earlier install, with no checkpoint
+    client.uploads["orphan"] = {
+        "Key": "images/old.tar",
+        "Parts": {},
+        "Initiated": datetime.now(timezone.utc) - timedelta(days=2),
+    }
+
+    assert uploader.abort_stale(client, "bucket") == 1
+    assert client.aborted == ["orphan"]
+
+    clock.now.return_value = datetime.now(timezone.utc) + timedelta(hours=2)
+    assert uploader.abort_stale(client, "bucket") == 1
+    assert client.aborted == ["orphan", "upload-1"]
+    assert list((tmp_path / "multipart").glob("*.json")) == []
+
+
+@patch("raspberrycam.s3.create_s3_client")
+@patch("raspberrycam.s3.assume_role")
+def test_s3_manager_uploads_large_files_in_parts(
+    mock_assume: MagicMock, mock_client: MagicMock, tmp_path: Path, large_file: Path
+) -> None:
+    mock_assume.return_value = fake_credentials()
+    client = FakeMultipartClient()
+    mock_client.return_value = client
+    s3 = S3Manager(
+        role_arn="arn",
+        access_key_id="id",
+        secret_access_key="secret",
+        multipart=MultipartUploader(tmp_path / "multipart", threshold=50000, min_part_size=10000),
+    )
+    s3.assume_role()
+
+    assert s3.upload(large_file, "bucket", "images/bundle.tar")
+    assert client.objects["images/bundle.tar"] == large_file.read_bytes()
+    assert s3.stats.multipart_uploads == 1
+
+    # Smaller files are left to boto3
+    small_file = tmp_path / "small.jpg"
+    small_file.write_bytes(b"jpeg")
+    with patch("raspberrycam.s3.upload_to_s3", return_value=True) as mock_upload:
+        assert s3.upload(small_file, "bucket", "images/small.jpg")
+    mock_upload.assert_called_once()
+
+
+@patch("raspberrycam.s3.create_s3_client")
+@patch("raspberrycam.s3.assume_role")
+def test_bundle_upload_resumes_after_restart(
+    mock_assume: MagicMock, mock_client: MagicMock, tmp_path: Path, config_file: Path
+) -> None:
+    mock_assume.return_value = fake_credentials()
+    client = FakeMultipartClient(fail_after=1)
+    mock_client.return_value = client
+    config = load_config(config_file)
+
+    def start() -> S3ImageManager:
+        s3 = S3Manager(
+            role_arn="arn", access_key_id="id", secret_access_key="secret", multipart=make_uploader(tmp_path)
+        )
+        return S3ImageManager("bucket", s3, tmp_path / "app", config, bundle=True)
+
+    s3im = start()
+    for i in range(3):
+        (s3im.pending_directory / f"SE_CARGN_01_PCAM_E_20250606_1000{i:02d}").write_bytes(bytes([i]) * 20000)
+    assert s3im.upload_pending().failed == 3
+    # The bundle is kept for the upload to resume from
+    [bundle] = s3im.bundle_directory.iterdir()
+
+    # After a restart the cleanup leaves the upload alone and the same bundle carries on from its second part
+    client.fail_after = None
+    s3im = start()
+    assert s3im.upload_pending().files == 3
+    assert client.created == 1
+    assert client.aborted == []
+    [key] = client.objects
+    assert key.endswith(bundle.name)
+    assert list(s3im.bundle_directory.iterdir()) == []
+    assert list((tmp_path / "multipart").glob("*.json")) == []
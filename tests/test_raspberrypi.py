@@ -0,0 +1,62 @@
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from raspberrycam.raspberrypi import GovernorMode, PowerProfileManager
+
+
+def make_sysfs(root: Path, cpus: int = 4, governor: str = "ondemand") -> list[Path]:
+    """Builds a fake sysfs tree with a governor file per CPU"""
+    files = []
+    for cpu in range(cpus):
+        path = root / f"devices/system/cpu/cpu{cpu}/cpufreq/scaling_governor"
+        path.parent.mkdir(parents=True)
+        path.write_text(f"{governor}\n")
+        files.append(path)
+    # Not a CPU, mustn't be written
+    (root / "devices/system/cpu/cpufreq").mkdir()
+    return files
+
+
+def test_set_mode_skips_redundant_switches(tmp_path: Path) -> None:
+    files = make_sysfs(tmp_path)
+    manager = PowerProfileManager(sysfs_root=tmp_path)
+
+    assert manager.current == GovernorMode.ONDEMAND
+    # Already in place, so nothing is written
+    assert manager.set_mode(GovernorMode.ONDEMAND)
+    assert manager.switches == 0
+
+    assert manager.set_mode(GovernorMode.POWERSAVE)
+    assert manager.set_mode(GovernorMode.POWERSAVE)
+    assert manager.switches == 1
+    assert all(path.read_text() == "powersave" for path in files)
+
+
+def test_boost_drops_back_to_idle(tmp_path: Path) -> None:
+    files = make_sysfs(tmp_path, governor="powersave")
+    manager = PowerProfileManager(sysfs_root=tmp_path, idle_mode=GovernorMode.POWERSAVE)
+
+    with manager.boost():
+        assert files[0].read_text() == "performance"
+        # Overlapping bursts don't switch again, or drop back early
+        with manager.boost():
+            pass
+        assert files[0].read_text() == "performance"
+    assert files[0].read_text() == "powersave"
+    assert manager.switches == 2
+
+
+@patch("raspberrycam.raspberrypi.subprocess.run")
+def test_falls_back_to_sudo(mock_run: MagicMock, tmp_path: Path) -> None:
+    files = make_sysfs(tmp_path, cpus=2)
+    manager = PowerProfileManager(sysfs_root=tmp_path)
+
+    with patch.object(Path, "write_text", side_effect=PermissionError):
+        assert manager.set_mode(GovernorMode.PERFORMANCE)
+    assert mock_run.call_args.args[0] == ["sudo", "tee", *[str(path) for path in files]]
+    assert mock_run.call_args.kwargs["input"] == "performance"
+
+    # A failure leaves the governor unknown, so it is read again
+    mock_run.side_effect = OSError("sudo not found")
+    assert not manager.set_mode(GovernorMode.POWERSAVE)
+    assert manager.current == GovernorMode.ONDEMAND
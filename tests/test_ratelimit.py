@@ -0,0 +1,50 @@
+import threading
+
+from raspberrycam.clock import Clock
+from raspberrycam.ratelimit import RateLimiter
+
+
+class FakeClock(Clock):
+    """Clock where waiting moves time on instantly"""
+
+    def __init__(self) -> None:
+        self.mono = 0.0
+        self.lock = threading.Lock()
+
+    def monotonic(self) -> float:
+        return self.mono
+
+    def sleep(self, seconds: float) -> None:
+        with self.lock:
+            self.mono += seconds
+
+
+def test_rate_limiter() -> None:
+    clock = FakeClock()
+    limiter = RateLimiter(1000, burst=2000, clock=clock)
+
+    # A burst goes straight through, then uploads are paced at the rate
+    assert limiter.acquire(2000) == 0
+    assert limiter.acquire(500) == 0.5
+    assert limiter.acquire(1000) == 1.0
+
+    # Objects larger than the burst get through at the average rate
+    clock.mono += 10
+    assert limiter.acquire(5000) == 3.0
+    assert clock.mono == 14.5
+
+
+def test_rate_limiter_shared() -> None:
+    # Time stands still, so only the waits the limiter asks for count
+    clock = FakeClock()
+    clock.sleep = lambda seconds: None
+    limiter = RateLimiter(1000, burst=1000, clock=clock)
+    waits = []
+    threads = [threading.Thread(target=lambda: waits.append(limiter.acquire(1000))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Each worker waits for the ones before it, so together they keep to the rate
+    assert sorted(waits) == [0, 1, 2, 3, 4]
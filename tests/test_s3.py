@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from raspberrycam.breaker import BreakerState, CircuitBreaker
+from raspberrycam.clock import Clock
+from raspberrycam.s3 import CONNECTION_METRICS, S3Manager, upload_to_s3
+
+
+def fake_credentials(expires_in: int = 3600) -> dict:
+    return {
+        "access_key_id": "id",
+        "secret_access_key": "secret",
+        "session_token": "token",
+        "expiration": datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+    }
+
+
+@patch("raspberrycam.s3.assume_role")
+def test_credentials_cached(mock_assume: MagicMock) -> None:
+    mock_assume.return_value = fake_credentials()
+    s3 = S3Manager(role_arn="arn", access_key_id="id", secret_access_key="secret")
+    before = {name: metric.value for name, metric in CONNECTION_METRICS.items()}
+
+    s3.assume_role()
+    s3.assume_role()
+    s3.assume_role()
+
+    # Only the first call should reach STS
+    assert mock_assume.call_count == 1
+    assert s3.stats.sts_calls == 1
+    assert s3.stats.sts_calls_avoided == 2
+    # and the counts are exported with the other metrics
+    assert CONNECTION_METRICS["sts_calls"].value - before["sts_calls"] == 1
+    assert CONNECTION_METRICS["sts_calls_avoided"].value - before["sts_calls_avoided"] == 2
+
+
+@patch("raspberrycam.s3.assume_role")
+def test_credentials_refreshed_before_expiry(mock_assume: MagicMock) -> None:
+    # Expires inside the refresh margin, so every call needs new credentials
+    mock_assume.return_value = fake_credentials(expires_in=60)
+    s3 = S3Manager(role_arn="arn", access_key_id="id", secret_access_key="secret", refresh_margin=300)
+
+    s3.assume_role()
+    s3.assume_role()
+    assert mock_assume.call_count == 2
+    assert s3.stats.sts_calls_avoided == 0
+
+
+@patch("raspberrycam.s3.upload_to_s3")
+@patch("raspberrycam.s3.create_s3_client")
+@patch("raspberrycam.s3.assume_role")
+def test_client_reused(mock_assume: MagicMock, mock_client: MagicMock, mock_upload: MagicMock) -> None:
+    mock_assume.return_value = fake_credentials()
+    mock_upload.return_value = True
+    s3 = S3Manager(role_arn="arn", access_key_id="id", secret_access_key="secret")
+
+    s3.assume_role()
+    for _ in range(3):
+        assert s3.upload("image.jpg", "bucket", "key")
+
+    assert mock_client.call_count == 1
+    assert s3.stats.clients_created == 1
+    assert s3.stats.client_reuses == 2
+    # Every upload should be given the same client
+    clients = {id(call.kwargs["s3_client"]) for call in mock_upload.call_args_list}
+    assert len(clients) == 1
+
+
+@patch("raspberrycam.s3.assume_role")
+def test_no_client_without_credentials(mock_assume: MagicMock) -> None:
+    mock_assume.return_value = None
+    s3 = S3Manager(role_arn="arn", access_key_id="id", secret_access_key="secret")
+
+    s3.assume_role()
+    assert s3.get_client() is None
+    assert s3.stats.clients_created == 0
+
+
+@patch("raspberrycam.s3.assume_role")
+def test_backs_off_while_link_down(mock_assume: MagicMock) -> None:
+    mock_assume.return_value = None
+    s3 = S3Manager(role_arn="arn", access_key_id="id", secret_access_key="secret")
+
+    for _ in range(10):
+        s3.assume_role()
+        # No credentials is a failed upload, not the end of the process
+        assert not s3.upload("image.jpg", "bucket", "key")
+
+    # STS is only tried until the circuit opens, then everything is skipped
+    assert mock_assume.call_count == s3.breaker.failure_threshold
+    assert s3.stats.calls_skipped > 0
+    assert s3.breaker.state == BreakerState.OPEN
+    assert s3.breaker.next_retry() > datetime.now(timezone.utc).astimezone()
+
+
+def test_upload_without_credentials(tmp_path: Path) -> None:
+    image = tmp_path / "image.jpg"
+    image.write_text("image")
+    assert upload_to_s3(image, "bucket", None, "key") is False
+
+
+class FakeClock(Clock):
+    def __init__(self) -> None:
+        self.mono = 0.0
+
+    def monotonic(self) -> float:
+        return self.mono
+
+
+@pytest.mark.parametrize("sts_works", [True, False])
+@patch("raspberrycam.s3.upload_to_s3")
+@patch("raspberrycam.s3.create_s3_client")
+@patch("raspberrycam.s3.assume_role")
+def test_trial_with_expiring_credentials(
+    mock_assume: MagicMock, mock_client: MagicMock, mock_upload: MagicMock, sts_works: bool, tmp_path: Path
+) -> None:
+    image = tmp_path / "image.jpg"
+    image.write_text("image")
+    clock = FakeClock()
+    s3 = S3Manager(
+        role_arn="arn",
+        access_key_id="id",
+        secret_access_key="secret",
+        refresh_margin=300,
+        breaker=CircuitBreaker(failure_threshold=1, base_delay=10, jitter=0, clock=clock),
+    )
+    # Inside the refresh margin, so the trial upload has to renew them first
+    s3.credentials = fake_credentials(expires_in=60)
+    s3.breaker.record_failure()
+    assert s3.breaker.state == BreakerState.OPEN
+
+    clock.mono = 11
+    mock_assume.return_value = fake_credentials() if sts_works else None
+    # Without credentials the real upload fails straight away
+    mock_upload.return_value = sts_works
+    assert s3.upload(image, "bucket", "key") is sts_works
+
+    # The trial always settles the circuit one way or the other
+    assert mock_assume.call_count == 1
+    assert s3.breaker.state == (BreakerState.CLOSED if sts_works else BreakerState.OPEN)
+
+
+@patch("raspberrycam.s3.upload_to_s3", return_value=False)
+@patch("raspberrycam.s3.assume_role")
+def test_trial_taken_by_another_call(mock_assume: MagicMock, mock_upload: MagicMock, tmp_path: Path) -> None:
+    image = tmp_path / "image.jpg"
+    image.write_text("image")
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, base_delay=10, jitter=0, clock=clock)
+    s3 = S3Manager(role_arn="arn", access_key_id="id", secret_access_key="secret", breaker=breaker)
+    allow = breaker.allow
+
+    def allow_then_lose_race() -> BreakerState | None:
+        # Let through while closed, then another thread's failure opens the circuit and a third takes the trial
+        permit = allow()
+        breaker.record_failure()
+        clock.mono = 11
+        assert allow() == BreakerState.HALF_OPEN
+        return permit
+
+    with patch.object(breaker, "allow", side_effect=allow_then_lose_race):
+        assert not s3.upload(image, "bucket", "key")
+
+    # This upload wasn't the trial, so it neither asks STS nor settles the other thread's trial
+    mock_assume.assert_not_called()
+    assert breaker.state == BreakerState.HALF_OPEN
@@ -1,9 +1,12 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
 
 from dateutil.tz import tzlocal
 
 from raspberrycam.location import Location
 from raspberrycam.scheduler import FdriScheduler, ScheduleState
+from raspberrycam.suntable import SunTable
 
 
 def test_scheduler() -> None:
@@ -29,3 +32,55 @@ def test_scheduler() -> None:
     dt = datetime(2025, 6, 6, 2, 0, 0, 0, tzinfo=tzlocal())
     state = sched.get_state(dt)
     assert state == ScheduleState.OFF
+
+
+def test_scheduler_cache() -> None:
+    location = Location(55.8626453, -3.2031049)
+    sched = FdriScheduler(location, cache_size=2)
+
+    with patch.object(location, "get_sun_stats", wraps=location.get_sun_stats) as mock_stats:
+        dt = datetime(2025, 6, 6, 2, 0, tzinfo=tzlocal())
+        for hour in range(20):
+            sched.get_state(dt + timedelta(hours=hour))
+        # Once per date rather than once per call
+        assert mock_stats.call_count == 1
+
+        for day in range(3):
+            sched.get_schedule(date(2025, 6, 10 + day))
+        assert len(sched._cache) == 2
+        assert date(2025, 6, 10) not in sched._cache
+
+
+def test_sun_table(tmp_path: Path) -> None:
+    location = Location(55.8626453, -3.2031049)
+    table = SunTable.compute(location.latitude, location.longitude, date(2025, 1, 1), days=366)
+    assert table.end == date(2026, 1, 1)
+
+    # Should agree with astral
+    for day in (date(2025, 3, 30), date(2025, 6, 21), date(2025, 12, 21)):
+        sunrise, sunset = table.get(day)
+        stats = location.get_sun_stats(day)
+        assert abs((sunrise - stats["sunrise"]).total_seconds()) < 1
+        assert abs((sunset - stats["sunset"]).total_seconds()) < 1
+    assert table.get(date(2027, 1, 1)) is None
+
+    table.save(tmp_path / "sun_table.npz")
+    loaded = SunTable.load(tmp_path / "sun_table.npz")
+    assert loaded.matches(location.latitude, location.longitude)
+    assert loaded.get(date(2025, 6, 21)) == table.get(date(2025, 6, 21))
+
+
+def test_scheduler_sun_table(tmp_path: Path) -> None:
+    location = Location(55.8626453, -3.2031049)
+    sched = FdriScheduler(location)
+    sched.load_sun_table(tmp_path / "sun_table.npz")
+    assert (tmp_path / "sun_table.npz").exists()
+
+    # A new scheduler picks up the saved table and doesn't need the location
+    sched = FdriScheduler(location)
+    sched.load_sun_table(tmp_path / "sun_table.npz")
+    with patch.object(location, "get_sun_stats") as mock_stats:
+        now = datetime.now(tzlocal())
+        sched.get_state(now)
+        sched.get_next_on_time(now)
+        mock_stats.assert_not_called()
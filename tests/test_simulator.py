@@ -0,0 +1,113 @@
+import logging
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import pytest
+from dateutil.tz import gettz
+
+from raspberrycam.config import Config
+from raspberrycam.location import Location
+from raspberrycam.scheduler import FdriScheduler
+from raspberrycam.simulator import (
+    AcceleratedClock,
+    RecordingS3Manager,
+    SimulatedClock,
+    check_schedule,
+    percentile,
+    run_fleet,
+    time_warp,
+)
+
+START = datetime(2025, 6, 6, 9, 0, tzinfo=timezone.utc)
+
+
+def test_accelerated_clock() -> None:
+    clock = AcceleratedClock(START, speed=3600)
+    clock.sleep(1800)
+    # Half a simulated hour takes half a real second
+    assert 1800 <= clock.monotonic() < 2700
+    assert clock.now() > START
+
+    clock.stop()
+    before = clock.monotonic()
+    clock.sleep(3600 * 24)
+    assert clock.monotonic() - before < 3600
+
+
+def test_percentile() -> None:
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 1.0) == 100
+    assert percentile([], 0.5) is None
+
+
+def test_recording_s3_manager(tmp_path: Path) -> None:
+    s3 = RecordingS3Manager(tmp_path / "s3", max_concurrent=1)
+    image = tmp_path / "image"
+    image.write_bytes(b"x" * 10)
+
+    assert s3.upload(image, "bucket", "a/image")
+    assert s3.upload_bytes(b"y" * 5, "bucket", "b/image")
+    assert [(record.key, record.size, record.success) for record in s3.records] == [
+        ("a/image", 10, True),
+        ("b/image", 5, True),
+    ]
+    assert (tmp_path / "s3" / "bucket" / "b" / "image").read_bytes() == b"y" * 5
+
+
+def test_run_fleet(tmp_path: Path) -> None:
+    report = run_fleet(tmp_path, devices=3, hours=1.5, speed=36000, start=START, backlog=2, image_size=100)
+
+    # Every device flushes its backlog and uploads at least the first capture
+    assert report["requests"] >= 3 * (2 + 1)
+    assert report["failed_requests"] == 0
+    assert report["pending_after"] == 0
+    assert report["bytes"] == report["requests"] * 100
+    assert report["prefixes"]["distinct"] == 3
+    assert report["latency_seconds"]["p50"] is not None
+
+    # Images are named and partitioned by the simulated time
+    keys = list((tmp_path / "s3" / "bucket").rglob("*_20250606_*"))
+    assert len(keys) == report["requests"]
+    assert all(key.parent.name == "date=2025-06-06" for key in keys)
+
+
+def test_simulated_clock_daylight_saving() -> None:
+    london = gettz("Europe/London")
+    clock = SimulatedClock(datetime(2025, 3, 30, 0, 30, tzinfo=london))
+    clock.sleep(3600)
+
+    # The clocks go forward an hour at 01:00
+    assert clock.now() == datetime(2025, 3, 30, 2, 30, tzinfo=london)
+    assert clock.monotonic() == 3600
+    assert [(event.kind, event.seconds) for event in clock.trace.events] == [("sleep", 3600)]
+
+
+def test_time_warp(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    config = Config(
+        site="WARP",
+        lat=51.8626453,
+        lon=-0.2031049,
+        catchment="SE",
+        direction="E",
+        interval=3600,
+        jump_check_interval=0,
+    )
+    start = datetime(2025, 3, 28, tzinfo=gettz("Europe/London"))
+
+    with caplog.at_level(logging.WARNING):
+        trace = time_warp(tmp_path, config, start, days=4)
+
+    # Changing the clocks for daylight saving isn't mistaken for the wall clock jumping
+    assert "jumped" not in caplog.text
+    scheduler = FdriScheduler(Location(config.lat, config.lon))
+    assert check_schedule(trace, scheduler, config.interval) == []
+
+    daily = trace.daily()
+    assert list(daily)[:4] == [date(2025, 3, day) for day in range(28, 32)]
+    for day in list(daily)[:4]:
+        # One capture an hour through the day, each uploaded, and a wake-up for each plus sunset
+        assert 11 <= daily[day]["captures"] <= 14
+        assert daily[day]["uploads"] == daily[day]["captures"]
+        assert daily[day]["wakeups"] == daily[day]["captures"] + 1
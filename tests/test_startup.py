@@ -0,0 +1,19 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import raspberrycam
+
+
+def test_heavy_dependencies_are_lazy() -> None:
+    src = Path(__file__).parent.parent / "src"
+    code = (
+        f"import sys; sys.path.insert(0, {str(src)!r}); import raspberrycam.__main__; "
+        "print(','.join(name for name in ('boto3', 'astral', 'autosemver', 'cv2', 'dotenv') if name in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+
+def test_version_resolved_on_request() -> None:
+    assert isinstance(raspberrycam.__version__, str)
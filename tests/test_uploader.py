@@ -0,0 +1,106 @@
+import time
+from pathlib import Path
+from typing import Callable
+
+from raspberrycam.config import load_config
+from raspberrycam.image import S3ImageManager
+from raspberrycam.s3 import LocalS3Manager
+from raspberrycam.uploader import BackgroundUploader
+from raspberrycam.watcher import create_watcher
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_background_uploader(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3 = LocalS3Manager(tmp_path / "s3", latency=0.05)
+    s3im = S3ImageManager("bucket", s3, tmp_path / "app", config)
+    uploader = BackgroundUploader(s3im, max_queue_size=10)
+    assert uploader.oldest_pending_age() is None
+
+    uploader.start()
+    try:
+        start = time.monotonic()
+        for i in range(5):
+            image = s3im.pending_directory / f"image_{i}.jpg"
+            image.write_text("image")
+            assert uploader.enqueue(image)
+        # Queueing must not wait on the (slow) uploads
+        assert time.monotonic() - start < 0.05
+        assert uploader.oldest_pending_age() is not None
+
+        assert wait_for(lambda: s3.requests == 5)
+        assert wait_for(lambda: uploader.oldest_pending_age() is None)
+        assert uploader.queue_depth == 0
+        assert len(s3im.get_pending_images()) == 0
+    finally:
+        uploader.stop(timeout=5)
+    assert not uploader.running
+
+
+def test_background_uploader_full_queue(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3 = LocalS3Manager(tmp_path / "s3")
+    s3im = S3ImageManager("bucket", s3, tmp_path / "app", config)
+    # Not started, so nothing drains the queue
+    uploader = BackgroundUploader(s3im, max_queue_size=2, upload_interval=0.05)
+
+    images = []
+    for i in range(3):
+        image = s3im.pending_directory / f"image_{i}.jpg"
+        image.write_text("image")
+        images.append(image)
+
+    assert uploader.enqueue(images[0])
+    assert uploader.enqueue(images[1])
+    assert not uploader.enqueue(images[2])
+    assert uploader.queue_depth == 2
+
+    # The image that didn't fit is uploaded by the sweep of the pending directory
+    uploader.start()
+    try:
+        assert wait_for(lambda: s3.requests == 3)
+        assert wait_for(lambda: uploader.oldest_pending_age() is None)
+    finally:
+        uploader.stop(timeout=5)
+
+
+def test_watching_uploader(tmp_path: Path, config_file: Path) -> None:
+    config = load_config(config_file)
+    s3 = LocalS3Manager(tmp_path / "s3")
+    s3im = S3ImageManager("bucket", s3, tmp_path / "app", config)
+    # A long sweep interval, so only the watcher can find the images
+    uploader = BackgroundUploader(s3im, upload_interval=60, watcher=create_watcher(s3im.pending_directory))
+
+    uploader.start()
+    try:
+        assert wait_for(lambda: uploader.watching)
+        for i in range(3):
+            image = s3im.staging_directory / f"image_{i}.jpg"
+            image.write_text("image")
+            s3im.commit(image)
+
+        assert wait_for(lambda: s3.requests == 3)
+        assert s3im.pending_count() == 0
+    finally:
+        uploader.stop(timeout=5)
+    assert not uploader.watching
+    assert getattr(uploader.watcher, "_fd", -1) == -1
+
+    # Started again, as after a deep sleep that didn't power off
+    uploader.start()
+    try:
+        assert wait_for(lambda: uploader.watching)
+        image = s3im.staging_directory / "image_3.jpg"
+        image.write_text("image")
+        s3im.commit(image)
+        assert wait_for(lambda: s3.requests == 4)
+    finally:
+        uploader.stop(timeout=5)
@@ -0,0 +1,43 @@
+import os
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from raspberrycam.watcher import DirectoryWatcher, InotifyWatcher, PollingWatcher, create_watcher
+
+
+@pytest.mark.parametrize(
+    "make_watcher",
+    [InotifyWatcher, lambda directory: PollingWatcher(directory, poll_interval=0.01)],
+    ids=["inotify", "polling"],
+)
+def test_watcher_sees_committed_files(make_watcher: Callable[[Path], DirectoryWatcher], tmp_path: Path) -> None:
+    staging = tmp_path / "staging"
+    pending = tmp_path / "pending"
+    staging.mkdir()
+    pending.mkdir()
+    watcher = make_watcher(pending)
+    try:
+        assert watcher.wait(timeout=0.05) == []
+
+        for name in ["image_1.jpg", "image_2.jpg"]:
+            (staging / name).write_bytes(b"jpeg")
+            os.replace(staging / name, pending / name)
+
+        seen = []
+        while len(seen) < 2:
+            found = watcher.wait(timeout=1)
+            assert found
+            seen.extend(found)
+        assert sorted(seen) == [pending / "image_1.jpg", pending / "image_2.jpg"]
+    finally:
+        watcher.close()
+
+
+def test_create_watcher_falls_back_to_polling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def no_inotify(directory: Path) -> None:
+        raise OSError("inotify is not available")
+
+    monkeypatch.setattr("raspberrycam.watcher.InotifyWatcher", no_inotify)
+    assert isinstance(create_watcher(tmp_path), PollingWatcher)
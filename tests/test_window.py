@@ -0,0 +1,21 @@
+from datetime import datetime, time
+
+import pytest
+
+from raspberrycam.window import UploadWindow, parse_hours
+
+
+def test_parse_hours() -> None:
+    assert parse_hours("22:00-06:30") == (time(22), time(6, 30))
+    with pytest.raises(ValueError):
+        parse_hours("10pm")
+
+
+def test_off_peak() -> None:
+    window = UploadWindow(off_peak=[parse_hours("22:00-06:00"), parse_hours("12:00-13:00")], on_time_newest=1)
+
+    for hour, off_peak in ((23, True), (3, True), (6, False), (12, True), (13, False), (18, False)):
+        now = datetime(2025, 6, 6, hour, 0)
+        assert window.in_off_peak(now) is off_peak
+        # Off-peak uploads everything, the rest of the time only the newest image
+        assert window.on_time_limit(now) == (None if off_peak else 1)